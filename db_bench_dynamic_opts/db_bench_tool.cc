@@ -76,6 +76,7 @@
 #include "tools/simulated_hybrid_file_system.h"
 #include "util/cast_util.h"
 #include "util/compression.h"
+#include "util/coding.h"
 #include "util/crc32c.h"
 #include "util/file_checksum_helper.h"
 #include "util/gflags_compat.h"
@@ -98,6 +99,7 @@
 #include <vector>
 #include <fstream>
 #include "json.hpp"
+#include "dynamic_options_table.h"
 #include "port/sys_time.h"
 
 #ifdef MEMKIND
@@ -2754,6 +2756,7 @@ class Benchmark {
   int mmap_dynamic_file_desc_ = 0;
   void *mmap_dynamic_file_ = nullptr;
   char *mmap_dynamic_file_addr_ = nullptr;
+  uint64_t dynamic_options_applied_seq_ = 0;
 
 
   class ErrorHandlerListener : public EventListener {
@@ -5076,7 +5079,8 @@ class Benchmark {
       ErrorExit();
     }
 
-    mmap_dynamic_file_ = mmap(nullptr, 1024, PROT_WRITE, MAP_SHARED, 
+    mmap_dynamic_file_ = mmap(nullptr, kDynamicOptionsFileSize,
+                              PROT_READ | PROT_WRITE, MAP_SHARED,
                               mmap_dynamic_file_desc_, 0);
     if (mmap_dynamic_file_ == MAP_FAILED) {
       fprintf(stderr, "Failed to mmap dynamic options file %s\n",
@@ -5090,7 +5094,7 @@ class Benchmark {
   // To Do: Figure out where to insert this function call
   void CloseDynamicOptionsFile() {
     if (mmap_dynamic_file_ != nullptr) {
-      munmap(mmap_dynamic_file_, 1024);
+      munmap(mmap_dynamic_file_, kDynamicOptionsFileSize);
       mmap_dynamic_file_ = nullptr;
     }
     if (mmap_dynamic_file_desc_ != 0) {
@@ -5108,61 +5112,109 @@ class Benchmark {
       OpenDynamicOptionsFile();
     }
 
-    if (mmap_dynamic_file_addr_[0] == 1) { 
-      int mddf_max_open_file = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 1);
-      int mddf_max_total_wal_size = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 5);
-      // int mddf_delete_obsolete_files_period_micros = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 9);
-      int mddf_max_background_jobs = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 13);
-      int mddf_max_background_compactions = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 17);
-      int mddf_max_subcompactions = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 21);
-      int mddf_stats_dump_period_sec = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 25);
-      int mddf_compaction_readahead_size = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 29);
-      int mddf_writable_file_max_buffer_size = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 33);
-      int mddf_bytes_per_sync = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 37);
-      int mddf_wal_bytes_per_sync = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 41);
-      int mddf_delayed_write_rate = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 45);
-      int mddf_avoid_flush_during_shutdown = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 49);
-
-      int mddf_write_buffer_size = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 53);
-      int mddf_compression = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 57);
-      int mddf_level0_file_num_compaction_trigger = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 61);
-      int mddf_max_bytes_for_level_base = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 65);
-      int mddf_disable_auto_compactions = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 69);
-      int mddf_memtable_max_range_deletions = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 73);
-
-        // {"delete_obsolete_files_period_micros", std::to_string(mddf_delete_obsolete_files_period_micros)},
-      db_.db->SetDBOptions({
-        {"max_open_files", std::to_string(mddf_max_open_file)},
-        {"max_total_wal_size", std::to_string(mddf_max_total_wal_size)},
-        {"max_background_jobs", std::to_string(mddf_max_background_jobs)},
-        {"max_background_compactions", std::to_string(mddf_max_background_compactions)},
-        {"max_subcompactions", std::to_string(mddf_max_subcompactions)},
-        {"stats_dump_period_sec", std::to_string(mddf_stats_dump_period_sec)},
-        {"compaction_readahead_size", std::to_string(mddf_compaction_readahead_size)},
-        {"writable_file_max_buffer_size", std::to_string(mddf_writable_file_max_buffer_size)},
-        {"bytes_per_sync", std::to_string(mddf_bytes_per_sync)},
-        {"wal_bytes_per_sync", std::to_string(mddf_wal_bytes_per_sync)},
-        {"delayed_write_rate", std::to_string(mddf_delayed_write_rate)},
-        {"avoid_flush_during_shutdown", std::to_string(mddf_avoid_flush_during_shutdown)}
-      });
-
-      db_.db->SetOptions({
-        {"write_buffer_size", std::to_string(mddf_write_buffer_size)},
-        {"compression", std::to_string(mddf_compression)},
-        {"level0_file_num_compaction_trigger", std::to_string(mddf_level0_file_num_compaction_trigger)},
-        {"max_bytes_for_level_base", std::to_string(mddf_max_bytes_for_level_base)},
-        {"disable_auto_compactions", std::to_string(mddf_disable_auto_compactions)},
-        {"memtable_max_range_deletions", std::to_string(mddf_memtable_max_range_deletions)}
-      });
-
-      fprintf(stderr, "Received dynamic options\n");
-      fprintf(stderr, "max_open_files: %d\n", mddf_max_open_file);
-      fprintf(stderr, "max_total_wal_size: %d\n", mddf_max_total_wal_size);
-      fprintf(stderr, "max_background_jobs: %d\n", mddf_max_background_jobs);
-      fprintf(stderr, "memtable_max_range_deletions: %d\n", mddf_memtable_max_range_deletions);
-    }
-
-    mmap_dynamic_file_addr_[0] = 0;
+    // Layout and option ids are generated from utils/mmap_utils.py into
+    // dynamic_options_table.h
+    const char* base = mmap_dynamic_file_addr_;
+    if (DecodeFixed32(base) != kDynamicOptionsMagic ||
+        DecodeFixed16(base + 4) != kDynamicOptionsVersion) {
+      return;
+    }
+
+    // The writer publishes a slot by advancing the sequence once it is
+    // filled, so the common case is a single load
+    uint64_t seq = reinterpret_cast<const std::atomic<uint64_t>*>(
+                       base + kDynamicOptionsSequenceOffset)
+                       ->load(std::memory_order_acquire);
+    if (seq == dynamic_options_applied_seq_) {
+      return;
+    }
+
+    char slot[kDynamicOptionsSlotSize];
+    memcpy(slot,
+           base + kDynamicOptionsHeaderSize + (seq % 2) * kDynamicOptionsSlotSize,
+           kDynamicOptionsSlotSize);
+    std::atomic_thread_fence(std::memory_order_acquire);
+
+    // A slot that is being rewritten is retried on the next poll
+    uint64_t slot_seq = DecodeFixed64(slot);
+    uint32_t payload_length = DecodeFixed32(slot + 8);
+    uint32_t payload_crc = DecodeFixed32(slot + 12);
+    uint32_t entry_count = DecodeFixed32(slot + 16);
+    if (slot_seq != seq ||
+        payload_length >
+            kDynamicOptionsSlotSize - kDynamicOptionsSlotHeaderSize ||
+        payload_length != entry_count * kDynamicOptionsEntrySize) {
+      return;
+    }
+    const char* payload = slot + kDynamicOptionsSlotHeaderSize;
+    if (crc32c::Value(payload, payload_length) != payload_crc) {
+      return;
+    }
+
+    std::unordered_map<std::string, std::string> db_options;
+    std::unordered_map<std::string, std::string> cf_options;
+    for (uint32_t i = 0; i < entry_count; i++) {
+      const char* entry = payload + i * kDynamicOptionsEntrySize;
+      const DynamicOptionInfo* info = FindDynamicOption(DecodeFixed16(entry));
+      if (info == nullptr || info->scope == kDynamicOptionIgnored ||
+          static_cast<uint8_t>(entry[2]) != info->type) {
+        continue;
+      }
+
+      std::string value;
+      if (info->type == kDynamicOptionDouble) {
+        uint64_t bits = DecodeFixed64(entry + 8);
+        double d;
+        memcpy(&d, &bits, sizeof(d));
+        value = std::to_string(d);
+      } else {
+        int64_t v = static_cast<int64_t>(DecodeFixed64(entry + 8));
+        if (info->enum_names != nullptr) {
+          // Enum options such as compression are set by name
+          if (v < 0 || static_cast<size_t>(v) >= info->enum_count ||
+              info->enum_names[v][0] == '\0') {
+            continue;
+          }
+          value = info->enum_names[v];
+        } else {
+          value = std::to_string(v);
+        }
+      }
+
+      if (info->scope == kDynamicOptionDB) {
+        db_options[info->name] = value;
+      } else {
+        cf_options[info->name] = value;
+      }
+    }
+
+    if (!db_options.empty()) {
+      Status s = db_.db->SetDBOptions(db_options);
+      if (!s.ok()) {
+        fprintf(stderr, "Failed to set dynamic DB options: %s\n",
+                s.ToString().c_str());
+      }
+    }
+    if (!cf_options.empty()) {
+      Status s = db_.db->SetOptions(cf_options);
+      if (!s.ok()) {
+        fprintf(stderr, "Failed to set dynamic CF options: %s\n",
+                s.ToString().c_str());
+      }
+    }
+
+    dynamic_options_applied_seq_ = seq;
+    reinterpret_cast<std::atomic<uint64_t>*>(mmap_dynamic_file_addr_ +
+                                             kDynamicOptionsAppliedSequenceOffset)
+        ->store(seq, std::memory_order_release);
+
+    fprintf(stderr, "Received dynamic options (sequence %" PRIu64 ")\n", seq);
+    for (const auto& option : db_options) {
+      fprintf(stderr, "%s: %s\n", option.first.c_str(), option.second.c_str());
+    }
+    for (const auto& option : cf_options) {
+      fprintf(stderr, "%s: %s\n", option.first.c_str(), option.second.c_str());
+    }
 
     // Temporary solution to close the file after reading
     // CloseDynamicOptionsFile();
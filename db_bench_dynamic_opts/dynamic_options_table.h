@@ -0,0 +1,93 @@
+// Generated by utils/mmap_utils.py (generate_dynamic_options_header), do not edit.
+#pragma once
+
+#include <cstddef>
+#include <cstdint>
+
+namespace ROCKSDB_NAMESPACE {
+
+constexpr uint32_t kDynamicOptionsMagic = 0x54504F44;
+constexpr uint16_t kDynamicOptionsVersion = 2;
+constexpr size_t kDynamicOptionsFileSize = 4096;
+constexpr size_t kDynamicOptionsHeaderSize = 64;
+constexpr size_t kDynamicOptionsSequenceOffset = 8;
+constexpr size_t kDynamicOptionsAppliedSequenceOffset = 16;
+constexpr size_t kDynamicOptionsSlotSize = 2016;
+constexpr size_t kDynamicOptionsSlotHeaderSize = 24;
+constexpr size_t kDynamicOptionsEntrySize = 16;
+
+enum DynamicOptionType : uint8_t {
+  kDynamicOptionInt64 = 1,
+  kDynamicOptionDouble = 2,
+};
+
+enum DynamicOptionScope : uint8_t {
+  kDynamicOptionDB = 0,
+  kDynamicOptionCF = 1,
+  kDynamicOptionIgnored = 2,
+};
+
+struct DynamicOptionInfo {
+  uint16_t id;
+  const char* name;
+  DynamicOptionType type;
+  DynamicOptionScope scope;
+  // Names of the values of enum options, nullptr otherwise
+  const char* const* enum_names;
+  size_t enum_count;
+};
+
+constexpr const char* kCompressionNames[] = {
+    "kNoCompression",
+    "kSnappyCompression",
+    "kZlibCompression",
+    "kBZip2Compression",
+    "kLZ4Compression",
+    "kLZ4HCCompression",
+    "kXpressCompression",
+    "kZSTD",
+};
+
+constexpr DynamicOptionInfo kDynamicOptions[] = {
+    {1, "max_open_files", kDynamicOptionInt64, kDynamicOptionDB, nullptr, 0},
+    {2, "max_total_wal_size", kDynamicOptionInt64, kDynamicOptionDB, nullptr, 0},
+    {3, "delete_obsolete_files_period_micros", kDynamicOptionInt64, kDynamicOptionIgnored, nullptr, 0},
+    {4, "max_background_jobs", kDynamicOptionInt64, kDynamicOptionDB, nullptr, 0},
+    {5, "max_background_compactions", kDynamicOptionInt64, kDynamicOptionDB, nullptr, 0},
+    {6, "max_subcompactions", kDynamicOptionInt64, kDynamicOptionDB, nullptr, 0},
+    {7, "stats_dump_period_sec", kDynamicOptionInt64, kDynamicOptionDB, nullptr, 0},
+    {8, "compaction_readahead_size", kDynamicOptionInt64, kDynamicOptionDB, nullptr, 0},
+    {9, "writable_file_max_buffer_size", kDynamicOptionInt64, kDynamicOptionDB, nullptr, 0},
+    {10, "bytes_per_sync", kDynamicOptionInt64, kDynamicOptionDB, nullptr, 0},
+    {11, "wal_bytes_per_sync", kDynamicOptionInt64, kDynamicOptionDB, nullptr, 0},
+    {12, "delayed_write_rate", kDynamicOptionInt64, kDynamicOptionDB, nullptr, 0},
+    {13, "avoid_flush_during_shutdown", kDynamicOptionInt64, kDynamicOptionDB, nullptr, 0},
+    {14, "write_buffer_size", kDynamicOptionInt64, kDynamicOptionCF, nullptr, 0},
+    {15, "compression", kDynamicOptionInt64, kDynamicOptionCF, kCompressionNames, 8},
+    {16, "level0_file_num_compaction_trigger", kDynamicOptionInt64, kDynamicOptionCF, nullptr, 0},
+    {17, "max_bytes_for_level_base", kDynamicOptionInt64, kDynamicOptionCF, nullptr, 0},
+    {18, "disable_auto_compactions", kDynamicOptionInt64, kDynamicOptionCF, nullptr, 0},
+    {19, "memtable_max_range_deletions", kDynamicOptionInt64, kDynamicOptionCF, nullptr, 0},
+    {20, "target_file_size_base", kDynamicOptionInt64, kDynamicOptionCF, nullptr, 0},
+    {21, "target_file_size_multiplier", kDynamicOptionInt64, kDynamicOptionCF, nullptr, 0},
+    {22, "level0_slowdown_writes_trigger", kDynamicOptionInt64, kDynamicOptionCF, nullptr, 0},
+    {23, "level0_stop_writes_trigger", kDynamicOptionInt64, kDynamicOptionCF, nullptr, 0},
+    {24, "max_write_buffer_number", kDynamicOptionInt64, kDynamicOptionCF, nullptr, 0},
+    {25, "soft_pending_compaction_bytes_limit", kDynamicOptionInt64, kDynamicOptionCF, nullptr, 0},
+    {26, "hard_pending_compaction_bytes_limit", kDynamicOptionInt64, kDynamicOptionCF, nullptr, 0},
+    {27, "max_bytes_for_level_multiplier", kDynamicOptionDouble, kDynamicOptionCF, nullptr, 0},
+    {28, "strict_bytes_per_sync", kDynamicOptionInt64, kDynamicOptionDB, nullptr, 0},
+    {29, "stats_persist_period_sec", kDynamicOptionInt64, kDynamicOptionDB, nullptr, 0},
+    {30, "stats_history_buffer_size", kDynamicOptionInt64, kDynamicOptionDB, nullptr, 0},
+};
+
+inline const DynamicOptionInfo* FindDynamicOption(uint16_t id) {
+  for (const auto& info : kDynamicOptions) {
+    if (info.id == id) {
+      return &info;
+    }
+  }
+  return nullptr;
+}
+
+}  // namespace ROCKSDB_NAMESPACE
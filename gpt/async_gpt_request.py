@@ -0,0 +1,223 @@
+import os
+import time
+import random
+import asyncio
+import threading
+
+from utils import constants
+from utils.utils import log_update
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+_clients = {}
+_semaphore = None
+_stats = []
+
+
+def get_loop():
+    '''
+    Function to get the event loop all requests run on. The loop lives in a daemon thread,
+    so the synchronous callers can submit coroutines without owning a loop themselves and
+    the HTTP connections are reused across calls.
+
+    Returns:
+    - loop (asyncio.AbstractEventLoop): The request event loop
+    '''
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="gpt-request-loop", daemon=True)
+            _loop_thread.start()
+    return _loop
+
+
+def run_async(coroutine):
+    '''
+    Function to run a coroutine on the request loop and wait for its result
+
+    Parameters:
+    - coroutine (coroutine): The coroutine to run
+
+    Returns:
+    - result: The result of the coroutine
+    '''
+    loop = get_loop()
+    if threading.current_thread() is _loop_thread:
+        raise RuntimeError("run_async cannot be called from the request loop, await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+
+def gather_async(coroutines):
+    '''
+    Function to run several coroutines concurrently on the request loop
+
+    Parameters:
+    - coroutines (list): The coroutines to run
+
+    Returns:
+    - results (list): The results in the same order as the coroutines
+    '''
+    async def gather():
+        return await asyncio.gather(*coroutines)
+    return run_async(gather())
+
+
+def retryable_errors():
+    '''
+    Function to get the errors that are worth retrying, everything else is raised to the caller.
+    openai is imported with the first client rather than at startup.
+
+    Returns:
+    - errors (tuple): The exception types
+    '''
+    import openai
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
+
+
+def get_client(kind="chat"):
+    '''
+    Function to get a shared client. Must be called on the request loop.
+    OPENAI_BASE_URL points the clients at another server, such as a local stub.
+
+    Parameters:
+    - kind (str): "chat" for the LLM_MODEL client, "spec" for the structured output client
+
+    Returns:
+    - client (AsyncOpenAI): The client
+    '''
+    global _semaphore
+    import httpx
+    from openai import AsyncOpenAI
+
+    # The limit is shared by all sessions of the process, it is set by the first request
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(constants.LLM_MAX_CONCURRENCY)
+
+    # Sessions may use different models, so the client is also chosen by its endpoint
+    huggingface = kind == "chat" and 'llama' in constants.LLM_MODEL
+    key = (kind, huggingface)
+    if key not in _clients:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=constants.LLM_MAX_CONCURRENCY, max_keepalive_connections=constants.LLM_MAX_CONCURRENCY),
+            timeout=httpx.Timeout(600.0, connect=10.0),
+        )
+        if huggingface:
+            _clients[key] = AsyncOpenAI(api_key=os.getenv("HUGGING_FACE_KEY"), base_url="https://api-inference.huggingface.co/v1/",
+                                         http_client=http_client, max_retries=0)
+        else:
+            _clients[key] = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL"),
+                                         http_client=http_client, max_retries=0)
+    return _clients[key]
+
+
+async def call_with_retries(name, model, request):
+    '''
+    Function to make an API call with bounded concurrency, retries with jittered
+    exponential backoff, and latency and token accounting
+
+    Parameters:
+    - name (str): The name of the call used in the logs
+    - model (str): The model of the call
+    - request (callable): Function returning the awaitable API call
+
+    Returns:
+    - response: The API response
+    '''
+    get_client()
+    errors = retryable_errors()
+    attempt = 0
+    start_time = time.time()
+
+    while True:
+        attempt += 1
+        try:
+            async with _semaphore:
+                response = await request()
+            break
+        except errors as e:
+            if attempt > constants.LLM_MAX_RETRIES:
+                log_update(f"[GPTR] {name} failed after {attempt} attempts: {e}")
+                raise
+            delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+            log_update(f"[GPTR] {name} attempt {attempt} failed ({type(e).__name__}), retrying in {delay:.1f} seconds")
+            await asyncio.sleep(delay)
+
+    latency = time.time() - start_time
+    usage = getattr(response, "usage", None)
+    record = {
+        "name": name,
+        "model": model,
+        "latency": latency,
+        "attempts": attempt,
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+    }
+    _stats.append(record)
+    log_update(f"[GPTR] {name} ({model}) took {latency:.2f} seconds, {record['attempts']} attempts, "
+               f"{record['prompt_tokens']} prompt and {record['completion_tokens']} completion tokens")
+    return response
+
+
+async def chat_completion(messages, model=None, **kwargs):
+    '''
+    Function to request a chat completion
+
+    Parameters:
+    - messages (list): The messages of the conversation
+    - model (str): The model to use. Default is LLM_MODEL
+
+    Returns:
+    - completion: The chat completion
+    '''
+    model = model or constants.LLM_MODEL
+    client = get_client("chat")
+    return await call_with_retries(
+        "chat_completion", model,
+        lambda: client.chat.completions.create(model=model, messages=messages, **kwargs))
+
+
+async def structured_completion(messages, response_format, model, temperature):
+    '''
+    Function to request a chat completion parsed into the given response format
+
+    Parameters:
+    - messages (list): The messages of the conversation
+    - response_format (pydantic.BaseModel): The format of the response
+    - model (str): The model to use
+    - temperature (float): The sampling temperature
+
+    Returns:
+    - response: The parsed chat completion
+    '''
+    client = get_client("spec")
+    return await call_with_retries(
+        "structured_completion", model,
+        lambda: client.beta.chat.completions.parse(model=model, messages=messages, temperature=temperature,
+                                                   response_format=response_format))
+
+
+def request_stats():
+    '''
+    Function to summarize all requests made so far
+
+    Returns:
+    - summary (dict): Number of requests, retries, total and maximum latency, and token counts
+    '''
+    return {
+        "requests": len(_stats),
+        "retries": sum(s["attempts"] - 1 for s in _stats),
+        "total_latency": sum(s["latency"] for s in _stats),
+        "max_latency": max((s["latency"] for s in _stats), default=0.0),
+        "prompt_tokens": sum(s["prompt_tokens"] for s in _stats),
+        "completion_tokens": sum(s["completion_tokens"] for s in _stats),
+    }
@@ -3,11 +3,12 @@ from difflib import Differ
 from options_files.ops_options_file import cleanup_options_file, parse_db_bench_args_to_dict
 from gpt.gpt_request import request_gpt
 from utils.filter import DB_BENCH_ARGS
+from utils.dynamic_options import tunable_option_names, describe_tunable_options
 from utils.utils import log_update
+from utils.scoring import describe, describe_goal, score
 from dotenv import load_dotenv
 import configparser
-from utils.constants import ABSTRACTION, VERSION
-from utils.constants import RAG, CASE_NUMBER
+from utils import constants
 
 load_dotenv()
 
@@ -22,7 +23,7 @@ def generate_system_content(device_information, trace_result):
         str: A prompt for configuring RocksDB for enhanced performance.
     """
 
-    if ABSTRACTION:
+    if constants.ABSTRACTION:
         content = (
             "You are a really familiar with Log Structured Merge Tree based Key "
             "Value Store databases. We found some new database called LuminaStore and "
@@ -36,7 +37,7 @@ def generate_system_content(device_information, trace_result):
             "You are a RocksDB Expert. "
             "You are being consulted by a company to help improve their RocksDB configuration "
             "by optimizing their options file based on their System information and benchmark output. "
-            f"Only provide options files for rocksdb version {VERSION}. Also, Direct IO will always be used for both flush and compaction. "
+            f"Only provide options files for rocksdb version {constants.VERSION}. Also, Direct IO will always be used for both flush and compaction. "
             "Additionally, compression type is set to none always."
             "First Explain the reasoning, only change 10 options, then show the option file in original format."
             f"The Device information is: {device_information}. "
@@ -62,7 +63,12 @@ def generate_benchmark_info(test_name, benchmark_result, average_cpu_used, avera
     
     if average_cpu_used != -1 and average_mem_used != -1:
         benchmark_line += f" CPU used: {average_cpu_used}%, Memory used: {average_mem_used}% during test."
-    
+
+    # Latency and the other objectives, as far as the run reported them
+    objectives_line = describe(benchmark_result, include_throughput=False)
+    if objectives_line:
+        benchmark_line += f" {objectives_line}"
+
     return benchmark_line
 
 def user_content_for_db_bench_args(db_bench_args):
@@ -85,14 +91,14 @@ def generate_default_user_content(chunk_string, previous_option_files, average_c
 
     _, benchmark_result, _, _ = previous_option_files[-1]
     benchmark_line = generate_benchmark_info(test_name, benchmark_result, average_cpu_used, average_mem_used)
-    if CASE_NUMBER == 2:
+    if constants.CASE_NUMBER == 2:
         user_content = f"Part of the current option file is:\n```\n{chunk_string}\n```\nThe benchmark results are: {benchmark_line}"
         user_contents.append(user_content)
-        user_contents.append("Based on these information generate a new file only with the options provided above (but only give the changed value) to improve my database performance. Enclose the new options file in ```.")
+        user_contents.append(f"{describe_goal()} Based on these information generate a new file only with the options provided above (but only give the changed value) to improve my database performance. Enclose the new options file in ```.")
     else:
         user_content = f"Part of the current option file is:\n```\n{chunk_string}\n```\nThe benchmark results are: {benchmark_line}"
         user_contents.append(user_content)
-        user_contents.append("Based on these information generate a new file in the same format as the options_file (but only give the changed value) to improve my database performance. Enclose the new options file in ```.")
+        user_contents.append(f"{describe_goal()} Based on these information generate a new file in the same format as the options_file (but only give the changed value) to improve my database performance. Enclose the new options file in ```.")
     return user_contents
 
 def generate_assistant_content(previous_option_files):
@@ -243,25 +249,8 @@ def dynamic_options_file_generation(prev_options, db_bench_args, avg_cpu_used, a
         f"The Device information is: {device_information}"
     )
 
-    db_options = [
-        'max_background_jobs',
-        'max_background_compactions',
-        'max_subcompactions',
-        'avoid_flush_during_shutdown',
-        'writable_file_max_buffer_size',
-        'delayed_write_rate',
-        'max_total_wal_size',
-        'delete_obsolete_files_period_micros',
-        'stats_dump_period_sec',
-        'stats_persist_period_sec',
-        'stats_history_buffer_size',
-        'max_open_files',
-        'bytes_per_sync',
-        'wal_bytes_per_sync',
-        'strict_bytes_per_sync',
-        'compaction_readahead_size',
-        'max_background_flushes'
-    ]
+    # The options db_bench can change while running, see utils/dynamic_options.py
+    db_options = tunable_option_names()
 
     user_content = []
 
@@ -300,7 +289,9 @@ def dynamic_options_file_generation(prev_options, db_bench_args, avg_cpu_used, a
     content += f"{avg_cpu_used}% and {avg_mem_used}\n"
 
     # Previous Options Information
-    content += "The previous db_options values for each of the MutableDBOptions are as follows:\n"
+    content += "Only the following options can be changed while the workload is running:\n"
+    content += f"{describe_tunable_options()}\n"
+    content += "The previous values of these options are as follows:\n"
 
     values = {}
     for line in options_file[-1][0].split('\n'):
@@ -316,23 +307,24 @@ def dynamic_options_file_generation(prev_options, db_bench_args, avg_cpu_used, a
     content += (
         f"The throughput results for the above options file are: {options_file[-1][1]['ops_per_sec']}. "
     )
+    content += describe(options_file[-1][1], include_throughput=False)
     if (len(options_file) > 1):
-        if (options_file[-1][1]['ops_per_sec'] > options_file[-2][1]['ops_per_sec']):
+        if (score(options_file[-1][1]) > score(options_file[-2][1])):
             content += (
-                "Which is an improvement from the previous throughput of "
-                f"{options_file[-2][1]['ops_per_sec']}. "
+                "Which is an improvement from the previous results of "
+                f"{describe(options_file[-2][1])} "
                 "Keep it up!. "
                 "Based on this information generate a new file. "
             )
         else:
             content += (
-                "Which is a decrease from the previous throughput of "
-                f"{options_file[-2][1]['ops_per_sec']}. "
+                "Which is worse than the previous results of "
+                f"{describe(options_file[-2][1])} "
                 "Please revert the changes made in the previous file, "
                 "and generate a new file but different approach from the previous one. "
             )
             
-    content += "Enclose the new options in ```. Feel free to use upto 100% of the CPU and Memory."
+    content += f"{describe_goal()} Enclose the new options in ```. Feel free to use upto 100% of the CPU and Memory."
     user_content.append(content)
 
     log_update("[OG] Generating options file with differences")
@@ -360,7 +352,7 @@ def error_correction_options_file_generation(error_options, db_bench_args, reaso
         "by optimizing the options configured for a particular scenario they face."
         "But there was an error in the options file generated. "
         "Respond with the error reasoning first, then show the corrected option file in original format."
-        f"Only provide options files for rocksdb version {VERSION}. "
+        f"Only provide options files for rocksdb version {constants.VERSION}. "
         "Enclose the new options in ```"
     )
 
@@ -3,23 +3,25 @@ from gpt.gpt_request import request_gpt
 from gpt.prompts_generator import generate_benchmark_info
 from options_files.ops_options_file import cleanup_options_file
 from trace_analyzer.analyzer import analyze_tracefile
-from utils.constants import ABSTRACTION, FIO_RESULT_PATH, VERSION, RAG
+from utils.config import get_config
+from utils import constants
 from utils.system_operations.fio_runner import get_fio_result
 from utils.system_operations.get_sys_info import system_info
+from utils.scoring import OBJECTIVES, score
 from utils.utils import path_of_db
 
 
 def generate_fine_tuning_options(fine_tuning_options, db_bench_args, changed_value_dict):
-    if ABSTRACTION:
+    if constants.ABSTRACTION:
         fine_tuning_options = convert_options_to_randomdb(fine_tuning_options)
         changed_value_dict = convert_dicts_to_randomdb(changed_value_dict)
 
     db_path = path_of_db()
-    fio_result = get_fio_result(FIO_RESULT_PATH)
+    fio_result = get_fio_result(constants.FIO_PROFILE_DIR, db_path)
     device_info = system_info(db_path, fio_result)
     trace_result = analyze_tracefile(db_path + "/tracefile")
 
-    if ABSTRACTION:
+    if constants.ABSTRACTION:
         system_content = (
             "You are a really familiar with Log Structured Merge Tree based Key "
             "Value Store databases. We found some new database called LuminaStore and "
@@ -38,10 +40,10 @@ def generate_fine_tuning_options(fine_tuning_options, db_bench_args, changed_val
     user_contents = []
     assistant_contents = []
     
-    benchmark_line = generate_benchmark_info(None, fine_tuning_options[0][2], fine_tuning_options[0][3], fine_tuning_options[0][4])
+    benchmark_line = generate_benchmark_info(None, fine_tuning_options[0][1], fine_tuning_options[0][2], fine_tuning_options[0][3])
     options_string = "\n".join(f"{k}={v}" for k, v in changed_value_dict.items())
     
-    if ABSTRACTION:
+    if constants.ABSTRACTION:
         user_contents.append((
             f"My device have {device_info}\n"
             f"The workload summary of the tracefile is: {trace_result}\n\n"
@@ -64,9 +66,10 @@ def generate_fine_tuning_options(fine_tuning_options, db_bench_args, changed_val
             "Aslo enclose the summary all changed options in ```"
         ))
 
+    objective = OBJECTIVES[get_config().objective][0].lower()
     for i in range(1, len(fine_tuning_options)):
-        _, _, bench_res, cpuu, mmu, reason, change = fine_tuning_options[i]
-        _, _, prev_bench_res, _, _, _, _ = fine_tuning_options[i-1]
+        _, bench_res, cpuu, mmu, reason, change = fine_tuning_options[i]
+        _, prev_bench_res, _, _, _, _ = fine_tuning_options[i-1]
 
         benchmark_line = generate_benchmark_info(None, bench_res, cpuu, mmu)
         if len(change.items()) > 0:
@@ -80,14 +83,14 @@ def generate_fine_tuning_options(fine_tuning_options, db_bench_args, changed_val
         )
         assistant_contents.append(assistant)
 
-        if bench_res['ops_per_sec'] > prev_bench_res['ops_per_sec']:
+        if score(bench_res) > score(prev_bench_res):
             user_last_prompt = (
-                "From the benchmark result, we can see the operation per second is increasing. "
+                f"From the benchmark result, we can see the {objective} is improving. "
                 "Lets try another value on those changes! "
             )
         else:
             user_last_prompt = (
-                "Seems like the operation per second is decreasing. "
+                f"Seems like the {objective} is getting worse. "
                 "Please refer to the previous changes and generate a new value to see the different! "
             )
 
@@ -1,31 +1,182 @@
 import os
 import re
-from openai import OpenAI
-from utils.constants import EMBEDDING_MODEL, LLM_MODEL, RAG
+import time
+import pickle
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from utils import constants
 from utils.utils import log_gpt_response, log_update
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import create_retrieval_chain
-
-# Environment variables
-spec_client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-)
-
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-)
-
-if 'llama' in LLM_MODEL:
-    client = OpenAI(
-        api_key=os.getenv("HUGGING_FACE_KEY"),
-        base_url = "https://api-inference.huggingface.co/v1/",
+from gpt.async_gpt_request import run_async, chat_completion, structured_completion
+
+# RAG state shared by all requests of the process, built on first use.
+# langchain is only imported once RAG is used, as it takes seconds to import.
+VECTORSTORE_PATH = "vectorstore_2"
+RETRIEVAL_CACHE_SIZE = 256
+CHAIN_CACHE_SIZE = 32
+
+_rag_lock = threading.Lock()
+_embeddings = None
+_retriever = None
+_retrieval_cache = OrderedDict()
+_rag_chains = OrderedDict()
+_rag_metrics = {
+    "load_seconds": None,
+    "load_method": None,
+    "retrievals": 0,
+    "retrieval_cache_hits": 0,
+    "retrieval_seconds": 0.0,
+}
+
+
+def get_embeddings():
+    '''
+    Function to get the process-wide embeddings client, creating it on first use
+
+    Returns:
+    - embeddings (OpenAIEmbeddings): The embeddings client
+    '''
+    global _embeddings
+    if _embeddings is None:
+        from langchain_openai import OpenAIEmbeddings
+        _embeddings = OpenAIEmbeddings(model=constants.EMBEDDING_MODEL)
+    return _embeddings
+
+
+def load_vectorstore(path=VECTORSTORE_PATH):
+    '''
+    Function to load the FAISS vectorstore with the index memory-mapped, so its pages are
+    shared with the page cache instead of being deserialized into memory.
+    Falls back to a regular load for index types that cannot be memory-mapped.
+
+    Parameters:
+    - path (str): The folder of the vectorstore
+
+    Returns:
+    - vectorstore (FAISS): The vectorstore
+    - method (str): "mmap" or "load_local"
+    '''
+    from langchain_community.vectorstores import FAISS
+
+    embeddings = get_embeddings()
+    try:
+        import faiss
+        index = faiss.read_index(os.path.join(path, "index.faiss"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        with open(os.path.join(path, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(embeddings, index, docstore, index_to_docstore_id), "mmap"
+    except Exception as e:
+        log_update(f"[GPTR] Memory-mapped vectorstore load failed ({e}), using load_local")
+        return FAISS.load_local(path, embeddings=embeddings, allow_dangerous_deserialization=True), "load_local"
+
+
+def get_retriever():
+    '''
+    Function to get the process-wide retriever, loading the vectorstore on first use.
+    Retrievals are cached by a hash of the query.
+
+    Returns:
+    - retriever (Runnable): Runnable mapping the chain inputs to the retrieved documents
+    '''
+    global _retriever
+    from langchain_core.runnables import RunnableLambda
+
+    with _rag_lock:
+        if _retriever is not None:
+            return _retriever
+
+        start_time = time.time()
+        vectorstore, method = load_vectorstore()
+        _rag_metrics["load_seconds"] = time.time() - start_time
+        _rag_metrics["load_method"] = method
+        log_update(f"[GPTR] Loaded vectorstore with {method} in {_rag_metrics['load_seconds']:.2f} seconds")
+
+        vectorstore_retriever = vectorstore.as_retriever()
+
+        def retrieve(inputs):
+            query = inputs["input"]
+            key = hashlib.sha1(query.encode()).hexdigest()
+            with _rag_lock:
+                _rag_metrics["retrievals"] += 1
+                if key in _retrieval_cache:
+                    _retrieval_cache.move_to_end(key)
+                    _rag_metrics["retrieval_cache_hits"] += 1
+                    return _retrieval_cache[key]
+
+            retrieval_start = time.time()
+            documents = vectorstore_retriever.invoke(query)
+            latency = time.time() - retrieval_start
+            log_update(f"[GPTR] Retrieved {len(documents)} documents in {latency:.3f} seconds")
+
+            with _rag_lock:
+                _rag_metrics["retrieval_seconds"] += latency
+                _retrieval_cache[key] = documents
+                if len(_retrieval_cache) > RETRIEVAL_CACHE_SIZE:
+                    _retrieval_cache.popitem(last=False)
+            return documents
+
+        _retriever = RunnableLambda(retrieve)
+        return _retriever
+
+
+def get_rag_chain(system_content, temperature):
+    '''
+    Function to get the RAG chain for the given system content and temperature, building it on first use
+
+    Parameters:
+    - system_content (str): The system information
+    - temperature (float): The sampling temperature
+
+    Returns:
+    - rag_chain (Runnable): The retrieval chain
+    '''
+    from langchain_openai import ChatOpenAI
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain.chains import create_retrieval_chain
+
+    retriever = get_retriever()
+    key = (system_content, temperature)
+    with _rag_lock:
+        if key in _rag_chains:
+            _rag_chains.move_to_end(key)
+            return _rag_chains[key]
+
+    # Create LLM and RAG chains
+    llm = ChatOpenAI(
+        model=constants.LLM_MODEL, 
+        temperature=temperature
     )
 
-embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+    # Create chat prompt template for system and user content
+    prompt = [
+        ("system", system_content + "\n\n{context}"),
+        MessagesPlaceholder(variable_name="history"),
+        ("human", "{input}")
+    ]
+
+    # Create prompt template and RAG
+    prompt_template = ChatPromptTemplate.from_messages(prompt)
+    qna_chain = create_stuff_documents_chain(llm, prompt_template)
+    rag_chain = create_retrieval_chain(retriever, qna_chain)
+
+    with _rag_lock:
+        _rag_chains[key] = rag_chain
+        if len(_rag_chains) > CHAIN_CACHE_SIZE:
+            _rag_chains.popitem(last=False)
+    return rag_chain
+
+
+def rag_stats():
+    '''
+    Function to get the vectorstore load time and retrieval latency metrics
+
+    Returns:
+    - metrics (dict): Load time and method, number of retrievals, cache hits and total retrieval time
+    '''
+    with _rag_lock:
+        return dict(_rag_metrics)
 
 def request_gpt_rag(system_content, user_contents, assistant_content, temperature):
     '''
@@ -40,29 +191,14 @@ def request_gpt_rag(system_content, user_contents, assistant_content, temperatur
     Returns:
     - matches: string containing the options file generated by GPT-4
     '''
+    from langchain_core.messages import HumanMessage, AIMessage
+
     log_update("[GPTR] Using RAG")
     print("[GPTR] Using RAG")
-    # Load vectorstore and create retriever
-    vectorstore = FAISS.load_local("vectorstore_2", embeddings=embeddings, allow_dangerous_deserialization=True)
-    retriever = vectorstore.as_retriever()
-
-    # Create LLM and RAG chains
-    llm = ChatOpenAI(
-        model=LLM_MODEL, 
-        temperature=temperature
-    )
-
     # Separate User content
     last_user_content = user_contents[-1]
     user_contents = user_contents[:-1]
 
-    # Create chat prompt template for system and user content
-    prompt = [
-        ("system", system_content + "\n\n{context}"),
-        MessagesPlaceholder(variable_name="history"),
-        ("human", "{input}")
-    ]
-    
     # Now append user and assistant content
     history = []
     if assistant_content:
@@ -75,10 +211,7 @@ def request_gpt_rag(system_content, user_contents, assistant_content, temperatur
         for content in user_contents:
             history.append(HumanMessage(content=content))
 
-    # Create prompt template and RAG
-    prompt_template = ChatPromptTemplate.from_messages(prompt)
-    qna_chain = create_stuff_documents_chain(llm, prompt_template)
-    rag_chain = create_retrieval_chain(retriever, qna_chain)
+    rag_chain = get_rag_chain(system_content, temperature)
     
     # Set user question and ask the RAG
     inputs = {
@@ -114,7 +247,7 @@ def request_gpt_rag(system_content, user_contents, assistant_content, temperatur
         return None
 
 
-def request_gpt(system_content, user_contents, assistant_content, temperature):
+async def request_gpt_async(system_content, user_contents, assistant_content, temperature):
     '''
     Function to make an API call to GPT-4
 
@@ -131,8 +264,8 @@ def request_gpt(system_content, user_contents, assistant_content, temperature):
     - matches: string containing the options file generated by GPT-4
     '''
 
-    if RAG:
-        return request_gpt_rag(system_content, user_contents, assistant_content, temperature)
+    if constants.RAG:
+        return await asyncio.to_thread(request_gpt_rag, system_content, user_contents, assistant_content, temperature)
 
     messages = [{"role": "user", "content": system_content}]
 
@@ -157,10 +290,7 @@ def request_gpt(system_content, user_contents, assistant_content, temperature):
     #     presence_penalty=0,
     # )
 
-    completion = client.chat.completions.create(
-        model=LLM_MODEL,
-        messages=messages,
-    )
+    completion = await chat_completion(messages)
 
     # Extract the assistant's reply
     assistant_reply = completion.choices[0].message.content
@@ -178,6 +308,13 @@ def request_gpt(system_content, user_contents, assistant_content, temperature):
         file.write(assistant_reply + "\n\n" + "-" * 150 + "\n\n")
     return None
 
+
+def request_gpt(system_content, user_contents, assistant_content, temperature):
+    '''
+    Blocking version of request_gpt_async
+    '''
+    return run_async(request_gpt_async(system_content, user_contents, assistant_content, temperature))
+
 def send_gpt_request(system_contents, user_contents, temperature):
     '''
     Function to send a request to GPT-4
@@ -202,10 +339,7 @@ def send_gpt_request(system_contents, user_contents, temperature):
     #     presence_penalty=0,
     # )
 
-    completion = client.chat.completions.create(
-        model=LLM_MODEL,
-        messages=messages,
-    )
+    completion = run_async(chat_completion(messages))
 
     # Extract the assistant's reply
     assistant_reply = completion.choices[0].message.content
@@ -213,7 +347,7 @@ def send_gpt_request(system_contents, user_contents, temperature):
 
     return assistant_reply
 
-def request_gpt_with_structured_output(system_content, user_contents, assistant_content, response_format, temperature):
+async def request_gpt_with_structured_output_async(system_content, user_contents, assistant_content, response_format, temperature):
     '''
     Function to make an API call to GPT-4
 
@@ -246,12 +380,7 @@ def request_gpt_with_structured_output(system_content, user_contents, assistant_
 
     we_did_not_specify_stop_tokens = True
     try:
-        response = spec_client.beta.chat.completions.parse(
-            model="gpt-4o-mini-2024-07-18",
-            messages=messages,
-            temperature=temperature,
-            response_format=response_format,
-        )
+        response = await structured_completion(messages, response_format, "gpt-4o-mini-2024-07-18", temperature)
 
         if response.choices[0].finish_reason == "length":
             raise Exception("The conversation was too long for the context window, resulting in incomplete JSON")
@@ -263,4 +392,11 @@ def request_gpt_with_structured_output(system_content, user_contents, assistant_
         print(e)
         raise e
     
-    return response.choices[0].message.parsed
\ No newline at end of file
+    return response.choices[0].message.parsed
+
+
+def request_gpt_with_structured_output(system_content, user_contents, assistant_content, response_format, temperature):
+    '''
+    Blocking version of request_gpt_with_structured_output_async
+    '''
+    return run_async(request_gpt_with_structured_output_async(system_content, user_contents, assistant_content, response_format, temperature))
@@ -1,6 +1,26 @@
 from abstraction.abstraction import convert_options_to_randomdb
 from gpt.content_generator import *
-from utils.constants import ABSTRACTION
+from utils import constants
+from gpt.gpt_request import request_gpt_async
+from gpt.async_gpt_request import gather_async
+from options_files.ops_options_file import extract_gpt_options_async, apply_gpt_options
+
+async def request_chunk(system_content, user_contents, temperature):
+    """
+    Function to request the options for one part of the options file and extract them
+
+    Parameters:
+    - system_content (str): The system information
+    - user_contents (list): The user inputs for the part
+    - temperature (float): Controls the randomness of the generated output
+
+    Returns:
+    - tuple: The regex matches of the response and the extracted options, or (None, None)
+    """
+    matches = await request_gpt_async(system_content, user_contents, None, temperature)
+    if matches is None:
+        return None, None
+    return matches, await extract_gpt_options_async(matches.group(2))
 
 def generate_option_file_with_gpt(case, previous_option_files, db_bench_args, device_information, trace_result, temperature=0.4, average_cpu_used=-1.0, average_mem_used=-1.0, test_name="fillrandom", version="8.8.1"):
     """
@@ -73,14 +93,19 @@ def generate_option_file_with_gpt(case, previous_option_files, db_bench_args, de
         reasoning = ""
         changed_value_dict = {}
 
-        # Loop through each part and make API calls
+        # Make the API calls for all parts concurrently
+        chunk_user_contents = []
         for index, chunk_string in enumerate(chunk_strings):
             user_contents = generate_default_user_content(chunk_string, previous_option_files, average_cpu_used, average_mem_used, test_name)
             if index == 0:
                 user_contents += user_content_for_db_bench_args(db_bench_args)
-            matches = request_gpt(system_content, user_contents, None, temperature)
+            chunk_user_contents.append(user_contents)
+        responses = gather_async([request_chunk(system_content, user_contents, temperature) for user_contents in chunk_user_contents])
+
+        # Merge the parts in order
+        for matches, gpt_output_dict in responses:
             if matches is not None:
-                clean_options_file, changed_value_dict_part, db_bench_args = cleanup_options_file(matches.group(2), db_bench_args)
+                clean_options_file, changed_value_dict_part, db_bench_args = apply_gpt_options(gpt_output_dict, db_bench_args)
                 reasoning += matches.group(1) + matches.group(3)
                 changed_value_dict.update(changed_value_dict_part)
 
@@ -118,20 +143,25 @@ def generate_option_file_with_gpt(case, previous_option_files, db_bench_args, de
         reasoning = ""
         changed_value_dict = {}
 
-        # Loop through each part and make API calls
+        # Make the API calls for all parts concurrently
+        chunk_user_contents = []
         for index, chunk_string in enumerate(user_contents):
             user_content = generate_default_user_content(chunk_string, previous_option_files, average_cpu_used, average_mem_used, test_name)
             if index == 0:
                 user_content += user_content_for_db_bench_args(db_bench_args)
-            matches = request_gpt(system_content, user_content, None, temperature)
+            chunk_user_contents.append(user_content)
+        responses = gather_async([request_chunk(system_content, user_content, temperature) for user_content in chunk_user_contents])
+
+        # Merge the parts in order
+        for matches, gpt_output_dict in responses:
             if matches is not None:
-                clean_options_file, changed_value_dict_part, db_bench_args = cleanup_options_file(matches.group(2), db_bench_args)
+                clean_options_file, changed_value_dict_part, db_bench_args = apply_gpt_options(gpt_output_dict, db_bench_args)
                 reasoning += matches.group(1) + matches.group(3)
                 changed_value_dict.update(changed_value_dict_part)
         
         return clean_options_file, db_bench_args, reasoning, changed_value_dict
 
-    if ABSTRACTION:
+    if constants.ABSTRACTION:
         previous_option_files = convert_options_to_randomdb(previous_option_files)
     
     switch = {
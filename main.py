@@ -1,16 +1,144 @@
-import utils.constants as constants
-from utils.graph import plot, plot_multiple
+from utils.config import load_config, set_config
+from utils.plot_service import plot, plot_multiple
 from utils.system_operations.fio_runner import get_fio_result
 from options_files.ops_options_file import parse_option_file_to_dict, get_initial_options_file
 
 import rocksdb.subprocess_manager as spm
-from utils.utils import log_update, store_best_option_file, path_of_db, store_diff_options_list
+from rocksdb.parallel_runner import benchmark_candidates
+from rocksdb.surrogate import rank_candidates
+from gpt.async_gpt_request import request_stats
+from gpt.gpt_request import rag_stats
+from utils.scoring import pareto_front, score
+from utils.utils import log_update, close_log_writer, set_log_iteration, store_best_option_file, path_of_db, store_diff_options_list
 from utils.system_operations.get_sys_info import system_info
 from gpt.prompts_generator import generate_option_file_with_gpt
 from trace_analyzer.analyzer import analyze_tracefile, generate_trace_model, save_model_as_json
 import os
 
-def main():
+def generate_candidates(config, db_path, fio_result, trace_result, options_files, db_bench_args,
+                        average_cpu_usage, average_memory_usage, count, temperature=0.4):
+    '''
+    Generate candidate options files from the same previous options file, with increasing temperature
+
+    Parameters:
+    - config (TuningConfig): The session config
+    - db_path (str): The base path of the database
+    - fio_result (str): The result of fio benchmark
+    - trace_result (str): The workload summary of the tracefile
+    - options_files (list): List of options files, benchmark results, reasoning and changed values
+    - db_bench_args (list): The current db_bench arguments
+    - average_cpu_usage (float): The average CPU usage of the previous run
+    - average_memory_usage (float): The average memory usage of the previous run
+    - count (int): The number of candidates
+    - temperature (float): The temperature of the first candidate, each next one is 0.1 higher
+
+    Returns:
+    - candidates (list): Tuples of (options, db_bench_args, reasoning, changed_value_dict), without
+        the candidates that failed to generate
+    '''
+    candidates = []
+    for k in range(count):
+        # cleanup_options_file merges into the options file on disk, so reset it for every candidate
+        with open(config.options_file_dir, "w") as f:
+            f.write(options_files[-1][0])
+
+        new_options_file, new_db_bench_args, reasoning, changed_value_dict = generate_option_file_with_gpt(
+            config.case_number, options_files, db_bench_args,
+            system_info(db_path, fio_result), trace_result, temperature + 0.1 * k,
+            average_cpu_usage, average_memory_usage,
+            config.test_name)
+        if not new_options_file:
+            log_update(f"[MFN] Failed to generate candidate {k}")
+            print(f"[MFN] Failed to generate candidate {k}")
+            continue
+        candidates.append((new_options_file, new_db_bench_args, reasoning, changed_value_dict))
+
+    with open(config.options_file_dir, "w") as f:
+        f.write(options_files[-1][0])
+
+    return candidates
+
+def screen_candidates(config, db_path, candidates, keep):
+    '''
+    Keep the most promising candidates. The surrogate model screens them first, then, with the
+    proxy tier enabled, it leaves proxy_eta times as many for short proxy runs to choose from.
+
+    Parameters:
+    - config (TuningConfig): The session config
+    - db_path (str): The base path of the database
+    - candidates (list): Tuples of (options, db_bench_args, reasoning, changed_value_dict)
+    - keep (int): The number of candidates kept
+
+    Returns:
+    - candidates (list): The kept candidates, in generation order
+    '''
+    surrogate_keep = keep * config.proxy_eta if config.proxy_tier else keep
+    if len(candidates) > surrogate_keep:
+        order, _ = rank_candidates(candidates, db_path, config)
+        kept = sorted(order[:surrogate_keep])
+        log_update(f"[MFN] Keeping candidates {kept} of {len(candidates)}")
+        print(f"[MFN] Keeping candidates {kept} of {len(candidates)}")
+        candidates = [candidates[i] for i in kept]
+    if config.proxy_tier:
+        candidates = spm.triage_candidates(db_path, candidates, keep, config)
+    return candidates
+
+def parallel_iteration(config, db_path, fio_result, trace_result, options_files, db_bench_args,
+                       average_cpu_usage, average_memory_usage, output_folder_dir):
+    '''
+    Generate candidate options files and benchmark one per worker concurrently. If more
+    candidates than workers are generated, the surrogate model chooses which are benchmarked.
+    Every candidate is generated from the same previous options file, with increasing temperature.
+
+    Parameters:
+    - config (TuningConfig): The session config
+    - db_path (str): The base path of the database
+    - fio_result (str): The result of fio benchmark
+    - trace_result (str): The workload summary of the tracefile
+    - options_files (list): List of options files, benchmark results, reasoning and changed values
+    - db_bench_args (list): The current db_bench arguments
+    - average_cpu_usage (float): The average CPU usage of the previous run
+    - average_memory_usage (float): The average memory usage of the previous run
+    - output_folder_dir (str): The output directory
+
+    Returns:
+    - accepted (list): Tuples of (options, benchmark_results, reasoning, changed_value_dict, db_bench_args,
+        average_cpu_usage, average_memory_usage) for the successful candidates, ordered by the objective
+        of the session with ties broken by candidate order, so the best candidate is last
+    '''
+    candidates = generate_candidates(config, db_path, fio_result, trace_result, options_files, db_bench_args,
+                                     average_cpu_usage, average_memory_usage,
+                                     max(config.parallel_workers, config.surrogate_candidates))
+    candidates = screen_candidates(config, db_path, candidates, config.parallel_workers)
+    if not candidates:
+        return []
+
+    results = benchmark_candidates(db_path, candidates, output_folder_dir)
+
+    accepted = []
+    for (_, new_db_bench_args, reasoning, changed_value_dict), (is_error, benchmark_results, cpu, mem, options) in zip(candidates, results):
+        if not is_error:
+            accepted.append((options, benchmark_results, reasoning, changed_value_dict, new_db_bench_args, cpu, mem))
+
+    # sorted() is stable, so candidates with equal scores keep their generation order
+    return sorted(accepted, key=lambda x: score(x[1], config))
+
+def log_pareto_front(config, options_files):
+    '''
+    Log the options files no other options file beats in all of the Pareto objectives
+
+    Parameters:
+    - config (TuningConfig): The session config
+    - options_files (list): List of options files, benchmark results, reasoning and changed values
+
+    Returns:
+    - None
+    '''
+    front = pareto_front(options_files, config=config)
+    log_update(f"[MFN] Pareto front over {config.pareto_objectives}: options files {front}")
+    print(f"[MFN] Pareto front over {config.pareto_objectives}: options files {front}")
+
+def main(config=None):
     '''
     Main function to run the project. This function will run the db_bench with the initial options file and then
     generate new options files using GPT API and run db_bench with the new options file. This function will also
@@ -19,42 +147,47 @@ def main():
     There will be a separate file for each iteration.
 
     Parameters:
-    - None
+    - config (TuningConfig, optional): The session config. Default is the config loaded from the command line.
+      It becomes the config of the calling thread and the threads it starts, which the modules
+      reading utils.constants use, so sessions run in separate threads keep separate settings.
 
     Returns:
     - None
     '''
+    if config is None:
+        config = load_config()
+    set_config(config)
 
     # initialize variables
     options_files = []
     options_list = []
 
     # Set up the path
-    output_folder_dir = constants.OUTPUT_PATH
+    output_folder_dir = config.output_path
     os.makedirs(output_folder_dir, exist_ok=True)
-    db_path = path_of_db()
-    fio_result = get_fio_result(constants.FIO_RESULT_PATH)
+    db_path = path_of_db(config)
+    fio_result = get_fio_result(config.fio_profile_dir, db_path)
 
-    log_update(f"[MFN] Starting the program with the case number: {constants.CASE_NUMBER}")
-    print(f"[MFN] Starting the program with the case number: {constants.CASE_NUMBER}")
+    log_update(f"[MFN] Starting the program with the case number: {config.case_number}")
+    print(f"[MFN] Starting the program with the case number: {config.case_number}")
 
     # Check if the tracefile is not None
-    if constants.TRACEFILE_PATH:
+    if config.tracefile_path:
         print("[MFN] Tracefile provided. Running trace analyzer.")
         log_update("[MFN] Tracefile provided. Running trace analyzer.")
 
-        trace_result = analyze_tracefile(constants.TRACEFILE_PATH)
+        trace_result = analyze_tracefile(config.tracefile_path)
         model_response = generate_trace_model(trace_result, "")
         json_model = save_model_as_json(model_response)
 
-        if constants.PRE_LOAD_CMD != "":
+        if config.pre_load_cmd != "":
             print("[MFN] Pre-load command not provided. Command necessary for TRACEFILE based runs.\n"
                   "Run with empty string if tracefile does not need preload. Exiting.")
             log_update("[MFN] Pre-load command not provided. Command necessary for TRACEFILE based runs."
                        "Run with empty string if tracefile does not need preload. Exiting.")
             exit(1)
 
-        if constants.TEST_NAME != "tracefile":
+        if config.test_name != "tracefile":
             print("[MFN] Test name is not tracefile. You might want to check that.")
             log_update("[MFN] Test name is not tracefile. You might want to check that.")
 
@@ -81,10 +214,11 @@ def main():
         options_files.append((options, benchmark_results, reasoning, ""))
         db_bench_args = []
 
-        iteration_count = constants.ITERATION_COUNT
+        iteration_count = config.iteration_count
 
         for i in range(1, iteration_count + 1):
 
+            set_log_iteration(i)
             log_update(f"[MFN] Starting iteration {i}")
             log_update(f"[MFN] Querying ChatGPT for next options file")
 
@@ -92,6 +226,27 @@ def main():
             print(f"[MFN] Starting iteration {i}")
 
             print("[MFN] Querying ChatGPT for next options file")
+
+            if config.parallel_workers > 1:
+                accepted = parallel_iteration(config, db_path, fio_result, trace_result, options_files, db_bench_args,
+                                              average_cpu_usage, average_memory_usage, output_folder_dir)
+                if not accepted:
+                    log_update("[MFN] No candidate options file succeeded. Exiting.")
+                    print("[MFN] No candidate options file succeeded. Exiting.")
+                    exit(1)
+
+                for options, benchmark_results, reasoning, changed_value_dict, db_bench_args, average_cpu_usage, average_memory_usage in accepted:
+                    options_files.append((options, benchmark_results, reasoning, changed_value_dict))
+                    options_list.append(parse_option_file_to_dict(options))
+
+                plot([e[1]["ops_per_sec"] for e in options_files], f"OpsPerSec {config.test_name}",
+                     f"{output_folder_dir}/OpsPerSec.png")
+                plot_multiple(options_files, "Ops Per Second",
+                              f"{output_folder_dir}/opsM_per_sec.png")
+                store_diff_options_list(options_list, output_folder_dir)
+                log_pareto_front(config, options_files)
+                continue
+
             temperature = 0.4
             retry_counter = 5
             generated = False
@@ -99,11 +254,21 @@ def main():
             for gpt_query_count in range(retry_counter, 0, -1):
                 # Generate new options file with retry limit of 5
 
-                new_options_file, db_bench_args, reasoning, changed_value_dict = generate_option_file_with_gpt(
-                    constants.CASE_NUMBER, options_files, db_bench_args,
-                    system_info(db_path, fio_result), trace_result, temperature,
-                    average_cpu_usage, average_memory_usage, 
-                    constants.TEST_NAME)
+                if config.surrogate_candidates > 1:
+                    # Only the candidate the surrogate model finds most promising is benchmarked
+                    candidates = generate_candidates(config, db_path, fio_result, trace_result, options_files, db_bench_args,
+                                                     average_cpu_usage, average_memory_usage,
+                                                     config.surrogate_candidates, temperature)
+                    candidates = screen_candidates(config, db_path, candidates, 1)
+                    new_options_file = None
+                    if candidates:
+                        new_options_file, db_bench_args, reasoning, changed_value_dict = candidates[0]
+                else:
+                    new_options_file, db_bench_args, reasoning, changed_value_dict = generate_option_file_with_gpt(
+                        config.case_number, options_files, db_bench_args,
+                        system_info(db_path, fio_result), trace_result, temperature,
+                        average_cpu_usage, average_memory_usage, 
+                        config.test_name)
                 if new_options_file is None:
                     log_update(f"[MFN] Failed to generate options file. Retrying. Retries left: {gpt_query_count - 1}")
                     print("[MFN] Failed to generate options file. Retrying. Retries left: ", gpt_query_count - 1)
@@ -129,7 +294,7 @@ def main():
                 options_list.append(parsed_options)
 
                 # Graph Ops/Sec
-                plot([e[1]["ops_per_sec"] for e in options_files], f"OpsPerSec {constants.TEST_NAME}",
+                plot([e[1]["ops_per_sec"] for e in options_files], f"OpsPerSec {config.test_name}",
                      f"{output_folder_dir}/OpsPerSec.png")
                 plot_multiple(options_files, "Ops Per Second",
                               f"{output_folder_dir}/opsM_per_sec.png")
@@ -140,17 +305,23 @@ def main():
                 exit(1)
             
             store_diff_options_list(options_list, output_folder_dir)
+            log_pareto_front(config, options_files)
 
         store_best_option_file(options_files, output_folder_dir)
 
         # Graph Ops/Sec
-        plot([e[1]["ops_per_sec"] for e in options_files], f"OpsPerSec {constants.TEST_NAME}",
+        plot([e[1]["ops_per_sec"] for e in options_files], f"OpsPerSec {config.test_name}",
              f"{output_folder_dir}/OpsPerSec.png")
         plot_multiple(options_files, "Ops Per Second",
                       f"{output_folder_dir}/opsM_per_sec.png")
         
         store_diff_options_list(options_list, output_folder_dir)
 
+        log_update(f"[MFN] LLM request summary: {request_stats()}")
+        if config.rag:
+            log_update(f"[MFN] RAG summary: {rag_stats()}")
+        close_log_writer()
+
 
 if __name__ == "__main__":
     main()
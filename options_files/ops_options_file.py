@@ -3,12 +3,14 @@ import re
 import configparser
 
 from abstraction.abstraction import convert_options_to_rocksdb
-from utils.constants import ABSTRACTION, DEFAULT_OPTION_FILE_DIR, INITIAL_OPTIONS_FILE_NAME, OPTIONS_FILE_DIR
+from utils import constants
 from utils.filter import BLACKLIST, DB_BENCH_ARGS
 from utils.parse import dict_to_configparser, configparser_to_string
 from utils.utils import log_update, log_gpt_response
-from gpt.gpt_request import request_gpt_with_structured_output
+from gpt.gpt_request import request_gpt_with_structured_output_async
+from gpt.async_gpt_request import run_async
 from utils.options_list import RocksDBOptions
+from options_files.option_extractor import extract_options_locally, EXTRACTION_MIN_CONFIDENCE
 
 def parse_gpt_text_to_dict(gpt_output_text):
     '''
@@ -20,7 +22,7 @@ def parse_gpt_text_to_dict(gpt_output_text):
     Returns:
     - options_dict (dict): A dictionary containing the parsed data
     '''
-    if ABSTRACTION:
+    if constants.ABSTRACTION:
         gpt_output_text = convert_options_to_rocksdb(gpt_output_text)
 
     options_dict = {}
@@ -42,25 +44,29 @@ def parse_gpt_text_to_dict(gpt_output_text):
 
     return options_dict
 
-def cleanup_options_file(gpt_options_text, prev_db_bench_args):
-    """
-    Function to clean up the options file generated by GPT
-    - replace the values of the options in the original options file with the values generated by GPT-4
-        eliminate 2 secnarios:
-        1. ```ini<code>```
-        2. ```<code>...``` w/ multiple code blocks
+async def extract_gpt_options_async(gpt_options_text):
+    '''
+    Function to extract the options being tweaked in the text generated by GPT.
+    The text is parsed locally first and only sent to the structured output call if
+    the local extraction is not confident.
 
     Parameters:
-    - gpt_options_text: string containing the options file generated by GPT-4
+    - gpt_options_text (str): The options file generated by GPT
 
     Returns:
-    - config_string: string containing the options file in the original format
-    """
-    
+    - gpt_output_dict (dict): The options and their new values
+    '''
+    if constants.LOCAL_OPTION_EXTRACTION:
+        gpt_output_dict, confidence = extract_options_locally(gpt_options_text)
+        if confidence >= EXTRACTION_MIN_CONFIDENCE:
+            log_update(f"[OPS] Extracted {len(gpt_output_dict)} options locally (confidence {confidence:.2f})")
+            return gpt_output_dict
+        log_update(f"[OPS] Local extraction confidence {confidence:.2f} is low, using structured output")
+
     system_content = None
     user_contents = ["Extract the different options that are being tweaked in the following text. Set the value to Null if the input does not provide it.\n\n" + gpt_options_text]
     assistant_content = None
-    response = request_gpt_with_structured_output(system_content, user_contents, assistant_content, RocksDBOptions, 1.0)
+    response = await request_gpt_with_structured_output_async(system_content, user_contents, assistant_content, RocksDBOptions, 1.0)
 
     log_gpt_response(user_contents, str(response.model_dump()))
 
@@ -73,15 +79,47 @@ def cleanup_options_file(gpt_options_text, prev_db_bench_args):
                 if v is not None:
                     gpt_output_dict[k] = v
 
+    return gpt_output_dict
+
+def cleanup_options_file(gpt_options_text, prev_db_bench_args):
+    """
+    Function to clean up the options file generated by GPT
+    - replace the values of the options in the original options file with the values generated by GPT-4
+        eliminate 2 secnarios:
+        1. ```ini<code>```
+        2. ```<code>...``` w/ multiple code blocks
+
+    Parameters:
+    - gpt_options_text: string containing the options file generated by GPT-4
+
+    Returns:
+    - config_string: string containing the options file in the original format
+    """
+    gpt_output_dict = run_async(extract_gpt_options_async(gpt_options_text))
+    return apply_gpt_options(gpt_output_dict, prev_db_bench_args)
+
+def apply_gpt_options(gpt_output_dict, prev_db_bench_args):
+    """
+    Function to merge the extracted options into the current options file and db_bench arguments
+
+    Parameters:
+    - gpt_output_dict: dictionary of the options and their new values
+    - prev_db_bench_args: list of the current db_bench arguments
+
+    Returns:
+    - config_string: string containing the options file in the original format
+    - changed_value: dictionary of the options that changed
+    - new_bench_args: list of the new db_bench arguments
+    """
     changed_value = {}
-    clean_output_dict = parse_option_file_to_dict(open(f"{OPTIONS_FILE_DIR}").read())
+    clean_output_dict = parse_option_file_to_dict(open(f"{constants.OPTIONS_FILE_DIR}").read())
 
     args_dict = parse_db_bench_args_to_dict(prev_db_bench_args)
 
     # Update the original options with GPT-4 generated value
     for key, value in gpt_output_dict.items():
         if key in DB_BENCH_ARGS:
-            if value == "-1":
+            if str(value) == "-1":
                 continue
             if key not in args_dict or args_dict[key] != value:
                 args_dict[key] = value
@@ -105,7 +143,7 @@ def cleanup_options_file(gpt_options_text, prev_db_bench_args):
     new_bench_args = [f"--{k}={v}" for k, v in args_dict.items()]
 
     # Save to a file
-    with open(f"{OPTIONS_FILE_DIR}", "w") as file:
+    with open(f"{constants.OPTIONS_FILE_DIR}", "w") as file:
         file.write(config_string)
     return config_string, changed_value, new_bench_args
 
@@ -136,8 +174,8 @@ def get_initial_options_file():
     - options (str): The initial options file
     - reasoning (str): The reasoning behind the options file
     '''
-    initial_options_file_path = os.path.join(DEFAULT_OPTION_FILE_DIR,
-                                        INITIAL_OPTIONS_FILE_NAME)
+    initial_options_file_path = os.path.join(constants.DEFAULT_OPTION_FILE_DIR,
+                                        constants.INITIAL_OPTIONS_FILE_NAME)
     with open(initial_options_file_path, "r") as f:
         options = f.read()
 
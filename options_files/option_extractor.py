@@ -0,0 +1,218 @@
+import re
+import typing
+
+from pydantic import BaseModel
+from abstraction.dictionary import OPTION_MAP
+from utils.filter import DB_BENCH_ARGS
+from utils.options_list import RocksDBOptions
+
+# Below this share of recognized and valid options the reply is sent to the structured output call
+EXTRACTION_MIN_CONFIDENCE = 0.8
+
+UNIT_MULTIPLIERS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+NULL_VALUES = {"", "null", "none", "n/a", "na", "-", "unchanged", "default"}
+VALUE_COLUMN_NAMES = ["new value", "new", "recommended value", "recommended", "suggested value", "suggested",
+                      "proposed value", "proposed", "value"]
+
+IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_.\-]*$")
+INTEGER_PATTERN = re.compile(r"^(-?\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?$", re.IGNORECASE)
+ASSIGNMENT_PATTERN = re.compile(r"^([^=:]+?)\s*(?:=|:)\s*(.*)$")
+LIST_PREFIX_PATTERN = re.compile(r"^(?:[-*+]|\d+[.)])\s+")
+
+
+def unwrap_optional(annotation):
+    '''
+    Function to get the type wrapped by Optional[...]
+
+    Parameters:
+    - annotation (type): The annotation of a field
+
+    Returns:
+    - annotation (type): The annotation without Optional
+    '''
+    args = [a for a in typing.get_args(annotation) if a is not type(None)]
+    return args[0] if args else annotation
+
+
+def build_name_index():
+    '''
+    Function to build the lookup of option names from the RocksDBOptions schema and DB_BENCH_ARGS
+
+    Returns:
+    - index (dict): Lower case option name or alias -> (option name, type)
+    '''
+    index = {}
+    for section in RocksDBOptions.model_fields.values():
+        section_model = unwrap_optional(section.annotation)
+        if not (isinstance(section_model, type) and issubclass(section_model, BaseModel)):
+            continue
+        for name, field in section_model.model_fields.items():
+            index[name.lower()] = (name, unwrap_optional(field.annotation))
+
+    for name in DB_BENCH_ARGS:
+        index.setdefault(name.lower(), (name, str))
+
+    # Abstracted names map back to the RocksDB names
+    for name, alias in OPTION_MAP.items():
+        if name.lower() in index:
+            index.setdefault(alias.lower(), index[name.lower()])
+
+    return index
+
+
+NAME_INDEX = build_name_index()
+
+
+def normalize_name(name):
+    '''
+    Function to normalize an option name as written by the LLM
+
+    Parameters:
+    - name (str): The option name
+
+    Returns:
+    - name (str): The lower case name without flags, quotes, markup or section prefixes
+    '''
+    name = name.strip().strip("`*_'\"").strip()
+    name = LIST_PREFIX_PATTERN.sub("", name)
+    name = name.lstrip("-").strip("`*'\"").strip()
+    # CFOptions.write_buffer_size -> write_buffer_size
+    name = name.split(".")[-1]
+    return name.lower()
+
+
+def clean_value(value):
+    '''
+    Function to strip comments, markup and old values from an option value
+
+    Parameters:
+    - value (str): The raw value
+
+    Returns:
+    - value (str): The cleaned value
+    '''
+    value = value.split("#")[0].split("//")[0].strip()
+    # "64MB -> 128MB" keeps the new value
+    for arrow in ["->", "=>", "→"]:
+        if arrow in value:
+            value = value.split(arrow)[-1].strip()
+    value = value.strip("`*'\"").strip()
+    return value.rstrip(",;").strip()
+
+
+def coerce_value(value, field_type):
+    '''
+    Function to convert a value to the type of the option, as the structured output does
+
+    Parameters:
+    - value (str): The cleaned value
+    - field_type (type): The type of the option
+
+    Returns:
+    - value: The converted value, or None if it does not fit the type
+    '''
+    if field_type is int:
+        match = INTEGER_PATTERN.match(value.replace(",", "").replace("_", ""))
+        if match is None:
+            return None
+        number = float(match.group(1)) * UNIT_MULTIPLIERS[match.group(2).lower()]
+        if number != int(number):
+            return None
+        return int(number)
+    if field_type is float:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return value
+
+
+def split_table_row(line):
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def iter_assignments(text):
+    '''
+    Function to find the (name, value) pairs in a reply. Handles ini sections, key=value,
+    key: value, --flag=value and markdown tables.
+
+    Parameters:
+    - text (str): The reply of the LLM
+
+    Returns:
+    - pairs (generator): Tuples of the raw name and value
+    '''
+    table_value_column = None
+
+    for line in text.splitlines():
+        stripped = line.strip()
+
+        if not stripped or stripped.startswith(("```", "#", "//", ";")):
+            table_value_column = None
+            continue
+        # ini section headers
+        if stripped.startswith("[") and stripped.endswith("]"):
+            continue
+
+        if stripped.startswith("|"):
+            cells = split_table_row(stripped)
+            # Separator row
+            if all(set(cell) <= set("-: ") for cell in cells):
+                continue
+            headers = [cell.lower().strip("*` ") for cell in cells]
+            if table_value_column is None and normalize_name(cells[0]) not in NAME_INDEX:
+                # Header row, remember which column holds the new value
+                table_value_column = next((headers.index(name) for name in VALUE_COLUMN_NAMES if name in headers), 1)
+                continue
+            value_column = table_value_column if table_value_column is not None else 1
+            if len(cells) > value_column:
+                yield cells[0], cells[value_column]
+            continue
+
+        table_value_column = None
+        match = ASSIGNMENT_PATTERN.match(LIST_PREFIX_PATTERN.sub("", stripped))
+        if match:
+            yield match.group(1), match.group(2)
+
+
+def extract_options_locally(text):
+    '''
+    Function to extract the options being tweaked in a reply without an LLM call
+
+    Parameters:
+    - text (str): The reply of the LLM
+
+    Returns:
+    - options (dict): Option name -> value converted to the type of the option
+    - confidence (float): The share of option-like lines that were recognized with a valid value
+    '''
+    options = {}
+    recognized = rejected = 0
+
+    for raw_name, raw_value in iter_assignments(text):
+        name = normalize_name(raw_name)
+        if not IDENTIFIER_PATTERN.match(name):
+            continue
+
+        if name not in NAME_INDEX:
+            # Prose such as "Note: ..." is not counted, unknown option names are
+            if "_" in name:
+                rejected += 1
+            continue
+
+        option, field_type = NAME_INDEX[name]
+        value = clean_value(raw_value)
+        if value.lower() in NULL_VALUES:
+            continue
+
+        converted = coerce_value(value, field_type)
+        if converted is None:
+            rejected += 1
+            continue
+
+        options[option] = converted
+        recognized += 1
+
+    if recognized == 0:
+        return options, 0.0
+    return options, recognized / (recognized + rejected)
@@ -0,0 +1,144 @@
+import math
+import numpy as np
+
+from utils import constants
+
+# Decisions returned by EarlyStopMonitor.update
+CONTINUE = "continue"
+WORSE = "worse"
+BETTER = "better"
+
+
+class EarlyStopMonitor:
+    '''
+    Sequential test on the per-second throughput of a running candidate against the incumbent.
+
+    The first samples are treated as warmup until the throughput trend flattens, i.e. the
+    slope of a least-squares fit over the last `warmup_window` samples changes the mean by
+    less than `slope_tolerance` across the window. After warmup the samples are grouped into
+    batches of `batch_size` seconds. Batch means are close to independent even though the
+    per-second samples are autocorrelated, so a confidence interval on their mean is used
+    to decide. The candidate is worse once the upper bound is below `margin * incumbent`,
+    and better once the lower bound is above the incumbent.
+    '''
+
+    def __init__(self, incumbent, early_accept=None, margin=0.95, z=2.576, min_warmup=10, max_warmup=120,
+                 warmup_window=10, slope_tolerance=0.05, batch_size=5, min_batches=4):
+        '''
+        Parameters:
+        - incumbent (float): The throughput of the current best options file in ops/sec
+        - early_accept (bool): Whether a confidently better candidate may finish early. Default is EARLY_ACCEPT
+        - margin (float): Fraction of the incumbent the candidate has to be confidently below to be stopped.
+          Slightly below 1 because the incumbent is itself a single noisy measurement
+        - z (float): The z-score of the confidence bounds. 2.576 is a 99% two-sided interval
+        - min_warmup (int): Minimum number of warmup samples
+        - max_warmup (int): Maximum number of warmup samples, even if the trend has not flattened
+        - warmup_window (int): Number of samples the trend is fit over
+        - slope_tolerance (float): Maximum relative change of the fit across the window once flattened
+        - batch_size (int): Number of samples per batch
+        - min_batches (int): Minimum number of batches before a decision
+        '''
+        self.incumbent = float(incumbent)
+        self.early_accept = constants.EARLY_ACCEPT if early_accept is None else early_accept
+        self.margin = margin
+        self.z = z
+        self.min_warmup = min_warmup
+        self.max_warmup = max_warmup
+        self.warmup_window = warmup_window
+        self.slope_tolerance = slope_tolerance
+        self.batch_size = batch_size
+        self.min_batches = min_batches
+
+        self.samples = []
+        self.warmup_end = None
+        self.decision = CONTINUE
+        self.mean = None
+        self.lower = None
+        self.upper = None
+        self.checks = []
+
+    def update(self, seconds, ops_per_sec):
+        '''
+        Add one throughput sample and re-evaluate the test
+
+        Parameters:
+        - seconds (float): The elapsed time of the sample as reported by db_bench
+        - ops_per_sec (float): The throughput over the last interval
+
+        Returns:
+        - decision (str): CONTINUE, WORSE or BETTER
+        '''
+        self.samples.append((seconds, ops_per_sec))
+
+        if self.decision != CONTINUE:
+            return self.decision
+
+        if self.warmup_end is None:
+            if self.warmup_finished():
+                self.warmup_end = len(self.samples)
+            return CONTINUE
+
+        values = [ops for _, ops in self.samples[self.warmup_end:]]
+        batches = len(values) // self.batch_size
+        if batches < self.min_batches or len(values) % self.batch_size != 0:
+            return CONTINUE
+
+        batch_means = np.array(values[:batches * self.batch_size]).reshape(batches, self.batch_size).mean(axis=1)
+        self.mean = float(batch_means.mean())
+        half_width = self.z * float(batch_means.std(ddof=1)) / math.sqrt(batches)
+        self.lower = self.mean - half_width
+        self.upper = self.mean + half_width
+
+        if self.upper < self.margin * self.incumbent:
+            self.decision = WORSE
+        elif self.early_accept and self.lower > self.incumbent:
+            self.decision = BETTER
+
+        self.checks.append({
+            "seconds": seconds,
+            "batches": batches,
+            "mean": self.mean,
+            "lower": self.lower,
+            "upper": self.upper,
+            "decision": self.decision,
+        })
+        return self.decision
+
+    def warmup_finished(self):
+        '''
+        Check if the throughput trend has flattened
+
+        Returns:
+        - finished (bool): True once warmup is over
+        '''
+        count = len(self.samples)
+        if count >= self.max_warmup:
+            return True
+        if count < max(self.min_warmup, self.warmup_window):
+            return False
+
+        window = np.array([ops for _, ops in self.samples[-self.warmup_window:]])
+        mean = window.mean()
+        if mean <= 0:
+            return False
+        slope = np.polyfit(np.arange(self.warmup_window), window, 1)[0]
+        return abs(slope * self.warmup_window) / mean < self.slope_tolerance
+
+    def trace(self):
+        '''
+        The decision trace of the monitor
+
+        Returns:
+        - trace (dict): The parameters, warmup end, every check and the final decision
+        '''
+        return {
+            "incumbent": self.incumbent,
+            "margin": self.margin,
+            "z": self.z,
+            "batch_size": self.batch_size,
+            "early_accept": self.early_accept,
+            "warmup_end_seconds": self.samples[self.warmup_end - 1][0] if self.warmup_end else None,
+            "samples": len(self.samples),
+            "checks": self.checks,
+            "decision": self.decision,
+        }
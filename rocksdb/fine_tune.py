@@ -1,9 +1,10 @@
 import os
 import rocksdb.subprocess_manager as spm
 from gpt.fine_tuning_prompt import generate_fine_tuning_options
-from rocksdb.parse_db_bench_output import parse_db_bench_output
-from utils.constants import DB_BENCH_PATH, FINETUNE_ITERATION, OPTIONS_FILE_DIR, OUTPUT_PATH, TEST_NAME
-from utils.graph import plot_2axis, plot_finetune
+from utils import constants
+from utils.plot_service import plot_2axis, plot_finetune
+from utils.scoring import attach_resources, best_entry
+from utils.timeseries_store import throughput_series
 from utils.utils import log_update, store_db_bench_output
 
 fine_tune_result = []
@@ -15,35 +16,32 @@ def fine_tuning(database_path, options, reasoning, changed_value_dict, previous_
     print("[FNT] Start fine tuning")
 
     # Try initial option from GPT
-    output, average_cpu_usage, average_memory_usage, options = spm.db_bench(
-        DB_BENCH_PATH, database_path, options, 0, TEST_NAME, previous_throughput, options_files, db_bench_args)
-    
-    benchmark_results = parse_db_bench_output(output)
+    benchmark_results, average_cpu_usage, average_memory_usage, options = spm.db_bench(
+        constants.DB_BENCH_PATH, database_path, options, 0, constants.TEST_NAME, previous_throughput, options_files, db_bench_args)
 
     # If error, throw to SPM
     if (benchmark_results.get("error") is not None) or (benchmark_results['data_speed'] is None):
-        return output, average_cpu_usage, average_memory_usage, options, changed_value_dict
+        return benchmark_results, average_cpu_usage, average_memory_usage, options, changed_value_dict
         # log_update("Fine tuner error! db_bench Benchmark failed!")
         # print("Fine tuner error! db_bench Benchmark failed!")
         # exit(1)
     
     # Save initial fine tuning option
-    contents = os.listdir(OUTPUT_PATH)
+    contents = os.listdir(constants.OUTPUT_PATH)
     ini_file_count = len([f for f in contents if f.endswith(".ini")])
 
-    output_file_dir = OUTPUT_PATH + f"/finetune-{ini_file_count}"
+    output_file_dir = constants.OUTPUT_PATH + f"/finetune-{ini_file_count}"
     os.makedirs(output_file_dir, exist_ok=True)
 
     store_db_bench_output(output_file_dir, "0.ini",
                             benchmark_results, options, reasoning, changed_value_dict)
-    plot_2axis(*benchmark_results["ops_per_second_graph"],
+    plot_2axis(*throughput_series(benchmark_results),
                 f"Ops Per Second - {benchmark_results['ops_per_sec']}",
                 f"{output_file_dir}/ops_per_sec_0.png")
     
     # Add initial options and throughput
     fine_tuning_options = [(
         options, 
-        output,
         benchmark_results, 
         average_cpu_usage, 
         average_memory_usage,
@@ -51,20 +49,18 @@ def fine_tuning(database_path, options, reasoning, changed_value_dict, previous_
         changed_value_dict
     )]
 
-    for iter in range(1, FINETUNE_ITERATION+1):
+    for iter in range(1, constants.FINETUNE_ITERATION+1):
         log_update(f"[FNT] Fine tuning iteration {iter}")
         print(f"[FNT] Fine tuning iteration {iter}")
         
         options, db_bench_args, reasons, changes = generate_fine_tuning_options(fine_tuning_options, db_bench_args, changed_value_dict)
 
-        output, average_cpu_usage, average_memory_usage, options = spm.db_bench(
-            DB_BENCH_PATH, database_path, options, 0, TEST_NAME, previous_throughput, options_files, db_bench_args)
+        benchmark_results, average_cpu_usage, average_memory_usage, options = spm.db_bench(
+            constants.DB_BENCH_PATH, database_path, options, 0, constants.TEST_NAME, previous_throughput, options_files, db_bench_args)
         
         # Restore previous options_file
-        with open(f"{OPTIONS_FILE_DIR}", "w") as f:
+        with open(f"{constants.OPTIONS_FILE_DIR}", "w") as f:
             f.write(options_files[-1][0])
-        
-        benchmark_results = parse_db_bench_output(output)
 
         # If error, hold up
         if (benchmark_results.get("error") is not None) or (benchmark_results['data_speed'] is None):
@@ -76,20 +72,19 @@ def fine_tuning(database_path, options, reasoning, changed_value_dict, previous_
                                   benchmark_results, options, reasons, changes)
             
             # Restore previous options_file
-            with open(f"{OPTIONS_FILE_DIR}", "w") as f:
+            with open(f"{constants.OPTIONS_FILE_DIR}", "w") as f:
                 f.write(options_files[-1][0])
                 
             continue
 
         store_db_bench_output(output_file_dir, f"{iter}.ini",
                               benchmark_results, options, reasons, changes)
-        plot_2axis(*benchmark_results["ops_per_second_graph"],
+        plot_2axis(*throughput_series(benchmark_results),
                    f"Ops Per Second - {benchmark_results['ops_per_sec']}",
                    f"{output_file_dir}/ops_per_sec_{iter}.png")
         
         fine_tuning_options.append((
             options,
-            output, 
             benchmark_results, 
             average_cpu_usage, 
             average_memory_usage,
@@ -99,16 +94,17 @@ def fine_tuning(database_path, options, reasoning, changed_value_dict, previous_
         
     # Plot finetune ops per sec
     if len(fine_tune_result) > 1:
-        fine_tune_result.append([e[2]["ops_per_sec"] for e in fine_tuning_options])
-        plot_finetune(fine_tune_result, f"Finetune OpsPerSec {TEST_NAME}", f"{OUTPUT_PATH}/Finetune_OpsPerSec.png")
+        fine_tune_result.append([e[1]["ops_per_sec"] for e in fine_tuning_options])
+        plot_finetune(fine_tune_result, f"Finetune OpsPerSec {constants.TEST_NAME}", f"{constants.OUTPUT_PATH}/Finetune_OpsPerSec.png")
 
     # Choose the best options
-    options, output, _, average_cpu_usage, average_memory_usage, _, changed_value_dict = max(
-        fine_tuning_options, key=lambda x: x[2]["ops_per_sec"])
+    for entry in fine_tuning_options:
+        attach_resources(entry[1], entry[2], entry[3])
+    options, benchmark_results, average_cpu_usage, average_memory_usage, _, changed_value_dict = best_entry(fine_tuning_options)
 
     log_update("[FNT] Fine tuning done")
     log_update("-"*50)
     print("[FNT] Fine tuning done")
     print("-"*50)
 
-    return output, average_cpu_usage, average_memory_usage, options, changed_value_dict
+    return benchmark_results, average_cpu_usage, average_memory_usage, options, changed_value_dict
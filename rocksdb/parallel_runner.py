@@ -0,0 +1,165 @@
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from rocksdb.subprocess_manager import pre_tasks, generate_db_bench_command, run_in_cgroup
+from rocksdb.result_cache import result_cache_key, lookup_result, record_result
+from rocksdb.surrogate import record_observation
+from rocksdb.proxy_tier import record_full_result
+from utils import constants
+from utils.config import in_session
+from utils.plot_service import plot_2axis
+from utils.scoring import attach_resources
+from utils.timeseries_store import throughput_series
+from utils.utils import log_update, store_db_bench_output
+
+
+def worker_slot(db_path, index, workers):
+    '''
+    Resources owned by a single parallel worker
+
+    Parameters:
+    - db_path (str): The base path of the database
+    - index (int): The index of the worker
+    - workers (int): The total number of workers sharing the resource budget
+
+    Returns:
+    - slot (dict): The DB path, options file, cgroup name and resource limits of the worker
+    '''
+    return {
+        "workers": workers,
+        "db_path": f"{db_path}_w{index}",
+        "options_file": f"{constants.OUTPUT_PATH}/options_file_w{index}.ini",
+        "cgroup_name": f"{constants.CGROUP_NAME}_w{index}",
+        "cpu_limit": max(1, constants.CGROUP_CPU_LIMIT // workers),
+        "memory_limit": constants.CGROUP_MEMORY_LIMIT // workers,
+    }
+
+
+def slot_cache_key(slot, options, db_bench_args):
+    '''
+    Function to compute the result cache key of a candidate run in a worker slot
+
+    Parameters:
+    - slot (dict): The worker slot as returned by worker_slot
+    - options (str): The options file
+    - db_bench_args (list): Extra arguments passed to db_bench
+
+    Returns:
+    - key (str): The cache key, covering the resource share of the slot
+    '''
+    return result_cache_key(options, db_bench_args, cpu_limit=slot["cpu_limit"],
+                            memory_limit=slot["memory_limit"], workers=slot["workers"])
+
+
+def run_candidate(slot, options, db_bench_args):
+    '''
+    Run db_bench for one candidate options file inside its worker slot
+
+    Parameters:
+    - slot (dict): The worker slot as returned by worker_slot
+    - options (str): The options file to be used
+    - db_bench_args (list): Extra arguments to be passed to db_bench
+
+    Returns:
+    - benchmark_results (dict): The parsed output of db_bench
+    - avg_cpu_used (float): The average CPU usage during the run
+    - avg_mem_used (float): The average memory usage during the run
+    '''
+    with open(slot["options_file"], "w") as f:
+        f.write(options)
+
+    # Dynamic options share a single mmap file, so workers always run with static options
+    command = generate_db_bench_command(constants.DB_BENCH_PATH, slot["db_path"], options, 0, constants.TEST_NAME, db_bench_args,
+                                        options_file_path=slot["options_file"], dynamic_options=False)
+
+    log_update(f"[PAR] Executing db_bench in {slot['cgroup_name']} with command: {command}")
+    print(f"[PAR] Executing db_bench in {slot['cgroup_name']}")
+
+    benchmark_results, avg_cpu_used, avg_mem_used = run_in_cgroup(command, slot["cgroup_name"], slot["cpu_limit"], slot["memory_limit"])
+    record_result(slot_cache_key(slot, options, db_bench_args), benchmark_results, avg_cpu_used, avg_mem_used)
+    record_observation(options, db_bench_args, benchmark_results, slot["db_path"])
+    # Proxy runs are paired with the candidate by the key of its full-budget run
+    record_full_result(result_cache_key(options, db_bench_args), benchmark_results)
+    return benchmark_results, avg_cpu_used, avg_mem_used
+
+
+def reset_slots(slots):
+    '''
+    Reset the environment of all worker slots before a wave of runs.
+    The cache is flushed once for the whole wave instead of once per worker.
+
+    Parameters:
+    - slots (list): The worker slots
+
+    Returns:
+    - None
+    '''
+    for slot in slots[1:]:
+        subprocess.run(["rm", "-rf", slot["db_path"]], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
+    pre_tasks(slots[0]["db_path"], 0)
+
+
+def benchmark_candidates(db_path, candidates, output_file_dir, workers=None):
+    '''
+    Benchmark several candidate options files concurrently. The candidates are run in waves
+    of `workers` runs, each worker with its own DB path, options file and cgroup slice. The
+    results are stored in the same order as the candidates, independent of completion order.
+
+    Parameters:
+    - db_path (str): The base path of the database
+    - candidates (list): Tuples of (options, db_bench_args, reasoning, changed_value_dict)
+    - output_file_dir (str): The output directory
+    - workers (int): The number of concurrent db_bench runs. Default is PARALLEL_WORKERS
+
+    Returns:
+    - results (list): Tuples of (is_error, benchmark_results, average_cpu_usage, average_memory_usage, options)
+        in candidate order
+    '''
+    # The slots are fixed before the cache lookup, the cache keys depend on their resource share
+    workers = max(1, min(workers or constants.PARALLEL_WORKERS, len(candidates)))
+    slots = [worker_slot(db_path, i, workers) for i in range(workers)]
+
+    # Candidates that were already measured with the same resources are not run again
+    outputs = [lookup_result(slot_cache_key(slots[0], options, db_bench_args)) for options, db_bench_args, _, _ in candidates]
+    pending = [i for i, output in enumerate(outputs) if output is None]
+
+    log_update(f"[PAR] Benchmarking {len(pending)} of {len(candidates)} candidates with {workers} workers")
+    print(f"[PAR] Benchmarking {len(pending)} of {len(candidates)} candidates with {workers} workers")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for wave_start in range(0, len(pending), workers):
+            wave = pending[wave_start:wave_start + workers]
+            reset_slots(slots)
+            futures = [
+                executor.submit(in_session(run_candidate), slots[i], candidates[index][0], candidates[index][1])
+                for i, index in enumerate(wave)
+            ]
+            for index, future in zip(wave, futures):
+                outputs[index] = future.result()
+
+    results = []
+    for (options, _, reasoning, changed_value_dict), (benchmark_results, avg_cpu_used, avg_mem_used) in zip(candidates, outputs):
+        contents = os.listdir(output_file_dir)
+        ini_file_count = len([f for f in contents if f.endswith(".ini")])
+
+        if benchmark_results.get("error") is not None or benchmark_results.get("data_speed") is None:
+            log_update(f"[PAR] Candidate failed, the error is: {benchmark_results.get('error')}")
+            print("[PAR] Candidate failed, the error is: ", benchmark_results.get("error"))
+            store_db_bench_output(output_file_dir, f"{ini_file_count}-incorrect_options.ini",
+                                  benchmark_results, options, reasoning, changed_value_dict)
+            results.append((True, benchmark_results, avg_cpu_used, avg_mem_used, options))
+            continue
+
+        attach_resources(benchmark_results, avg_cpu_used, avg_mem_used)
+        store_db_bench_output(output_file_dir, f"{ini_file_count}.ini",
+                              benchmark_results, options, reasoning, changed_value_dict)
+        plot_2axis(*throughput_series(benchmark_results),
+                   f"Ops Per Second - {benchmark_results['ops_per_sec']}",
+                   f"{output_file_dir}/ops_per_sec_{ini_file_count}.png")
+        log_update(f"[PAR] Candidate result: {benchmark_results['ops_per_sec']} ops/sec. "
+                   f"Avg CPU and Memory usage: {avg_cpu_used}% and {avg_mem_used}%")
+        print(f"[PAR] Candidate result: {benchmark_results['ops_per_sec']} ops/sec.")
+        results.append((False, benchmark_results, avg_cpu_used, avg_mem_used, options))
+
+    return results
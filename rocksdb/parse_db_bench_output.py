@@ -1,173 +1,386 @@
 import re
 import os
+from collections import deque
 from utils.utils import log_update
+from utils.timeseries_store import throughput_table
 
-def parse_db_bench_output(output):
-    err_check = re.search("Unable to load options file", output) or re.search("open error", output)
-    if err_check is not None:
-        error = output[err_check.span()[0]:]
-        return {
-            "error": error,
-            "ops_per_sec": None,
-        }
+# Benchmarks in the order they are matched. readrandomwriterandom has to be checked
+# before readrandom, and fillrandom before readrandom, as in the original whole-output parser
+TEST_NAMES = ["readrandomwriterandom", "jsonconfigured", "fillrandom", "readrandom", "mixgraph", "readwhilewriting"]
+
+# Benchmarks whose summary line only counts when it is followed by a latency histogram
+HISTOGRAM_TESTS = ["fillrandom", "readrandom"]
+
+ERROR_MARKERS = ["Unable to load options file", "open error"]
+
+SUMMARY_PATTERN = re.compile(r"(\w+)\s+:\s+(\d+\.\d+)\s+micros/op\s+(\d+)\s+ops/sec\s+(\d+\.\d+)\s+seconds\s+(\d+)\s+operations;(.*)")
+DATA_SPEED_PATTERN = re.compile(r"^\s+(\d+\.\d+)\s+(\w+/s)")
+FOUND_PATTERN = re.compile(r"\((\d+)\s+of\s+(\d+)\s+found\)")
+HISTOGRAM_HEADER_PATTERN = re.compile(r"^Microseconds per (\w+):")
+COUNT_PATTERN = re.compile(r"^Count:\s+(\d+)\s+Average:\s+(\d+\.\d+)\s+StdDev:\s+(\d+\.\d+)")
+MIN_MAX_PATTERN = re.compile(r"^Min:\s+(\d+)\s+Median:\s+(\d+\.\d+)\s+Max:\s+(\d+)")
+PERCENTILES_PATTERN = re.compile(r"^Percentiles:\s+P50:\s+(\d+\.\d+)\s+P75:\s+(\d+\.\d+)\s+P99:\s+(\d+\.\d+)\s+P99\.9:\s+(\d+\.\d+)\s+P99\.99:\s+(\d+\.\d+)")
+ENTRIES_PATTERN = re.compile(r"Entries:\s+(\d+)")
+# "... and (interval,average) ops/second in (interval,total) seconds"
+OPS_PER_SECOND_PATTERN = re.compile(r"and \(([^,]*),([^)]*)\) ops\/second in \(.*,(.*)\)")
+STATISTICS_PATTERN = re.compile(r"^(rocksdb\.[\w.]+) COUNT : (\d+)")
+
+# Tickers of the --statistics dump kept in the results, the others are only logged by db_bench
+STATISTICS_TICKERS = ["rocksdb.bytes.written", "rocksdb.wal.bytes", "rocksdb.flush.write.bytes",
+                      "rocksdb.compact.read.bytes", "rocksdb.compact.write.bytes"]
+
+
+class DBBenchOutputParser:
+    '''
+    Line-at-a-time parser for the db_bench output. Lines are fed as they are read from the
+    db_bench stdout, so the full output is never held in memory. result() produces the same
+    dictionary as parsing the whole output at once.
+    '''
+
+    def __init__(self, tail_lines=200, run_dir=None, fidelity=1.0):
+        '''
+        Parameters:
+        - tail_lines (int): Number of trailing lines kept for error reporting
+        - run_dir (str, optional): Time series directory of the run the throughput samples are stored in
+        - fidelity (float): The fraction of the full duration and database size the run used
+        '''
+        self.fidelity = fidelity
+        self.entries = None
+        self.seen_tests = set()
+        self.summaries = {}
+        self.pending = None
+        self.histogram = None
+        self.histograms = {}
+        self.collecting = None
+        self.statistics = {}
+        # Without a time series store the samples are kept in memory for the results
+        self.ops_per_sec_points = []
+        self.last_seconds = None
+        self.percentile_lines = []
+        self.error_lines = {marker: None for marker in ERROR_MARKERS}
+        self.tail = deque(maxlen=tail_lines)
+        self.run_dir = run_dir
+        self.series = throughput_table(run_dir) if run_dir is not None else None
+
+    def feed(self, line):
+        '''
+        Consume one line of the db_bench output
+
+        Parameters:
+        - line (str): The line, with or without the trailing newline
+
+        Returns:
+        - point (tuple): (seconds, interval ops/sec, average ops/sec) of a throughput line, else None
+        '''
+        self.tail.append(line)
+
+        for marker in ERROR_MARKERS:
+            if self.error_lines[marker] is not None:
+                self.error_lines[marker].append(line)
+            elif marker in line:
+                self.error_lines[marker] = [line[line.index(marker):]]
+
+        for test_name in TEST_NAMES:
+            if test_name in line:
+                self.seen_tests.add(test_name)
+
+        line = line.rstrip("\n")
+
+        if self.entries is None:
+            entries_match = ENTRIES_PATTERN.search(line)
+            if entries_match:
+                self.entries = int(entries_match.group(1))
 
-    # Regular expression to find and extract the number of Entries
-    # Searches for the pattern "Entries:" followed by one or more digits
-    entries_match = re.search(r"Entries:\s+(\d+)", output)
-    # If a match is found, convert the captured digits to an integer
-    entries = int(entries_match.group(1)) if entries_match else None
-
-    # Regular expression to parse the output line
-    # Captures various performance metrics and their units
-    test_name = None
-
-    if "readrandomwriterandom" in output:
-        op_line = output.split("readrandomwriterandom")[1].split("\n")[0]
-        test_name = "readrandomwriterandom"
-        test_pattern = r"readrandomwriterandom\s+:\s+(\d+\.\d+)\s+micros/op\s+(\d+)\s+ops/sec\s+(\d+\.\d+)\s+seconds\s+(\d+)\s+operations;"
-    elif "jsonconfigured" in output:
-        op_line = output.split("jsonconfigured")[1].split("\n")[0]
-        test_name = "jsonconfigured"
-        test_pattern = r"jsonconfigured\s+:\s+(\d+\.\d+)\s+micros/op\s+(\d+)\s+ops/sec\s+(\d+\.\d+)\s+seconds\s+(\d+)\s+operations;"
-    elif "fillrandom" in output:
-        op_line = output.split("fillrandom")[1].split("\n")[0]
-        test_name = "fillrandom"
-        test_pattern = r"fillrandom\s+:\s+(\d+\.\d+)\s+micros/op\s+(\d+)\s+ops/sec\s+(\d+\.\d+)\s+seconds\s+(\d+)\s+operations;\s+(\d+\.\d+)\s+(\w+/s)\nMicroseconds per write:\nCount:\s+(\d+)\s+Average:\s+(\d+\.\d+)\s+StdDev:\s+(\d+\.\d+)\nMin:\s+(\d+)\s+Median:\s+(\d+\.\d+)\s+Max:\s+(\d+)\nPercentiles:\s+P50:\s+(\d+\.\d+)\s+P75:\s+(\d+\.\d+)\s+P99:\s+(\d+\.\d+)\s+P99\.9:\s+(\d+\.\d+)\s+P99\.99:\s+(\d+\.\d+)\n-{50}"
-    elif "readrandom" in output:
-        op_line = output.split("readrandom")[1].split("\n")[0]
-        test_name = "readrandom"
-        test_pattern = r"readrandom\s+:\s+(\d+\.\d+)\s+micros/op\s+(\d+)\s+ops/sec\s+(\d+\.\d+)\s+seconds\s+(\d+)\s+operations;\s+(\d+\.\d+)\s+(\w+/s)\s+\((\d+)\s+of\s+(\d+)\s+found\)\n\nMicroseconds per read:\nCount:\s+(\d+)\s+Average:\s+(\d+\.\d+)\s+StdDev:\s+(\d+\.\d+)\nMin:\s+(\d+)\s+Median:\s+(\d+\.\d+)\s+Max:\s+(\d+)\nPercentiles:\s+P50:\s+(\d+\.\d+)\s+P75:\s+(\d+\.\d+)\s+P99:\s+(\d+\.\d+)\s+P99\.9:\s+(\d+\.\d+)\s+P99\.99:\s+(\d+\.\d+)\n-{50}"
-    elif "mixgraph" in output:
-        op_line = output.split("mixgraph     :")[1].split("\n")[0]
-        test_name = "mixgraph"
-        test_pattern = r"mixgraph\s+:\s+(\d+\.\d+)\s+micros/op\s+(\d+)\s+ops/sec\s+(\d+\.\d+)\s+seconds\s+(\d+)\s+operations;"
-        # test_pattern = r"mixgraph\s+:\s+(\d+\.\d+)\s+micros/op\s+(\d+)\s+ops/sec\s+(\d+\.\d+)\s+seconds\s+(\d+)\s+operations;\s+\(\s+Gets:+(\d+)\s+Puts:+(\d+)\s+Seek:(\d+),\s+reads\s+(\d+)\s+in\s+(\d+)\s+found,\s+avg\s+size:\s+\d+\s+value,\s+-nan\s+scan\)\n\nMicroseconds per read:\nCount:\s+(\d+)\s+Average:\s+(\d+\.\d+)\s+StdDev:\s+(\d+\.\d+)\nMin:\s+(\d+)\s+Median:\s+(\d+\.\d+)\s+Max:\s+(\d+)\nPercentiles:\s+P50:\s+(\d+\.\d+)\s+P75:\s+(\d+\.\d+)\s+P99:\s+(\d+\.\d+)\s+P99\.9:\s+(\d+\.\d+)\s+P99\.99:\s+(\d+\.\d+)\n-{50}"
-    elif "readwhilewriting" in output:
-        op_line = output.split("readwhilewriting")[1].split("\n")[0]
-        test_name = "readwhilewriting"
-        test_pattern = r"readwhilewriting\s+:\s+(\d+\.\d+)\s+micros/op\s+(\d+)\s+ops/sec\s+(\d+\.\d+)\s+seconds\s+(\d+)\s+operations;"
-    else:
-        log_update(f"[PDB] Test name not found in output: {output}")
-        return {
-            "error": output,
-            "ops_per_sec": None,
+        ops_match = OPS_PER_SECOND_PATTERN.search(line)
+        if ops_match:
+            point = (float(ops_match.group(3)), float(ops_match.group(1)), float(ops_match.group(2)))
+            self.last_seconds = point[0]
+            if self.series is not None:
+                self.series.append(*point)
+            else:
+                self.ops_per_sec_points.append(point)
+            return point
+
+        if line.startswith("Percentiles:"):
+            self.percentile_lines.append(line)
+
+        self._collect_histogram(line)
+
+        statistics_match = STATISTICS_PATTERN.match(line)
+        if statistics_match and statistics_match.group(1) in STATISTICS_TICKERS:
+            self.statistics[statistics_match.group(1)] = int(statistics_match.group(2))
+            return
+
+        summary_match = SUMMARY_PATTERN.search(line)
+        if summary_match:
+            self._start_summary(summary_match, line)
+            return
+
+        if self.pending is not None:
+            self._feed_histogram(line)
+
+    def _start_summary(self, summary_match, line):
+        '''
+        Record a benchmark summary line. Benchmarks in HISTOGRAM_TESTS stay pending until
+        their histogram block is complete.
+        '''
+        test_name, micros_per_op, ops_per_sec, total_seconds, total_operations, rest = summary_match.groups()
+        summary = {
+            "line": line,
+            "micros_per_op": float(micros_per_op),
+            "ops_per_sec": int(ops_per_sec),
+            "total_seconds": float(total_seconds),
+            "total_operations": int(total_operations),
+            "data_speed": None,
+            "data_speed_unit": None,
         }
 
-    pattern_matches = re.findall(test_pattern, output)
-    log_update(f"[PDB] Test name: {test_name}")
-    log_update(f"[PDB] Matches: {pattern_matches}")
-    log_update(f"[PDB] Output line: {op_line}")
-    # Set all values to None if the pattern is not found
-    micros_per_op = ops_per_sec = total_seconds = total_operations = data_speed = data_speed_unit = None
-
-    # Extract the performance metrics if the pattern is found
-    for pattern_match in pattern_matches:
-        # Convert each captured group to the appropriate type (float or int)
-        micros_per_op = float(pattern_match[0])
-        ops_per_sec = int(pattern_match[1])
-        total_seconds = float(pattern_match[2])
-        total_operations = int(pattern_match[3])
-         # Check for specific workloads to handle additional data
-        if "readrandomwriterandom" in output:
-            data_speed = ops_per_sec
-            data_speed_unit = "ops/sec"
-            reads_found = None
-        elif "jsonconfigured" in output:
-            data_speed = ops_per_sec
-            data_speed_unit = "ops/sec"
-        elif "fillrandom" in output:
-            data_speed = float(pattern_match[4])
-            data_speed_unit = pattern_match[5]
-            writes_data = {
-                "count": int(pattern_match[6]),
-                "average": float(pattern_match[7]),
-                "std_dev": float(pattern_match[8]),
-                "min": int(pattern_match[9]),
-                "median": float(pattern_match[10]),
-                "max": int(pattern_match[11]),
-                "percentiles": {
-                    "P50": float(pattern_match[12]),
-                    "P75": float(pattern_match[13]),
-                    "P99": float(pattern_match[14]),
-                    "P99.9": float(pattern_match[15]),
-                    "P99.99": float(pattern_match[16])
-                }
+        speed_match = DATA_SPEED_PATTERN.match(rest)
+        if speed_match:
+            summary["data_speed"] = float(speed_match.group(1))
+            summary["data_speed_unit"] = speed_match.group(2)
+
+        found_match = FOUND_PATTERN.search(rest)
+        if found_match:
+            summary["found"] = {
+                "count": int(found_match.group(1)),
+                "total": int(found_match.group(2))
             }
-        elif "readrandom" in output:
-            data_speed = float(pattern_match[4])
-            data_speed_unit = pattern_match[5]
-            reads_found = {
-                "count": int(pattern_match[6]),
-                "total": int(pattern_match[7])
+
+        if test_name in HISTOGRAM_TESTS:
+            self.pending = (test_name, summary)
+            self.histogram = None
+        else:
+            self.pending = None
+            self.summaries[test_name] = summary
+
+    def _feed_histogram(self, line):
+        '''
+        Advance the histogram block that follows a pending summary line
+        '''
+        test_name, summary = self.pending
+
+        if self.histogram is None:
+            if line.strip() == "":
+                return
+            header_match = HISTOGRAM_HEADER_PATTERN.match(line)
+            if header_match:
+                self.histogram = {"operation": header_match.group(1)}
+            else:
+                self.pending = None
+            return
+
+        count_match = COUNT_PATTERN.match(line)
+        min_max_match = MIN_MAX_PATTERN.match(line)
+        percentiles_match = PERCENTILES_PATTERN.match(line)
+
+        if count_match and "count" not in self.histogram:
+            self.histogram["count"] = int(count_match.group(1))
+            self.histogram["average"] = float(count_match.group(2))
+            self.histogram["std_dev"] = float(count_match.group(3))
+        elif min_max_match and "count" in self.histogram and "min" not in self.histogram:
+            self.histogram["min"] = int(min_max_match.group(1))
+            self.histogram["median"] = float(min_max_match.group(2))
+            self.histogram["max"] = int(min_max_match.group(3))
+        elif percentiles_match and "min" in self.histogram and "percentiles" not in self.histogram:
+            self.histogram["percentiles"] = {
+                "P50": float(percentiles_match.group(1)),
+                "P75": float(percentiles_match.group(2)),
+                "P99": float(percentiles_match.group(3)),
+                "P99.9": float(percentiles_match.group(4)),
+                "P99.99": float(percentiles_match.group(5))
             }
-            reads_data = {
-                "count": int(pattern_match[8]),
-                "average": float(pattern_match[9]),
-                "std_dev": float(pattern_match[10]),
-                "min": int(pattern_match[11]),
-                "median": float(pattern_match[12]),
-                "max": int(pattern_match[13]),
-                "percentiles": {
-                    "P50": float(pattern_match[14]),
-                    "P75": float(pattern_match[15]),
-                    "P99": float(pattern_match[16]),
-                    "P99.9": float(pattern_match[17]),
-                    "P99.99": float(pattern_match[18])
+        elif line.startswith("-" * 50) and "percentiles" in self.histogram:
+            summary["histogram"] = self.histogram
+            self.summaries[test_name] = summary
+            self.pending = None
+            self.histogram = None
+        else:
+            self.pending = None
+            self.histogram = None
+
+    def _collect_histogram(self, line):
+        '''
+        Record every latency histogram block by its operation, e.g. read, write and seek of
+        mixgraph, whether or not its benchmark is in HISTOGRAM_TESTS
+        '''
+        header_match = HISTOGRAM_HEADER_PATTERN.match(line)
+        if header_match:
+            self.collecting = {"operation": header_match.group(1)}
+            return
+        if self.collecting is None:
+            return
+
+        count_match = COUNT_PATTERN.match(line)
+        min_max_match = MIN_MAX_PATTERN.match(line)
+        percentiles_match = PERCENTILES_PATTERN.match(line)
+
+        if count_match:
+            self.collecting["count"] = int(count_match.group(1))
+            self.collecting["average"] = float(count_match.group(2))
+        elif min_max_match:
+            self.collecting["max"] = int(min_max_match.group(3))
+        elif percentiles_match:
+            self.collecting["percentiles"] = {
+                "P50": float(percentiles_match.group(1)),
+                "P99": float(percentiles_match.group(3)),
+                "P99.9": float(percentiles_match.group(4)),
+            }
+            self.histograms[self.collecting.pop("operation")] = self.collecting
+            self.collecting = None
+
+    def write_amplification(self):
+        '''
+        Bytes written by flushes and compactions per byte written by the user, from the
+        --statistics dump. None if db_bench did not print it.
+        '''
+        user_bytes = self.statistics.get("rocksdb.bytes.written")
+        if not user_bytes:
+            return None
+        flushed = self.statistics.get("rocksdb.flush.write.bytes", 0)
+        compacted = self.statistics.get("rocksdb.compact.write.bytes", 0)
+        return round((flushed + compacted) / user_bytes, 3)
+
+    def result(self):
+        '''
+        Produce the parsed results of all the lines fed so far
+
+        Returns:
+        - parsed_data (dict): The parsed benchmark results, or the error and a null throughput
+        '''
+        for marker in ERROR_MARKERS:
+            if self.error_lines[marker] is not None:
+                parsed_data = {
+                    "error": "".join(self.error_lines[marker]),
+                    "ops_per_sec": None,
                 }
+                self.add_timeseries(parsed_data)
+                return parsed_data
+
+        test_name = next((name for name in TEST_NAMES if name in self.seen_tests), None)
+        if test_name is None:
+            output_tail = "".join(self.tail)
+            log_update(f"[PDB] Test name not found in output: {output_tail}")
+            parsed_data = {
+                "error": output_tail,
+                "ops_per_sec": None,
             }
-        elif "readwhilewriting" in output:
-            data_speed = float(pattern_match[4])
-            data_speed_unit = pattern_match[5]
-            # reads_found = {
-            #     "count": int(pattern_match[6]),
-            #     "total": int(pattern_match[7])
-            # }
-            # reads_data = {
-            #     "count": int(pattern_match[8]),
-            #     "average": float(pattern_match[9]),
-            #     "std_dev": float(pattern_match[10]),
-            #     "min": int(pattern_match[11]),
-            #     "median": float(pattern_match[12]),
-            #     "max": int(pattern_match[13]),
-            #     "percentiles": {
-            #         "P50": float(pattern_match[14]),
-            #         "P75": float(pattern_match[15]),
-            #         "P99": float(pattern_match[16]),
-            #         "P99.9": float(pattern_match[17]),
-            #         "P99.99": float(pattern_match[18])
-            #     }
-            # }
-        elif "mixgraph" in output:
-            data_speed = ops_per_sec
-            data_speed_unit = "ops/sec"
-        else:
-            log_update(f"[PDB] Test name not found in output: {output}")
-            data_speed = ops_per_sec
-            data_speed_unit = "ops/sec"
-   
-        log_update(f"[PDB] Ops per sec: {ops_per_sec} Total seconds: {total_seconds} Total operations: {total_operations} Data speed: {data_speed} {data_speed_unit}")
-
-    ops_per_sec_points = re.findall("and \((.*),.*\) ops\/second in \(.*,(.*)\)", output)
-
-    # Store all extracted values in a dictionary
-    parsed_data = {
-        "entries": entries,
-        "micros_per_op": micros_per_op,
-        "ops_per_sec": ops_per_sec,
-        "total_seconds": total_seconds,
-        "total_operations": total_operations,
-        "data_speed": data_speed,
-        "data_speed_unit": data_speed_unit,
-        "ops_per_second_graph": [
-            [float(a[1]) for a in ops_per_sec_points],
-            [float(a[0]) for a in ops_per_sec_points],
-        ]
-    }
-
-    # Grab the latency and push into the output logs file
-    latency = re.findall("Percentiles:.*", output)
-    for i in latency:
-        log_update("[PDB] " + i)
-
-    # Return the dictionary with the parsed data
-    return parsed_data
+            self.add_timeseries(parsed_data)
+            return parsed_data
+
+        summary = self.summaries.get(test_name)
+        log_update(f"[PDB] Test name: {test_name}")
+        log_update(f"[PDB] Matches: {summary}")
+
+        # Set all values to None if the pattern is not found
+        micros_per_op = ops_per_sec = total_seconds = total_operations = data_speed = data_speed_unit = None
+
+        if summary is not None:
+            log_update(f"[PDB] Output line: {summary['line']}")
+            micros_per_op = summary["micros_per_op"]
+            ops_per_sec = summary["ops_per_sec"]
+            total_seconds = summary["total_seconds"]
+            total_operations = summary["total_operations"]
+
+            # Only these workloads report a data speed, the others report ops/sec
+            if test_name in ["fillrandom", "readrandom", "readwhilewriting"] and summary["data_speed"] is not None:
+                data_speed = summary["data_speed"]
+                data_speed_unit = summary["data_speed_unit"]
+            else:
+                data_speed = ops_per_sec
+                data_speed_unit = "ops/sec"
+
+            log_update(f"[PDB] Ops per sec: {ops_per_sec} Total seconds: {total_seconds} Total operations: {total_operations} Data speed: {data_speed} {data_speed_unit}")
+
+        # Store all extracted values in a dictionary
+        parsed_data = {
+            "entries": self.entries,
+            "micros_per_op": micros_per_op,
+            "ops_per_sec": ops_per_sec,
+            "total_seconds": total_seconds,
+            "total_operations": total_operations,
+            "data_speed": data_speed,
+            "data_speed_unit": data_speed_unit,
+            "histograms": self.histograms,
+            "write_amplification": self.write_amplification(),
+            "fidelity": self.fidelity,
+        }
+        self.add_timeseries(parsed_data)
+
+        # Grab the latency and push into the output logs file
+        for i in self.percentile_lines:
+            log_update("[PDB] " + i)
+
+        # Return the dictionary with the parsed data
+        return parsed_data
+
+    def estimated_result(self, ops_per_sec):
+        '''
+        Produce results for a run that was stopped before db_bench printed its summary
+
+        Parameters:
+        - ops_per_sec (float): The estimated throughput of the run
+
+        Returns:
+        - parsed_data (dict): The parsed benchmark results with the estimated throughput
+        '''
+        ops_per_sec = int(ops_per_sec)
+        parsed_data = {
+            "entries": self.entries,
+            "micros_per_op": None,
+            "ops_per_sec": ops_per_sec,
+            "total_seconds": self.last_seconds,
+            "total_operations": None,
+            "data_speed": ops_per_sec,
+            "data_speed_unit": "ops/sec",
+            "histograms": self.histograms,
+            "fidelity": self.fidelity,
+            "estimated": True
+        }
+        self.add_timeseries(parsed_data)
+        return parsed_data
+
+    def add_timeseries(self, parsed_data):
+        '''
+        Commit the stored throughput samples and reference them from the results. The
+        results only hold the samples themselves if the run has no time series store.
+        '''
+        if self.series is not None:
+            self.series.flush()
+            parsed_data["timeseries"] = self.run_dir
+        elif "ops_per_sec" in parsed_data and "error" not in parsed_data:
+            parsed_data["ops_per_second_graph"] = [
+                [a[0] for a in self.ops_per_sec_points],
+                [a[1] for a in self.ops_per_sec_points],
+            ]
+
+
+def parse_db_bench_stream(stream, run_dir=None, fidelity=1.0):
+    '''
+    Parse the db_bench output line by line from an iterable such as Popen.stdout
+
+    Parameters:
+    - stream (iterable): The lines of the db_bench output
+    - run_dir (str, optional): Time series directory the throughput samples are stored in
+    - fidelity (float): The fraction of the full duration and database size the run used
+
+    Returns:
+    - parsed_data (dict): The parsed benchmark results
+    '''
+    parser = DBBenchOutputParser(run_dir=run_dir, fidelity=fidelity)
+    for line in stream:
+        parser.feed(line)
+    return parser.result()
+
+
+def parse_db_bench_output(output):
+    '''
+    Parse the complete db_bench output
+
+    Parameters:
+    - output (str): The output of db_bench
+
+    Returns:
+    - parsed_data (dict): The parsed benchmark results
+    '''
+    return parse_db_bench_stream(output.splitlines(keepends=True))
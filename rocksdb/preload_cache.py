@@ -0,0 +1,338 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from options_files.ops_options_file import parse_option_file_to_dict
+from rocksdb.parse_db_bench_output import ERROR_MARKERS
+from utils import constants
+from utils.utils import log_update
+
+# Options that change the on-disk layout of a preloaded database
+LAYOUT_OPTIONS = [
+    "num_levels", "compaction_style", "compaction_pri", "write_buffer_size", "target_file_size_base",
+    "target_file_size_multiplier", "max_bytes_for_level_base", "max_bytes_for_level_multiplier",
+    "level_compaction_dynamic_level_bytes", "level0_file_num_compaction_trigger", "compression",
+    "bottommost_compression", "comparator", "table_factory", "block_size", "format_version",
+    "filter_policy", "index_type", "whole_key_filtering", "enable_blob_files", "min_blob_size",
+]
+
+# Files that RocksDB never modifies in place and can be shared between copies
+IMMUTABLE_SUFFIXES = (".sst", ".blob")
+
+# Files that belong to a single run and are not part of the preloaded state
+EXCLUDED_FILES = ("tracefile", "LOCK")
+EXCLUDED_PREFIXES = ("LOG",)
+
+# Arguments that name per-run paths and do not change the preloaded data
+PATH_ARGS = ("--db=", "--options_file=", "--trace_file=", "--dynamic_options_file=")
+
+# Entries are staged in a directory of their own before they are published
+STAGING_SUFFIX = ".tmp"
+# Staging directories older than this were left behind by a killed run
+STALE_STAGING_SECONDS = 24 * 3600
+
+
+def preload_cache_key(test_name, preload_args, options):
+    '''
+    Function to compute the cache key of a preloaded database
+
+    Parameters:
+    - test_name (str): The name of the test
+    - preload_args (list): The arguments or command that produce the preloaded database
+    - options (str): The options file used for the preload
+
+    Returns:
+    - key (str): The cache key
+    '''
+    layout = {}
+    try:
+        for section, values in parse_option_file_to_dict(options).items():
+            for option in LAYOUT_OPTIONS:
+                if option in values:
+                    layout[f"{section}.{option}"] = values[option].strip()
+    except Exception:
+        layout = {"options": options}
+
+    # A rebuilt db_bench may write a different format, so the binary is part of the key
+    try:
+        stat = os.stat(constants.DB_BENCH_PATH)
+        binary = [stat.st_size, int(stat.st_mtime)]
+    except OSError:
+        binary = None
+
+    key_fields = {
+        "test_name": test_name,
+        "preload_args": list(preload_args),
+        "layout": layout,
+        "version": constants.VERSION,
+        "db_bench": binary,
+    }
+    return hashlib.sha1(json.dumps(key_fields, sort_keys=True).encode()).hexdigest()
+
+
+def is_excluded(file_name):
+    return file_name in EXCLUDED_FILES or file_name.startswith(EXCLUDED_PREFIXES)
+
+
+def list_files(directory):
+    '''
+    Function to list the files of a database relative to its directory
+
+    Parameters:
+    - directory (str): The database directory
+
+    Returns:
+    - files (list): Relative paths of the files, excluding per-run files
+    '''
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if not is_excluded(name):
+                files.append(os.path.relpath(os.path.join(root, name), directory))
+    return files
+
+
+def parallel_copy(source, destination, files, workers=8):
+    '''
+    Function to copy the given files concurrently
+
+    Parameters:
+    - source (str): The source directory
+    - destination (str): The destination directory
+    - files (list): Relative paths of the files to copy
+    - workers (int): The number of copy threads
+
+    Returns:
+    - None
+    '''
+    def copy_one(relative_path):
+        target = os.path.join(destination, relative_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copy2(os.path.join(source, relative_path), target)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(copy_one, files))
+
+
+def clone_db(source, destination):
+    '''
+    Function to clone a database directory as cheaply as the filesystem allows.
+    Tries a reflink copy first, then hard links of the immutable SST/blob files plus copies
+    of the mutable files (MANIFEST, CURRENT, OPTIONS, WAL), then a parallel copy.
+
+    Parameters:
+    - source (str): The source database directory
+    - destination (str): The destination directory, which must not exist
+
+    Returns:
+    - method (str): The method used to clone the database
+    '''
+    files = list_files(source)
+
+    proc = subprocess.run(["cp", "-a", "--reflink=always", source, destination],
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
+    if proc.returncode == 0:
+        for name in os.listdir(destination):
+            if is_excluded(name):
+                os.remove(os.path.join(destination, name))
+        return "reflink"
+    shutil.rmtree(destination, ignore_errors=True)
+
+    try:
+        immutable = [f for f in files if f.endswith(IMMUTABLE_SUFFIXES)]
+        mutable = [f for f in files if not f.endswith(IMMUTABLE_SUFFIXES)]
+        for relative_path in immutable:
+            target = os.path.join(destination, relative_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.link(os.path.join(source, relative_path), target)
+        os.makedirs(destination, exist_ok=True)
+        parallel_copy(source, destination, mutable)
+        return "hardlink"
+    except OSError:
+        # Hard links do not work across filesystems
+        shutil.rmtree(destination, ignore_errors=True)
+
+    os.makedirs(destination, exist_ok=True)
+    parallel_copy(source, destination, files)
+    return "copy"
+
+
+def restore_preloaded_db(key, database_path):
+    '''
+    Function to restore a preloaded database from the cache
+
+    Parameters:
+    - key (str): The cache key
+    - database_path (str): The path to restore the database to
+
+    Returns:
+    - restored (bool): True if the cache had a valid entry and it was restored
+    '''
+    entry = os.path.join(constants.PRELOAD_CACHE_DIR, key)
+    meta_path = os.path.join(entry, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+
+    # Invalidate entries whose files went missing or changed size
+    for relative_path, size in meta["files"].items():
+        path = os.path.join(entry, "db", relative_path)
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            log_update(f"[PLC] Cache entry {key} is corrupted. Removing it.")
+            shutil.rmtree(entry, ignore_errors=True)
+            return False
+
+    shutil.rmtree(database_path, ignore_errors=True)
+    start_time = time.time()
+    method = clone_db(os.path.join(entry, "db"), database_path)
+
+    meta["last_used"] = time.time()
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+
+    log_update(f"[PLC] Restored preloaded database {key} with {method} in {time.time() - start_time:.1f} seconds")
+    print(f"[PLC] Restored preloaded database with {method}")
+    return True
+
+
+def store_preloaded_db(key, database_path):
+    '''
+    Function to store a freshly preloaded database in the cache and evict old entries.
+    Every call stages its copy in a unique directory and publishes it with a rename, so
+    parallel workers preloading the same key never touch each other's copies.
+
+    Parameters:
+    - key (str): The cache key
+    - database_path (str): The path of the preloaded database
+
+    Returns:
+    - None
+    '''
+    entry = os.path.join(constants.PRELOAD_CACHE_DIR, key)
+    tmp_entry = tempfile.mkdtemp(prefix=f"{key}.", suffix=STAGING_SUFFIX, dir=constants.PRELOAD_CACHE_DIR)
+
+    method = clone_db(database_path, os.path.join(tmp_entry, "db"))
+    files = {f: os.path.getsize(os.path.join(tmp_entry, "db", f)) for f in list_files(os.path.join(tmp_entry, "db"))}
+    meta = {
+        "files": files,
+        "size_bytes": sum(files.values()),
+        "created": time.time(),
+        "last_used": time.time(),
+    }
+    with open(os.path.join(tmp_entry, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    # An entry without metadata is left over from an older version and is replaced
+    if os.path.isdir(entry) and not os.path.exists(os.path.join(entry, "meta.json")):
+        shutil.rmtree(entry, ignore_errors=True)
+    try:
+        os.replace(tmp_entry, entry)
+    except OSError:
+        # Another worker published the same preload first, its copy is as good as this one
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        log_update(f"[PLC] Preloaded database {key} was already stored by another worker")
+        return
+    log_update(f"[PLC] Stored preloaded database {key} ({meta['size_bytes']} bytes) with {method}")
+
+    evict_preloaded_dbs(constants.PRELOAD_CACHE_BUDGET_GB * 1024 * 1024 * 1024)
+
+
+def evict_preloaded_dbs(budget_bytes):
+    '''
+    Function to evict the least recently used cache entries until the cache fits the disk budget
+
+    Parameters:
+    - budget_bytes (int): The disk budget of the cache in bytes
+
+    Returns:
+    - None
+    '''
+    entries = []
+    for key in os.listdir(constants.PRELOAD_CACHE_DIR):
+        if key.endswith(STAGING_SUFFIX):
+            staging = os.path.join(constants.PRELOAD_CACHE_DIR, key)
+            if time.time() - os.path.getmtime(staging) > STALE_STAGING_SECONDS:
+                shutil.rmtree(staging, ignore_errors=True)
+            continue
+        meta_path = os.path.join(constants.PRELOAD_CACHE_DIR, key, "meta.json")
+        if not os.path.exists(meta_path):
+            continue
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        entries.append((meta["last_used"], meta["size_bytes"], key))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, key in sorted(entries):
+        if total <= budget_bytes:
+            break
+        log_update(f"[PLC] Evicting preloaded database {key} ({size} bytes)")
+        shutil.rmtree(os.path.join(constants.PRELOAD_CACHE_DIR, key), ignore_errors=True)
+        total -= size
+
+
+def preload_db(test_name, preload_command, options, database_path, description="the preload command"):
+    '''
+    Function to bring the database to its preloaded state, running the preload command only
+    when the cache does not already hold the result. With the cache disabled the preload
+    command runs every time.
+
+    Parameters:
+    - test_name (str): The name of the test
+    - preload_command (list): The command that preloads the database
+    - options (str): The options file used for the preload
+    - database_path (str): The path to the database
+    - description (str): What the preload command does, logged when it runs
+
+    Returns:
+    - None
+    '''
+    if not constants.PRELOAD_CACHE:
+        log_update(f"[PLC] Running {description}")
+        print(f"[PLC] Running {description}")
+        run_preload(preload_command, database_path)
+        return
+
+    os.makedirs(constants.PRELOAD_CACHE_DIR, exist_ok=True)
+    preload_args = [arg for arg in preload_command if arg != "" and not arg.startswith(PATH_ARGS)]
+    key = preload_cache_key(test_name, preload_args, options)
+
+    if restore_preloaded_db(key, database_path):
+        return
+
+    log_update(f"[PLC] No cached preload for {key}. Running {description}")
+    print(f"[PLC] Running {description}")
+    if run_preload(preload_command, database_path) and os.path.isdir(database_path):
+        store_preloaded_db(key, database_path)
+
+
+def run_preload(preload_command, database_path):
+    '''
+    Function to run a preload command. A preload that fails, e.g. is killed or rejects the
+    options file, may leave a partial database, which is removed so it is never cached or
+    benchmarked.
+
+    Parameters:
+    - preload_command (list): The command that preloads the database
+    - database_path (str): The path to the database
+
+    Returns:
+    - succeeded (bool): Whether the command exited with 0 and reported no db_bench error
+    '''
+    process = subprocess.run(preload_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
+    output = process.stdout.decode(errors="replace")
+    error = next((marker for marker in ERROR_MARKERS if marker in output), None)
+    if process.returncode == 0 and error is None:
+        return True
+
+    reason = error or f"exit code {process.returncode}"
+    log_update(f"[PLC] Preload failed with {reason}, removing the database at {database_path}. Output: {output[-2000:]}")
+    print(f"[PLC] Preload failed with {reason}, removing the database at {database_path}")
+    shutil.rmtree(database_path, ignore_errors=True)
+    return False
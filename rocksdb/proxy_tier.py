@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import threading
+
+import numpy as np
+
+from utils.config import get_config
+from utils.scoring import metric, objective_target
+from utils.utils import log_update
+
+# The proxy tier is judged once this many candidates were measured at both fidelities
+PROXY_MIN_PAIRS = 5
+# Below this Spearman correlation the proxy ranks candidates too differently from the full runs
+PROXY_MIN_CORRELATION = 0.6
+
+# Workloads that restore the database at PRE_LOAD_DB_PATH instead of preloading their own
+PRELOADED_TESTS = ("readrandom", "mixgraph", "tracefile")
+
+# Cache key of the full-fidelity run -> {fidelity: proxy objective target} of this session
+_proxy_targets = {}
+_pairs_lock = threading.Lock()
+
+
+def spearman(a, b):
+    '''
+    Function to compute the Spearman rank correlation, with average ranks for ties
+
+    Parameters:
+    - a (list): The first values
+    - b (list): The second values, in the same order
+
+    Returns:
+    - rho (float): The correlation, None if either side is constant
+    '''
+    def ranks(values):
+        values = np.asarray(values, dtype=np.float64)
+        order = np.argsort(values, kind="stable")
+        ranked = np.empty(len(values))
+        ranked[order] = np.arange(len(values))
+        # Ties share the mean of their ranks
+        for value in np.unique(values):
+            tied = values == value
+            ranked[tied] = ranked[tied].mean()
+        return ranked
+
+    rank_a, rank_b = ranks(a), ranks(b)
+    if rank_a.std() == 0 or rank_b.std() == 0:
+        return None
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
+
+
+def note_proxy_result(key, fidelity, benchmark_results, config=None):
+    '''
+    Function to remember the objective of a proxy run until its candidate is measured at full fidelity
+
+    Parameters:
+    - key (str): The result cache key of the full-fidelity run of the candidate
+    - fidelity (float): The fraction of the full run the proxy ran
+    - benchmark_results (dict): The results of the proxy run
+    '''
+    config = config or get_config()
+    value = metric(benchmark_results, config.objective)
+    if value is not None:
+        _proxy_targets.setdefault(key, {})[fidelity] = objective_target(value, config.objective)
+
+
+def record_full_result(key, benchmark_results, config=None):
+    '''
+    Function to pair a full-fidelity result with the proxy results of the same candidate and
+    log the rank correlation of the tiers
+
+    Parameters:
+    - key (str): The result cache key of the run
+    - benchmark_results (dict): The results of the full-fidelity run
+    '''
+    config = config or get_config()
+    proxies = _proxy_targets.pop(key, None)
+    value = metric(benchmark_results, config.objective)
+    if not proxies or value is None or benchmark_results.get("estimated"):
+        return
+
+    full = objective_target(value, config.objective)
+    with _pairs_lock:
+        os.makedirs(os.path.dirname(config.proxy_pairs_path) or ".", exist_ok=True)
+        with open(config.proxy_pairs_path, "a") as f:
+            for fidelity, proxy in proxies.items():
+                f.write(json.dumps({
+                    "created": time.time(),
+                    "test_name": config.test_name,
+                    "objective": config.objective,
+                    "fidelity": fidelity,
+                    "proxy": proxy,
+                    "full": full,
+                }) + "\n")
+
+    for fidelity in proxies:
+        rho, pairs = proxy_correlation(fidelity, config)
+        log_update(f"[PXY] Rank correlation of the {fidelity:.3f} fidelity tier with full runs: {rho} over {pairs} candidates")
+
+
+def proxy_correlation(fidelity, config=None):
+    '''
+    Function to compute the rank correlation between a proxy tier and the full runs, over the
+    recorded candidates of the same workload and objective
+
+    Parameters:
+    - fidelity (float): The fraction of the full run of the tier
+
+    Returns:
+    - rho (float): The Spearman correlation, None with fewer than two distinct pairs
+    - pairs (int): The number of candidates measured at both fidelities
+    '''
+    config = config or get_config()
+    if not os.path.exists(config.proxy_pairs_path):
+        return None, 0
+
+    proxy, full = [], []
+    with open(config.proxy_pairs_path) as f:
+        for line in f:
+            try:
+                pair = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if (pair["test_name"] == config.test_name and pair["objective"] == config.objective
+                    and abs(pair["fidelity"] - fidelity) < 1e-6):
+                proxy.append(pair["proxy"])
+                full.append(pair["full"])
+
+    if len(proxy) < 2:
+        return None, len(proxy)
+    return spearman(proxy, full), len(proxy)
+
+
+def proxy_trusted(fidelity, config=None):
+    '''
+    Function to check whether a proxy tier ranks candidates like the full runs
+
+    Returns:
+    - trusted (bool): None while there are fewer than PROXY_MIN_PAIRS pairs
+    '''
+    rho, pairs = proxy_correlation(fidelity, config)
+    if pairs < PROXY_MIN_PAIRS or rho is None:
+        return None
+    return rho >= PROXY_MIN_CORRELATION
+
+
+
+def proxy_unscalable(config=None):
+    '''
+    Function to check whether a proxy run of the session would be smaller than a full run.
+    Only the fillrandom preload and the db_bench arguments are scaled by the fidelity.
+
+    Returns:
+    - reason (str): Why proxy runs are not scaled down, None if they are
+    '''
+    config = config or get_config()
+    if config.test_name == "tracefile":
+        return "the tracefile workload runs the unscaled preload command and the duration of its trace model"
+    if config.pre_load_db_path and config.test_name in PRELOADED_TESTS:
+        return f"the preloaded database at {config.pre_load_db_path} is restored at full size"
+    return None
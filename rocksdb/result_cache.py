@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import statistics
+from contextlib import closing
+
+from options_files.ops_options_file import parse_option_file_to_dict
+from utils import constants
+from utils.utils import log_update
+
+# A cached result is only trusted with enough fresh samples that agree with each other.
+# A single run can be an outlier, so an options file is measured twice before it is reused.
+RESULT_CACHE_MIN_SAMPLES = 2
+RESULT_CACHE_MAX_RELATIVE_STDDEV = 0.1
+
+CREATE_TABLE = '''
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT NOT NULL,
+    created REAL NOT NULL,
+    ops_per_sec REAL NOT NULL,
+    avg_cpu_used REAL,
+    avg_mem_used REAL,
+    benchmark_results TEXT NOT NULL
+)
+'''
+CREATE_INDEX = "CREATE INDEX IF NOT EXISTS results_key ON results (key, created)"
+
+
+def connect():
+    '''
+    Function to open the result cache, creating it on first use
+
+    Returns:
+    - connection (sqlite3.Connection): The connection to the cache database
+    '''
+    os.makedirs(os.path.dirname(constants.RESULT_CACHE_PATH) or ".", exist_ok=True)
+    connection = sqlite3.connect(constants.RESULT_CACHE_PATH, timeout=30)
+    connection.execute(CREATE_TABLE)
+    connection.execute(CREATE_INDEX)
+    return connection
+
+
+def canonical_options(options):
+    '''
+    Function to normalize an options file so equivalent files produce the same key
+
+    Parameters:
+    - options (str): The options file
+
+    Returns:
+    - canonical (dict): Sections and options with stripped values, or the raw text if it does not parse
+    '''
+    try:
+        parsed = parse_option_file_to_dict(options)
+    except Exception:
+        return {"raw": options.strip()}
+    return {section: {k: v.strip() for k, v in values.items()} for section, values in parsed.items()}
+
+
+def result_cache_key(options, db_bench_args, test_name=None, fidelity=1.0, cpu_limit=None, memory_limit=None, workers=1):
+    '''
+    Function to compute the cache key of a benchmark run. The key covers everything the
+    throughput depends on besides the options: the workload, the preloaded database and the
+    resources of the run, so a run in a parallel worker slot is not reused for a run with the
+    whole budget.
+
+    Parameters:
+    - options (str): The options file
+    - db_bench_args (list): Extra arguments passed to db_bench
+    - test_name (str): The name of the test. Default is TEST_NAME
+    - fidelity (float): The fraction of the full duration and database size of a proxy run
+    - cpu_limit (int): The CPU limit of the cgroup of the run. Default is CGROUP_CPU_LIMIT
+    - memory_limit (int): The memory limit of the cgroup of the run. Default is CGROUP_MEMORY_LIMIT
+    - workers (int): The number of runs sharing the machine
+
+    Returns:
+    - key (str): The cache key
+    '''
+    key_fields = {
+        "options": canonical_options(options),
+        "db_bench_args": sorted(db_bench_args or []),
+        "test_name": test_name or constants.TEST_NAME,
+        "num_entries": constants.NUM_ENTRIES,
+        "num_threads": constants.NUM_THREADS,
+        "duration": constants.DURATION,
+        "device": constants.DEVICE,
+        "version": constants.VERSION,
+        "pre_load_cmd": constants.PRE_LOAD_CMD,
+        "pre_load_db_path": constants.PRE_LOAD_DB_PATH,
+        "sine": [constants.SINE_WRITE_RATE_INTERVAL_MILLISECONDS,
+                 constants.SINE_A, constants.SINE_B, constants.SINE_C, constants.SINE_D],
+        "cpu_limit": constants.CGROUP_CPU_LIMIT if cpu_limit is None else cpu_limit,
+        "memory_limit": constants.CGROUP_MEMORY_LIMIT if memory_limit is None else memory_limit,
+        "workers": workers,
+    }
+    # Full-fidelity keys stay as they were before proxy runs existed
+    if fidelity != 1.0:
+        key_fields["fidelity"] = fidelity
+    return hashlib.sha1(json.dumps(key_fields, sort_keys=True).encode()).hexdigest()
+
+
+def lookup_result(key):
+    '''
+    Function to get a trusted cached result. Samples older than RESULT_CACHE_MAX_AGE_HOURS are
+    ignored, and the result is only returned when there are at least RESULT_CACHE_MIN_SAMPLES
+    samples whose throughput varies by less than RESULT_CACHE_MAX_RELATIVE_STDDEV.
+
+    Parameters:
+    - key (str): The cache key
+
+    Returns:
+    - cached (tuple): (benchmark_results, avg_cpu_used, avg_mem_used) of the latest sample, or None
+    '''
+    if not constants.RESULT_CACHE or constants.FORCE_REMEASURE:
+        return None
+
+    min_created = time.time() - constants.RESULT_CACHE_MAX_AGE_HOURS * 3600
+    with closing(connect()) as connection, connection:
+        rows = connection.execute(
+            "SELECT ops_per_sec, avg_cpu_used, avg_mem_used, benchmark_results FROM results "
+            "WHERE key = ? AND created >= ? ORDER BY created DESC", (key, min_created)).fetchall()
+
+    if not rows or len(rows) < RESULT_CACHE_MIN_SAMPLES:
+        return None
+
+    throughputs = [row[0] for row in rows]
+    mean = statistics.mean(throughputs)
+    if len(rows) > 1 and mean > 0 and statistics.stdev(throughputs) / mean > RESULT_CACHE_MAX_RELATIVE_STDDEV:
+        log_update(f"[RCH] Cached samples for {key} disagree too much, re-measuring")
+        return None
+
+    _, avg_cpu_used, avg_mem_used, benchmark_results = rows[0]
+    benchmark_results = json.loads(benchmark_results)
+    benchmark_results["cached_samples"] = len(rows)
+
+    log_update(f"[RCH] Using cached result for {key}: {benchmark_results['ops_per_sec']} ops/sec from {len(rows)} samples")
+    print(f"[RCH] Using cached result: {benchmark_results['ops_per_sec']} ops/sec")
+    return benchmark_results, avg_cpu_used, avg_mem_used
+
+
+def record_result(key, benchmark_results, avg_cpu_used, avg_mem_used):
+    '''
+    Function to add a successful benchmark run to the cache. Failed and early stopped runs are not recorded.
+
+    Parameters:
+    - key (str): The cache key
+    - benchmark_results (dict): The parsed output of db_bench
+    - avg_cpu_used (float): The average CPU usage during the run
+    - avg_mem_used (float): The average memory usage during the run
+
+    Returns:
+    - None
+    '''
+    if not constants.RESULT_CACHE:
+        return
+    if benchmark_results.get("error") is not None or benchmark_results.get("data_speed") is None:
+        return
+    # Throughput of runs stopped early is only an estimate
+    if benchmark_results.get("estimated"):
+        return
+
+    benchmark_results = {k: v for k, v in benchmark_results.items() if k not in ("cached_samples", "early_stop")}
+    with closing(connect()) as connection, connection:
+        connection.execute(
+            "INSERT INTO results (key, created, ops_per_sec, avg_cpu_used, avg_mem_used, benchmark_results) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, time.time(), benchmark_results["ops_per_sec"], avg_cpu_used, avg_mem_used,
+             json.dumps(benchmark_results)))
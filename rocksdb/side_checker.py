@@ -0,0 +1,155 @@
+import queue
+import threading
+from collections import deque
+
+from utils.config import SessionThread
+from utils.utils import log_update
+
+# One hour of per-second samples
+SAMPLE_RING_SIZE = 3600
+READER_JOIN_TIMEOUT_SECONDS = 30
+
+
+class OutputReader(SessionThread):
+    '''
+    Thread draining the stdout of db_bench, so the benchmark never blocks on a full pipe
+    however long the side checker takes to decide. Every line is fed to the output parser,
+    which stores the throughput samples in the time series of the run, and the same samples
+    are handed over through a ring buffer.
+    '''
+
+    def __init__(self, stream, parser, num_threads, ring_size=SAMPLE_RING_SIZE):
+        '''
+        Parameters:
+        - stream (file): The stdout of db_bench
+        - parser (DBBenchOutputParser): The parser fed with every line. Read it after join()
+        - num_threads (int): The number of db_bench threads the reported stats are scaled by
+        - ring_size (int): The number of samples kept for the consumer
+        '''
+        super().__init__(name="db-bench-reader", daemon=True)
+        self.stream = stream
+        self.parser = parser
+        self.num_threads = num_threads
+        self.ring = deque(maxlen=ring_size)
+        self.condition = threading.Condition()
+        self.finished = False
+        self.dropped = 0
+
+    def run_in_session(self):
+        try:
+            for line in self.stream:
+                point = self.parser.feed(line)
+                if point is None:
+                    continue
+
+                # Stats are reported by a single thread, so scale them to the whole benchmark
+                seconds, ops_per_sec, average_ops_per_sec = point
+                sample = (seconds, ops_per_sec * self.num_threads, average_ops_per_sec * self.num_threads)
+                with self.condition:
+                    if len(self.ring) == self.ring.maxlen:
+                        self.dropped += 1
+                    self.ring.append(sample)
+                    self.condition.notify()
+        except (ValueError, OSError):
+            # The pipe is closed when the process is killed
+            pass
+        finally:
+            with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+
+    def samples(self):
+        '''
+        Function to iterate the throughput samples until db_bench exits
+
+        Returns:
+        - samples (generator): Tuples of (seconds, interval ops/sec, cumulative average ops/sec)
+        '''
+        while True:
+            with self.condition:
+                while not self.ring and not self.finished:
+                    self.condition.wait()
+                if not self.ring:
+                    break
+                sample = self.ring.popleft()
+            yield sample
+
+        if self.dropped:
+            log_update(f"[SCK] {self.dropped} throughput samples were dropped by the ring buffer")
+
+    def stop(self, timeout=READER_JOIN_TIMEOUT_SECONDS):
+        '''
+        Function to wait for the rest of the output once the process exited or was killed
+        '''
+        self.join(timeout)
+
+
+class DecisionWorker(SessionThread):
+    '''
+    Worker making the slow side checker decisions, such as the dynamic option tuning round
+    trip, off the stdout path. At most one job runs and one waits at a time, newer jobs are
+    refused while the worker is busy. Results are only applied if the run was not cancelled
+    in the meantime, so an options update is never written after db_bench exited.
+    '''
+
+    def __init__(self, decide, apply):
+        '''
+        Parameters:
+        - decide (callable): Function taking a job and returning its result, or None for no update
+        - apply (callable): Function applying a result, called under the cancel lock
+        '''
+        super().__init__(name="side-checker-worker", daemon=True)
+        self.decide = decide
+        self.apply = apply
+        self.jobs = queue.Queue(maxsize=1)
+        self.cancelled = threading.Event()
+        self.apply_lock = threading.Lock()
+        self.busy = threading.Event()
+        self.applied = 0
+
+    def submit(self, job):
+        '''
+        Function to queue a job unless one is already running or waiting
+
+        Parameters:
+        - job: The argument of decide
+
+        Returns:
+        - bool: Whether the job was accepted
+        '''
+        if self.cancelled.is_set() or self.busy.is_set():
+            return False
+        self.busy.set()
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            return False
+        return True
+
+    def run_in_session(self):
+        while True:
+            job = self.jobs.get()
+            if job is None or self.cancelled.is_set():
+                break
+            try:
+                result = self.decide(job)
+                with self.apply_lock:
+                    if result is not None and not self.cancelled.is_set():
+                        self.apply(result)
+                        self.applied += 1
+            except Exception as e:
+                log_update(f"[SCK] Side checker decision failed: {e}")
+            finally:
+                self.busy.clear()
+
+    def cancel(self):
+        '''
+        Function to stop the worker once db_bench exited. A decision that is still running
+        is abandoned, and its result is discarded.
+        '''
+        with self.apply_lock:
+            self.cancelled.set()
+        try:
+            self.jobs.put_nowait(None)
+        except queue.Full:
+            pass
@@ -1,20 +1,30 @@
 import subprocess
 import os
+import math
 import time
 from cgroup_monitor import CGroupMonitor, CGroupManager
 
 from gpt.content_generator import error_correction_options_file_generation
+from utils.config import get_config
 from utils.utils import log_update, path_of_db
-from utils.constants import ERROR_CORRECTION_COUNT, FINETUNE_ITERATION, TEST_NAME, DB_BENCH_PATH, OPTIONS_FILE_DIR, NUM_ENTRIES, DURATION, SIDE_CHECKER, FIO_RESULT_PATH, DYNAMIC_OPTION_TUNING
-from utils.constants import SINE_WRITE_RATE_INTERVAL_MILLISECONDS, SINE_A, SINE_B, SINE_C, SINE_D, OUTPUT_PATH, PRE_LOAD_CMD, NUM_THREADS, PRE_LOAD_DB_PATH
-from rocksdb.parse_db_bench_output import parse_db_bench_output
+from utils import constants
+from rocksdb.parse_db_bench_output import DBBenchOutputParser, parse_db_bench_stream
+from rocksdb.early_stop import EarlyStopMonitor, WORSE, BETTER
+from rocksdb.side_checker import OutputReader, DecisionWorker
 from rocksdb.fine_tune import fine_tuning
 from utils.utils import store_db_bench_output
-from utils.graph import plot_2axis
+from utils.plot_service import plot_2axis
+from utils.scoring import attach_resources, incumbent_throughput, needs_statistics, score
+from utils.timeseries_store import new_run_dir, resource_table, throughput_series, ResourceSampler
 from utils.mmap_utils import add_mmap_file_to_option, create_mmap_file, write_to_mmap_file
 from gpt.prompts_generator import midway_options_file_generation, dynamic_options_file_generation
 from utils.system_operations.fio_runner import get_fio_result
 from utils.system_operations.get_sys_info import system_info
+from utils.system_operations.readiness_probe import wait_for_quiescence
+from rocksdb.preload_cache import preload_db, clone_db
+from rocksdb.result_cache import result_cache_key, lookup_result, record_result
+from rocksdb.surrogate import record_observation
+from rocksdb.proxy_tier import note_proxy_result, record_full_result, proxy_correlation, proxy_trusted, proxy_unscalable
 from trace_analyzer.analyzer import analyze_tracefile, analyze_last_n_tracefile_windows
 
 
@@ -49,13 +59,14 @@ def pre_tasks(database_path, run_count):
         check=False
     )
 
-    # update_log_file("[SPM] Waiting for 90 seconds to free up memory, IO and other resources")
-    print("[SPM] Waiting for 30 seconds to free up memory, IO and other resources")
-    # Give a 1.5 min delay for all the current memory/IO/etc to be freed
-    time.sleep(30)
+    print(f"[SPM] Waiting up to {constants.READINESS_TIMEOUT} seconds to free up memory, IO and other resources")
+    # Poll dirty pages, in-flight IO and cgroup memory instead of a fixed delay
+    waited, quiescent = wait_for_quiescence(constants.CGROUP_NAME, timeout=constants.READINESS_TIMEOUT)
+    log_update(f"[SPM] Waited {waited:.1f} seconds for the system to settle (quiescent: {quiescent})")
 
 
-def generate_db_bench_command(db_bench_path, database_path, options, run_count, test_name, db_bench_extra_args=[]):
+def generate_db_bench_command(db_bench_path, database_path, options, run_count, test_name, db_bench_extra_args=[],
+                              options_file_path=None, dynamic_options=None, fidelity=1.0):
     '''
     Generate the DB bench command
 
@@ -66,64 +77,73 @@ def generate_db_bench_command(db_bench_path, database_path, options, run_count,
     - run_count (str): The current iteration of the benchmark
     - test_name (str): The name of the test
     - db_bench_extra_args (list): Extra arguments to be passed to db_bench
+    - options_file_path (str): The options file db_bench loads. Parallel workers each use their own. Default is OPTIONS_FILE_DIR
+    - dynamic_options (bool): Whether db_bench polls the mmap file for dynamic options. Default is DYNAMIC_OPTION_TUNING
+    - fidelity (float): The fraction of the duration, the number of entries and the fillrandom preload of a proxy run.
+      A database restored from PRE_LOAD_DB_PATH and the tracefile workload are not scaled, see proxy_unscalable
 
     Returns:
     - list: The db_bench command
     '''
+    if options_file_path is None:
+        options_file_path = constants.OPTIONS_FILE_DIR
+    if dynamic_options is None:
+        dynamic_options = constants.DYNAMIC_OPTION_TUNING
+    num_entries = max(1, int(constants.NUM_ENTRIES * fidelity))
+    duration = max(1, round(constants.DURATION * fidelity))
+    preload_entries = int(50000000 * fidelity)
 
     db_bench_command = [
         db_bench_path,
         f"--db={database_path}",
-        f"--options_file={OPTIONS_FILE_DIR}",
+        f"--options_file={options_file_path}",
         "--use_direct_io_for_flush_and_compaction",
         "--use_direct_reads", "--compression_type=none",
         "--stats_interval_seconds=1", "--histogram", 
-        f"--dynamic_options_file=/tmp/mmap_file.mmap" if DYNAMIC_OPTION_TUNING else "",
-        f"--threads={NUM_THREADS}", f"--trace_file={database_path}/tracefile",
-        f"--num={NUM_ENTRIES}", f"--duration={DURATION}"
+        *(["--statistics"] if needs_statistics() else []),
+        f"--dynamic_options_file=/tmp/mmap_file.mmap" if dynamic_options else "",
+        f"--threads={constants.NUM_THREADS}", f"--trace_file={database_path}/tracefile",
+        f"--num={num_entries}", f"--duration={duration}"
     ]
 
     # Preload phase - Only needed for some tests - Theoritically, mentioning test name should not be needed
     # However, I trust I will forget this in the future and this will act as a secondary measure
     if test_name == "readrandom" or test_name == "mixgraph" or test_name == "tracefile":
-        if PRE_LOAD_DB_PATH != "":
+        if constants.PRE_LOAD_DB_PATH != "":
             log_update("[SPM] Running Pre-load command")
             print("[SPM] Running Pre-load command")
             tmp_runner_rm = ["rm", "-rf", database_path]
             tmp_proc_rm = subprocess.run(tmp_runner_rm, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
-            tmp_runner = ["cp", "-r", PRE_LOAD_DB_PATH, database_path]
-            tmp_proc = subprocess.run(tmp_runner, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
+            # Reflink or hard link the pre-loaded db instead of a full copy where the filesystem allows it
+            method = clone_db(constants.PRE_LOAD_DB_PATH, database_path)
+            log_update(f"[SPM] Pre-loaded db cloned with {method}")
 
     if test_name == "fillrandom":
         db_bench_command.append("--benchmarks=fillrandom")
     elif test_name == "readrandomwriterandom":
         db_bench_command.append("--benchmarks=readrandomwriterandom")
     elif test_name == "readrandom":
-        if PRE_LOAD_DB_PATH == "":
-            log_update("[SPM] Running fillrandom to load the database")
-            print("[SPM] Running fillrandom to load the database")
-            tmp_runner = db_bench_command[:-3] + ["--num=50000000", "--benchmarks=fillrandom", "--max_background_jobs=8"]
-            tmp_proc = subprocess.run(tmp_runner, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
-        new_db_bench = db_bench_command + ["--benchmarks=readrandom", "--use_existing_db", "--reads=5000000"]
+        if constants.PRE_LOAD_DB_PATH == "":
+            tmp_runner = db_bench_command[:-3] + [f"--num={preload_entries}", "--benchmarks=fillrandom", "--max_background_jobs=8"]
+            preload_db(test_name, tmp_runner, options, database_path, "fillrandom to load the database")
+        new_db_bench = db_bench_command + ["--benchmarks=readrandom", "--use_existing_db", f"--reads={int(5000000 * fidelity)}"]
         db_bench_command = new_db_bench
     elif test_name == "mixgraph":
-        if PRE_LOAD_DB_PATH == "":
-            log_update("[SPM] Running fillrandom to load the database")
-            print("[SPM] Running fillrandom to load the database")
-            tmp_runner = db_bench_command[:-3] + ["--num=50000000", "--benchmarks=fillrandom", "--key_size=48", "--value_size=43"]
-            tmp_proc = subprocess.run(tmp_runner, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
-        new_db_bench = db_bench_command[:-1] + ["--benchmarks=mixgraph", "--use_existing_db", f"--duration={DURATION}", 
+        if constants.PRE_LOAD_DB_PATH == "":
+            tmp_runner = db_bench_command[:-3] + [f"--num={preload_entries}", "--benchmarks=fillrandom", "--key_size=48", "--value_size=43"]
+            preload_db(test_name, tmp_runner, options, database_path, "fillrandom to load the database")
+        new_db_bench = db_bench_command[:-1] + ["--benchmarks=mixgraph", "--use_existing_db", f"--duration={duration}", 
                                                 "--mix_get_ratio=0.83", "--mix_put_ratio=0.14", "--mix_seek_ratio=0.03", "--key_size=48",
-                                                f"--sine_write_rate_interval_milliseconds={SINE_WRITE_RATE_INTERVAL_MILLISECONDS}", "--sine_mix_rate", 
-                                                f"--sine_a={SINE_A}", f"--sine_b={SINE_B}", f"--sine_c={SINE_C}", f"--sine_d={SINE_D}"]
+                                                f"--sine_write_rate_interval_milliseconds={constants.SINE_WRITE_RATE_INTERVAL_MILLISECONDS}", "--sine_mix_rate", 
+                                                f"--sine_a={constants.SINE_A}", f"--sine_b={constants.SINE_B}", f"--sine_c={constants.SINE_C}", f"--sine_d={constants.SINE_D}"]
         db_bench_command = new_db_bench
     elif test_name == "readwhilewriting":
         db_bench_command.append("--benchmarks=readwhilewriting")
     elif test_name == "sinetest":
         db_bench_command += [
             "--benchmarks=fillrandom", "--sine_write_rate=true",
-            f"--sine_write_rate_interval_milliseconds={SINE_WRITE_RATE_INTERVAL_MILLISECONDS}",
-            f"--sine_a={SINE_A}", f"--sine_b={SINE_B}", f"--sine_c={SINE_C}", f"--sine_d={SINE_D}",
+            f"--sine_write_rate_interval_milliseconds={constants.SINE_WRITE_RATE_INTERVAL_MILLISECONDS}",
+            f"--sine_a={constants.SINE_A}", f"--sine_b={constants.SINE_B}", f"--sine_c={constants.SINE_C}", f"--sine_d={constants.SINE_D}",
         ]
     elif test_name == "jsonconfigured":
         db_bench_command += [
@@ -131,12 +151,12 @@ def generate_db_bench_command(db_bench_path, database_path, options, run_count,
             f"--json_file_path={os.path.join(os.path.dirname(__file__), '../benchy.json')}"
         ]
     elif test_name == "tracefile":
-        if PRE_LOAD_CMD != "" and PRE_LOAD_DB_PATH == "":
-            tmp_runner = PRE_LOAD_CMD.split(" ")
-            tmp_proc = subprocess.run(tmp_runner, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
+        if constants.PRE_LOAD_CMD != "" and constants.PRE_LOAD_DB_PATH == "":
+            tmp_runner = constants.PRE_LOAD_CMD.split(" ")
+            preload_db(test_name, tmp_runner, options, database_path)
         db_bench_command[:-2] += [
             "--benchmarks=jsonconfigured", "--use_existing_db",
-            f"--json_file_path={os.path.join(OUTPUT_PATH, 'trace_model.json')}"
+            f"--json_file_path={os.path.join(constants.OUTPUT_PATH, 'trace_model.json')}"
         ]
     else:
         print(f"[SPM] Test name {test_name} not recognized")
@@ -163,36 +183,78 @@ def db_bench(db_bench_path, database_path, options, run_count, test_name, previo
     - None
     '''
     global proc_out
-    with open(f"{OPTIONS_FILE_DIR}", "w") as f:
+    with open(f"{constants.OPTIONS_FILE_DIR}", "w") as f:
         f.write(options)
 
+    # Skip the run if this options file was already measured for the same workload
+    cache_key = result_cache_key(options, db_bench_args, test_name)
+    cached = lookup_result(cache_key)
+    if cached is not None:
+        benchmark_results, avg_cpu_used, avg_mem_used = cached
+        return benchmark_results, avg_cpu_used, avg_mem_used, options
+
     # Perform pre-tasks to reset the environment
     pre_tasks(database_path, run_count)
     command = generate_db_bench_command(db_bench_path, database_path, options, run_count, test_name, db_bench_args)
 
     # Create dynamic option file
-    if DYNAMIC_OPTION_TUNING:
+    if constants.DYNAMIC_OPTION_TUNING:
         create_mmap_file()
 
     log_update(f"[SPM] Executing db_bench with command: {command}")
     print("[SPM] Executing db_bench")
 
 
-    if SIDE_CHECKER and previous_throughput != None:
-        cgm = CGroupManager("llm_cgroup", helper_script=os.path.abspath("utils/root_cgroup_helper.sh"))
-        cgroup_monitor = CGroupMonitor("llm_cgroup")
+    if constants.SIDE_CHECKER and previous_throughput != None:
+        cgm = CGroupManager(constants.CGROUP_NAME, helper_script=os.path.abspath("utils/root_cgroup_helper.sh"))
+        cgroup_monitor = CGroupMonitor(constants.CGROUP_NAME)
         
-        if DYNAMIC_OPTION_TUNING:
+        if constants.DYNAMIC_OPTION_TUNING:
             saved_optionfile = options_files[-1][0]
             cur_options_file = []
 
         start_time = time.time()
         cgroup_monitor.start_monitor()
 
+        # Dynamic option tuning runs on the worker while the reader keeps draining stdout
+        tuning_state = {"saved_optionfile": saved_optionfile if constants.DYNAMIC_OPTION_TUNING else None}
+
+        def decide_dynamic_options(current_avg_throughput):
+            print("[SQU] Dynamic option tuning is enabled and now running")
+            log_update("[SQU] Dynamic option tuning is enabled and now running")
+
+            db_path = path_of_db()
+            fio_result = get_fio_result(constants.FIO_PROFILE_DIR, db_path)
+            device_info = system_info(db_path, fio_result)
+
+            # Information from the last check interval
+            op = cgroup_monitor.get_last_n_stats(check_interval)
+            avg_cpu_used = op["average_cpu_usage_percent"]
+            avg_mem_used = op["average_memory_usage_percent"]
+
+            # Integrate current trace details into dynamic option tuning
+            trace_result = analyze_last_n_tracefile_windows(db_path + "/tracefile", check_interval//10)
+
+            cur_options_file.append([
+                tuning_state["saved_optionfile"],
+                {"ops_per_sec": current_avg_throughput}
+            ])
+
+            new_options, _, _, _ = dynamic_options_file_generation(None, db_bench_args, avg_cpu_used, avg_mem_used, None, device_info, trace_result, cur_options_file)
+            return new_options
+
+        def apply_dynamic_options(new_options):
+            tuning_state["saved_optionfile"] = new_options
+            write_to_mmap_file(new_options)
+
+        run_dir = new_run_dir(f"{constants.OUTPUT_PATH}/timeseries")
+        sampler = ResourceSampler(resource_table(run_dir), constants.CGROUP_NAME)
         with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True) as proc_out:
             cgm.add_process(proc_out.pid, sudo=True)
+            sampler.start()
 
-            output = ""
+            parser = DBBenchOutputParser(run_dir=run_dir)
+            monitor = EarlyStopMonitor(float(previous_throughput))
             first_check_interval = 100
             first_check_flag = False
 
@@ -201,8 +263,52 @@ def db_bench(db_bench_path, database_path, options, run_count, test_name, previo
             # So, we need to make this an infrequent call.
             check_interval = 90
 
-            for line in proc_out.stdout:
-                output += line
+            reader = OutputReader(proc_out.stdout, parser, constants.NUM_THREADS)
+            reader.start()
+            worker = DecisionWorker(decide_dynamic_options, apply_dynamic_options)
+            worker.start()
+
+            for seconds, current_throughput, current_avg_throughput in reader.samples():
+                decision = monitor.update(seconds, current_throughput)
+
+                # Active flagger: stop candidates that are confidently worse than the incumbent
+                if decision == WORSE and bm_iter < 3:
+                    print("[SQU] Throughput decreased, resetting the benchmark")
+                    log_update(f"[SQU] Throughput decreased {previous_throughput}->{monitor.mean} "
+                               f"(bounds {monitor.lower:.0f}-{monitor.upper:.0f}), resetting the benchmark")
+
+                    op = cgroup_monitor.stop_monitor()
+                    avg_cpu_used = op["average_cpu_usage_percent"]
+                    avg_mem_used = op["average_memory_usage_percent"]
+
+                    worker.cancel()
+                    proc_out.kill()
+                    reader.stop()
+                    sampler.stop()
+
+                    db_path = path_of_db()
+                    fio_result = get_fio_result(constants.FIO_PROFILE_DIR, db_path)
+                    device_info = system_info(db_path, fio_result)
+                    trace_result = analyze_tracefile(db_path + "/tracefile")
+
+                    new_options, db_bench_args, _, _ = midway_options_file_generation(options, db_bench_args, avg_cpu_used, avg_mem_used, monitor.mean, device_info, trace_result, options_files)
+                    benchmark_results, avg_cpu_used, avg_mem_used, options = db_bench(db_bench_path, database_path, new_options, run_count, test_name, previous_throughput, options_files, db_bench_args, bm_iter+1)
+                    benchmark_results["early_stop"] = [monitor.trace()] + benchmark_results.get("early_stop", [])
+
+                    log_update("[SPM] Finished running db_bench")
+                    return benchmark_results, avg_cpu_used, avg_mem_used, options
+
+                # Candidates that are confidently better can finish early when EARLY_ACCEPT is set
+                if decision == BETTER:
+                    print("[SQU] Throughput confidently above the incumbent, finishing early")
+                    log_update(f"[SQU] Throughput {monitor.mean} (bounds {monitor.lower:.0f}-{monitor.upper:.0f}) "
+                               f"confidently above {previous_throughput}, finishing early")
+                    proc_out.kill()
+                    break
+
+                if not constants.DYNAMIC_OPTION_TUNING:
+                    continue
+
                 elapsed_time = time.time() - start_time
 
                 # Read based workloads need additional time to build the cache
@@ -216,64 +322,22 @@ def db_bench(db_bench_path, database_path, options, run_count, test_name, previo
                 if elapsed_time <= check_interval:
                     continue
 
-                if "ops/second" in line:
-                    current_avg_throughput = (float(line.split("(")[2].split(",")[1].split(")")[0]))*NUM_THREADS
-
-                    # Active flagger monitoring throughput
-                    if (current_avg_throughput < .9 * float(previous_throughput)) and (bm_iter < 3):
-                        print("[SQU] Throughput decreased, resetting the benchmark")
-                        log_update(f"[SQU] Throughput decreased {previous_throughput}->{current_avg_throughput}, resetting the benchmark")
-
-                        op = cgroup_monitor.stop_monitor()
-                        avg_cpu_used = op["average_cpu_usage_percent"]
-                        avg_mem_used = op["average_memory_usage_percent"]
-
-                        proc_out.kill()
-
-                        db_path = path_of_db()
-                        fio_result = get_fio_result(FIO_RESULT_PATH)
-                        device_info = system_info(db_path, fio_result)
-                        trace_result = analyze_tracefile(db_path + "/tracefile")
-
-                        new_options, db_bench_args, _, _ = midway_options_file_generation(options, db_bench_args, avg_cpu_used, avg_mem_used, current_avg_throughput, device_info, trace_result, options_files)
-                        output, avg_cpu_used, avg_mem_used, options = db_bench(db_bench_path, database_path, new_options, run_count, test_name, previous_throughput, options_files, db_bench_args, bm_iter+1)
-
-                        log_update("[SPM] Finished running db_bench")
-                        return output, avg_cpu_used, avg_mem_used, options
+                # Dynamic Option Tuning
+                # To Do: Additional condition to check workload shift
+                if current_avg_throughput < 0.6 * float(previous_throughput):
+                    if not worker.submit(current_avg_throughput):
+                        log_update("[SQU] Previous dynamic option tuning is still running, skipping this check")
 
-                    # Dynamic Option Tuning
-                    # To Do: Additional condition to check workload shift
-                    if DYNAMIC_OPTION_TUNING and current_avg_throughput < 0.6 * float(previous_throughput):
-                        print("[SQU] Dynamic option tuning is enabled and now running")
-                        log_update("[SQU] Dynamic option tuning is enabled and now running")
-
-                        db_path = path_of_db()
-                        fio_result = get_fio_result(FIO_RESULT_PATH)
-                        device_info = system_info(db_path, fio_result)
-
-                        # Information from the last 20 seconds
-                        op = cgroup_monitor.get_last_n_stats(check_interval)
-                        avg_cpu_used = op["average_cpu_usage_percent"]
-                        avg_mem_used = op["average_memory_usage_percent"]
-
-                        # Integrate current trace details into dynamic option tuning
-                        trace_result = analyze_last_n_tracefile_windows(db_path + "/tracefile", check_interval//10)
-
-                        cur_options_file.append([
-                            saved_optionfile,
-                            {"ops_per_sec": current_avg_throughput}
-                        ])
-
-                        new_options, _, _, _ = dynamic_options_file_generation(None, db_bench_args, avg_cpu_used, avg_mem_used, None, device_info, trace_result, cur_options_file)
-
-                        saved_optionfile = new_options
+                start_time = time.time()
 
-                        write_to_mmap_file(new_options)
-                else:
-                    print("[SQU] No throughput found in the output")
-                    log_update("[SQU] No throughput found in the output")
+            # Drop a tuning round that is still running, db_bench has exited
+            worker.cancel()
+            reader.stop()
+            sampler.stop()
 
-                start_time = time.time()
+        if constants.DYNAMIC_OPTION_TUNING:
+            saved_optionfile = tuning_state["saved_optionfile"]
+            log_update(f"[SQU] Applied {worker.applied} dynamic option updates")
 
         print("[SPM] Finished running db_bench")
         print("----------------------------------------------------------------------------")
@@ -282,39 +346,79 @@ def db_bench(db_bench_path, database_path, options, run_count, test_name, previo
         avg_cpu_used = op["average_cpu_usage_percent"]
         avg_mem_used = op["average_memory_usage_percent"]
 
-        if DYNAMIC_OPTION_TUNING:
+        if monitor.decision == BETTER:
+            benchmark_results = parser.estimated_result(monitor.mean)
+        else:
+            benchmark_results = parser.result()
+        benchmark_results["early_stop"] = [monitor.trace()]
+
+        if constants.DYNAMIC_OPTION_TUNING:
             options = add_mmap_file_to_option(options, saved_optionfile)
 
-        return output, avg_cpu_used, avg_mem_used, options
+        # Runs whose options were changed midway do not measure the options file they were keyed by
+        if not constants.DYNAMIC_OPTION_TUNING or saved_optionfile == options_files[-1][0]:
+            record_result(cache_key, benchmark_results, avg_cpu_used, avg_mem_used)
+            record_observation(options, db_bench_args, benchmark_results, database_path)
+            record_full_result(cache_key, benchmark_results)
+
+        return benchmark_results, avg_cpu_used, avg_mem_used, options
     
     else:
+        benchmark_results, avg_cpu_used, avg_mem_used = run_in_cgroup(command, constants.CGROUP_NAME, constants.CGROUP_CPU_LIMIT, constants.CGROUP_MEMORY_LIMIT)
+        record_result(cache_key, benchmark_results, avg_cpu_used, avg_mem_used)
+        record_observation(options, db_bench_args, benchmark_results, database_path)
+        record_full_result(cache_key, benchmark_results)
 
-        cgm = CGroupManager("llm_cgroup", helper_script=os.path.abspath("utils/root_cgroup_helper.sh"))
-        cgm.create_cgroup()
-        cgm.set_cpu_limit(4)
-        cgm.set_memory_limit(4*1024*1024*1024)
-        cgm.set_memory_swap_limit(4*1024*1024*1024)
+        print("[SPM] Finished running db_bench")
+        print("---------------------------------------------------------------------------")
+        
+        return benchmark_results, avg_cpu_used, avg_mem_used, options
 
-        cgroup_monitor = CGroupMonitor("llm_cgroup")
-        cgroup_monitor.start_monitor()
 
-        proc_out = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True
-        )
-        cgm.add_process(proc_out.pid, sudo=True)
-        stdout, stderr = proc_out.communicate()
+def run_in_cgroup(command, cgroup_name, cpu_limit, memory_limit, fidelity=1.0):
+    '''
+    Run the db_bench command to completion inside the given cgroup
 
-        op = cgroup_monitor.stop_monitor()
-        avg_cpu_used = op["average_cpu_usage_percent"]
-        avg_mem_used = op["average_memory_usage_percent"]
+    Parameters:
+    - command (list): The db_bench command
+    - cgroup_name (str): The name of the cgroup to run in
+    - cpu_limit (int): The number of cores of the cgroup
+    - memory_limit (int): The memory (and memory+swap) limit of the cgroup in bytes
+    - fidelity (float): The fraction of the full run the command was generated for
 
-        print("[SPM] Finished running db_bench")
-        print("---------------------------------------------------------------------------")
-        
-        return stdout, avg_cpu_used, avg_mem_used, options
+    Returns:
+    - benchmark_results (dict): The parsed output of db_bench
+    - avg_cpu_used (float): The average CPU usage during the run
+    - avg_mem_used (float): The average memory usage during the run
+    '''
+    cgm = CGroupManager(cgroup_name, helper_script=os.path.abspath("utils/root_cgroup_helper.sh"))
+    cgm.create_cgroup()
+    cgm.set_cpu_limit(cpu_limit)
+    cgm.set_memory_limit(memory_limit)
+    cgm.set_memory_swap_limit(memory_limit)
+
+    cgroup_monitor = CGroupMonitor(cgroup_name)
+    cgroup_monitor.start_monitor()
+
+    run_dir = new_run_dir(f"{constants.OUTPUT_PATH}/timeseries")
+    sampler = ResourceSampler(resource_table(run_dir), cgroup_name)
+    proc_out = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True
+    )
+    cgm.add_process(proc_out.pid, sudo=True)
+    sampler.start()
+    benchmark_results = parse_db_bench_stream(proc_out.stdout, run_dir, fidelity)
+    proc_out.wait()
+    sampler.stop()
+
+    op = cgroup_monitor.stop_monitor()
+    avg_cpu_used = op["average_cpu_usage_percent"]
+    avg_mem_used = op["average_memory_usage_percent"]
+
+    return benchmark_results, avg_cpu_used, avg_mem_used
 
 
 def benchmark(db_path, options, output_file_dir, reasoning, changed_value_dict, iteration_count, previous_results, options_files, db_bench_args, bm_iter=0):
@@ -332,18 +436,16 @@ def benchmark(db_path, options, output_file_dir, reasoning, changed_value_dict,
     - benchmark_results (dict):
     '''
     if previous_results is None:
-        output, average_cpu_usage, average_memory_usage, options = db_bench(
-            DB_BENCH_PATH, db_path, options, iteration_count, TEST_NAME, None, options_files, db_bench_args)
+        benchmark_results, average_cpu_usage, average_memory_usage, options = db_bench(
+            constants.DB_BENCH_PATH, db_path, options, iteration_count, constants.TEST_NAME, None, options_files, db_bench_args)
     else:
-        if FINETUNE_ITERATION <= 0:
-            output, average_cpu_usage, average_memory_usage, options = db_bench(
-                DB_BENCH_PATH, db_path, options, iteration_count, TEST_NAME, previous_results['ops_per_sec'], options_files, db_bench_args)
+        if constants.FINETUNE_ITERATION <= 0:
+            benchmark_results, average_cpu_usage, average_memory_usage, options = db_bench(
+                constants.DB_BENCH_PATH, db_path, options, iteration_count, constants.TEST_NAME, incumbent_throughput(previous_results), options_files, db_bench_args)
         else:
-            output, average_cpu_usage, average_memory_usage, options, changed_value_dict = fine_tuning(
-                db_path, options, reasoning, changed_value_dict, previous_results['ops_per_sec'], options_files, db_bench_args)
+            benchmark_results, average_cpu_usage, average_memory_usage, options, changed_value_dict = fine_tuning(
+                db_path, options, reasoning, changed_value_dict, incumbent_throughput(previous_results), options_files, db_bench_args)
 
-    # log_update(f"[SPM] Output: {output}")
-    benchmark_results = parse_db_bench_output(output)
 
     contents = os.listdir(output_file_dir)
     ini_file_count = len([f for f in contents if f.endswith(".ini")])
@@ -359,12 +461,12 @@ def benchmark(db_path, options, output_file_dir, reasoning, changed_value_dict,
                               f"{ini_file_count}-incorrect_options.ini",
                               benchmark_results, options, reasoning, changed_value_dict)
         # Restore previous options_file
-        with open(f"{OPTIONS_FILE_DIR}", "w") as f:
+        with open(f"{constants.OPTIONS_FILE_DIR}", "w") as f:
             f.write(options_files[-1][0])
 
-        if bm_iter < ERROR_CORRECTION_COUNT:
-            print(f"[SPM] Retrying the benchmark with error correction {bm_iter+1}/{ERROR_CORRECTION_COUNT}")
-            log_update(f"[SPM] Retrying the benchmark with error correction {bm_iter+1}/{ERROR_CORRECTION_COUNT}")
+        if bm_iter < constants.ERROR_CORRECTION_COUNT:
+            print(f"[SPM] Retrying the benchmark with error correction {bm_iter+1}/{constants.ERROR_CORRECTION_COUNT}")
+            log_update(f"[SPM] Retrying the benchmark with error correction {bm_iter+1}/{constants.ERROR_CORRECTION_COUNT}")
             new_options, db_bench_args, reasoning, changed_value_dict = error_correction_options_file_generation(options, db_bench_args, reasoning, changed_value_dict, benchmark_results.get('error'), bm_iter)
             return benchmark(db_path, new_options, output_file_dir, reasoning, changed_value_dict, iteration_count, previous_results, options_files, db_bench_args, bm_iter+1)
 
@@ -379,22 +481,23 @@ def benchmark(db_path, options, output_file_dir, reasoning, changed_value_dict,
                               f"{ini_file_count}-incorrect_options.ini",
                               benchmark_results, options, reasoning, changed_value_dict)
         # Restore previous options_file
-        with open(f"{OPTIONS_FILE_DIR}", "w") as f:
+        with open(f"{constants.OPTIONS_FILE_DIR}", "w") as f:
             f.write(options_files[-1][0])
 
-        if bm_iter < ERROR_CORRECTION_COUNT:
-            print(f"[SPM] Retrying the benchmark with error correction {bm_iter+1}/{ERROR_CORRECTION_COUNT}")
-            log_update(f"[SPM] Retrying the benchmark with error correction {bm_iter+1}/{ERROR_CORRECTION_COUNT}")
+        if bm_iter < constants.ERROR_CORRECTION_COUNT:
+            print(f"[SPM] Retrying the benchmark with error correction {bm_iter+1}/{constants.ERROR_CORRECTION_COUNT}")
+            log_update(f"[SPM] Retrying the benchmark with error correction {bm_iter+1}/{constants.ERROR_CORRECTION_COUNT}")
             new_options, db_bench_args, reasoning, changed_value_dict = error_correction_options_file_generation(options, db_bench_args, reasoning, changed_value_dict, benchmark_results.get('error'), bm_iter)
             return benchmark(db_path, new_options, output_file_dir, reasoning, changed_value_dict, iteration_count, previous_results, options_files, db_bench_args, bm_iter+1)
 
     else:
         is_error = False
+        attach_resources(benchmark_results, average_cpu_usage, average_memory_usage)
 
         # Store the output of db_bench in a file
         store_db_bench_output(output_file_dir, f"{ini_file_count}.ini",
                               benchmark_results, options, reasoning, changed_value_dict)
-        plot_2axis(*benchmark_results["ops_per_second_graph"],
+        plot_2axis(*throughput_series(benchmark_results),
                    f"Ops Per Second - {benchmark_results['ops_per_sec']}",
                    f"{output_file_dir}/ops_per_sec_{ini_file_count}.png")
         log_update(f"[SPM] Latest result: {benchmark_results['data_speed']}"
@@ -407,3 +510,98 @@ def benchmark(db_path, options, output_file_dir, reasoning, changed_value_dict,
         )
 
     return is_error, benchmark_results, average_cpu_usage, average_memory_usage, options
+
+
+def run_proxy(db_path, options, db_bench_args, fidelity):
+    '''
+    Function to run a candidate at reduced fidelity: a shorter run with fewer entries on a
+    proportionally smaller preloaded database, without the side checker
+
+    Parameters:
+    - db_path (str): The path of database
+    - options (str): The options file of the candidate
+    - db_bench_args (list): Extra arguments passed to db_bench
+    - fidelity (float): The fraction of the full run
+
+    Returns:
+    - benchmark_results (dict): The parsed output of db_bench, with its fidelity
+    '''
+    cache_key = result_cache_key(options, db_bench_args, constants.TEST_NAME, fidelity)
+    cached = lookup_result(cache_key)
+    if cached is not None:
+        benchmark_results = cached[0]
+    else:
+        with open(f"{constants.OPTIONS_FILE_DIR}", "w") as f:
+            f.write(options)
+        pre_tasks(db_path, 0)
+        command = generate_db_bench_command(constants.DB_BENCH_PATH, db_path, options, 0, constants.TEST_NAME, db_bench_args,
+                                            dynamic_options=False, fidelity=fidelity)
+        log_update(f"[SPM] Executing {fidelity:.3f} fidelity proxy run with command: {command}")
+        benchmark_results, avg_cpu_used, avg_mem_used = run_in_cgroup(
+            command, constants.CGROUP_NAME, constants.CGROUP_CPU_LIMIT, constants.CGROUP_MEMORY_LIMIT, fidelity)
+        attach_resources(benchmark_results, avg_cpu_used, avg_mem_used)
+        record_result(cache_key, benchmark_results, avg_cpu_used, avg_mem_used)
+
+    # Paired with the full run of the candidate, if it is promoted, to track the rank correlation
+    note_proxy_result(result_cache_key(options, db_bench_args, constants.TEST_NAME), fidelity, benchmark_results)
+    return benchmark_results
+
+
+def triage_candidates(db_path, candidates, keep, config=None):
+    '''
+    Function to choose the candidates promoted to full-fidelity runs by successive halving.
+    All candidates run at the proxy fidelity, the best 1/proxy_eta of them run again at
+    proxy_eta times the fidelity, and so on until `keep` candidates are left. The triage is
+    skipped once the recorded proxy runs rank candidates unlike the full runs, and for
+    workloads whose proxy runs cannot be scaled down.
+
+    Parameters:
+    - db_path (str): The path of database
+    - candidates (list): Tuples of (options, db_bench_args, reasoning, changed_value_dict)
+    - keep (int): The number of candidates promoted
+    - config (TuningConfig, optional): The session config. Default is the config of the current session.
+
+    Returns:
+    - candidates (list): The promoted candidates, in generation order
+    '''
+    config = config or get_config()
+    fidelity = min(1.0, config.proxy_duration / config.duration)
+    if len(candidates) <= keep or fidelity >= 1.0:
+        return candidates
+
+    reason = proxy_unscalable(config)
+    if reason is not None:
+        log_update(f"[SPM] Proxy tier skipped, proxy runs would not be smaller than full runs: {reason}")
+        print(f"[SPM] Proxy tier skipped, proxy runs would not be smaller than full runs: {reason}")
+        return candidates
+
+    if proxy_trusted(fidelity, config) is False:
+        rho, pairs = proxy_correlation(fidelity, config)
+        log_update(f"[SPM] Proxy tier skipped, its rank correlation with full runs is {rho:.2f} over {pairs} candidates")
+        print(f"[SPM] Proxy tier skipped, its rank correlation with full runs is {rho:.2f}")
+        return candidates
+
+    survivors = list(range(len(candidates)))
+    while len(survivors) > keep:
+        scores = {}
+        for index in survivors:
+            options, db_bench_args, _, _ = candidates[index]
+            benchmark_results = run_proxy(db_path, options, db_bench_args, fidelity)
+            if benchmark_results.get("error") is None and benchmark_results.get("data_speed") is not None:
+                scores[index] = score(benchmark_results, config)
+
+        # Candidates whose options fail are left to the full runs, which correct their errors
+        if not scores:
+            log_update(f"[SPM] All {len(survivors)} proxy runs at fidelity {fidelity:.3f} failed")
+            return [candidates[index] for index in survivors[:keep]]
+
+        next_fidelity = fidelity * config.proxy_eta
+        size = keep if next_fidelity >= 1.0 else max(keep, math.ceil(len(survivors) / config.proxy_eta))
+        # Stable, so equally scored candidates keep their generation order
+        ranked = sorted(scores, key=lambda index: scores[index], reverse=True)
+        survivors = sorted(ranked[:size])
+        log_update(f"[SPM] Proxy tier at fidelity {fidelity:.3f} promoted candidates {survivors}")
+        print(f"[SPM] Proxy tier at fidelity {fidelity:.3f} promoted candidates {survivors}")
+        fidelity = next_fidelity
+
+    return [candidates[index] for index in survivors]
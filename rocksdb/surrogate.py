@@ -0,0 +1,268 @@
+import os
+import json
+import math
+import time
+import threading
+
+import numpy as np
+
+from options_files.ops_options_file import parse_option_file_to_dict, parse_db_bench_args_to_dict
+from utils.config import get_config
+from utils.scoring import OBJECTIVES, metric, objective_target
+from utils.system_operations.fio_runner import device_features, get_device_profile
+from utils.utils import log_update
+
+# The surrogate only screens candidates once it has seen this many runs of the workload
+SURROGATE_MIN_OBSERVATIONS = 4
+# Observation noise of the normalized objective, db_bench runs vary by a few percent
+SURROGATE_NOISE = 0.05
+EI_XI = 0.01
+UCB_KAPPA = 2.0
+
+_history_lock = threading.Lock()
+
+
+def encode_value(key, value, features):
+    '''
+    Function to add one option to a feature dict. Numbers are log scaled, as option values
+    span orders of magnitude, booleans are 0/1 and other values are one-hot encoded.
+    '''
+    value = value.strip()
+    if value.lower() in ("true", "false"):
+        features[key] = 1.0 if value.lower() == "true" else 0.0
+        return
+    try:
+        number = float(value)
+    except ValueError:
+        features[f"{key}={value}"] = 1.0
+        return
+    if math.isfinite(number):
+        features[key] = math.copysign(math.log1p(abs(number)), number)
+
+
+def option_features(options, db_bench_args=None):
+    '''
+    Function to turn an options file and the db_bench arguments into numeric features
+
+    Parameters:
+    - options (str): The options file
+    - db_bench_args (list, optional): Extra arguments passed to db_bench
+
+    Returns:
+    - features (dict): E.g. "DBOptions.max_background_jobs" -> log1p(8)
+    '''
+    features = {}
+    try:
+        parsed = parse_option_file_to_dict(options)
+    except Exception:
+        parsed = {}
+    for section, values in parsed.items():
+        for key, value in values.items():
+            encode_value(f"{section}.{key}", value, features)
+    for key, value in parse_db_bench_args_to_dict(db_bench_args or []).items():
+        encode_value(f"db_bench.{key}", value, features)
+    return features
+
+
+def workload_features(db_path, config=None):
+    '''
+    Function to describe the workload and the device of the session, so runs of other
+    sessions in the history only count as far as they are alike
+
+    Parameters:
+    - db_path (str): The database path, its device is profiled with fio
+    - config (TuningConfig, optional): The session config. Default is the config of the current session.
+
+    Returns:
+    - features (dict): The workload and device features
+    '''
+    config = config or get_config()
+    features = {
+        f"workload.test_name={config.test_name}": 1.0,
+        "workload.num_threads": math.log1p(config.num_threads),
+        "workload.num_entries": math.log1p(config.num_entries),
+    }
+    profile = get_device_profile(config.fio_profile_dir, db_path)
+    for key, value in device_features(profile).items():
+        features[f"device.{key}"] = math.log1p(max(value, 0.0))
+    return features
+
+
+def record_observation(options, db_bench_args, benchmark_results, db_path, config=None):
+    '''
+    Function to add a measured run to the surrogate history. Failed runs are not recorded.
+
+    Parameters:
+    - options (str): The options file of the run
+    - db_bench_args (list): Extra arguments passed to db_bench
+    - benchmark_results (dict): The parsed output of db_bench
+    - db_path (str): The database path of the run
+
+    Returns:
+    - None
+    '''
+    config = config or get_config()
+    if benchmark_results.get("error") is not None or benchmark_results.get("data_speed") is None:
+        return
+
+    features = option_features(options, db_bench_args)
+    features.update(workload_features(db_path, config))
+    metrics = {name: metric(benchmark_results, name) for name in OBJECTIVES}
+    record = {
+        "created": time.time(),
+        "features": features,
+        "metrics": {name: value for name, value in metrics.items() if value is not None},
+    }
+    with _history_lock:
+        os.makedirs(os.path.dirname(config.surrogate_history_path) or ".", exist_ok=True)
+        with open(config.surrogate_history_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def load_history(config=None):
+    '''
+    Function to read the surrogate history
+
+    Returns:
+    - records (list): The recorded runs, oldest first
+    '''
+    config = config or get_config()
+    if not os.path.exists(config.surrogate_history_path):
+        return []
+    records = []
+    with open(config.surrogate_history_path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A run killed mid-write leaves a partial last line
+                continue
+    return records
+
+
+def feature_matrix(rows, columns, fill):
+    matrix = np.empty((len(rows), len(columns)))
+    for i, features in enumerate(rows):
+        matrix[i] = [features.get(column, fill[column]) for column in columns]
+    return matrix
+
+
+class GaussianProcess:
+    '''
+    Gaussian process regression with a squared exponential kernel over standardized features.
+    The length scale is the median distance between the training points, which needs no
+    fitting and is adequate for the few dozen runs of a tuning history.
+    '''
+
+    def __init__(self, noise=SURROGATE_NOISE):
+        '''
+        Parameters:
+        - noise (float): Observation noise variance of the standardized target
+        '''
+        self.noise = noise
+
+    @staticmethod
+    def squared_distances(a, b):
+        return np.maximum((a * a).sum(1)[:, None] + (b * b).sum(1)[None, :] - 2 * a @ b.T, 0.0)
+
+    def fit(self, x, y):
+        self.x = x
+        self.y_mean = y.mean()
+        self.y_std = y.std() or 1.0
+        distances = self.squared_distances(x, x)
+        positive = distances[distances > 0]
+        self.length_scale2 = float(np.median(positive)) if len(positive) else 1.0
+        kernel = np.exp(-distances / (2 * self.length_scale2)) + self.noise * np.eye(len(x))
+        self.cholesky = np.linalg.cholesky(kernel)
+        self.alpha = np.linalg.solve(self.cholesky.T, np.linalg.solve(self.cholesky, (y - self.y_mean) / self.y_std))
+        return self
+
+    def predict(self, x):
+        '''
+        Returns:
+        - mean (np.ndarray): The predicted targets
+        - std (np.ndarray): Their standard deviations
+        '''
+        cross = np.exp(-self.squared_distances(x, self.x) / (2 * self.length_scale2))
+        mean = cross @ self.alpha
+        v = np.linalg.solve(self.cholesky, cross.T)
+        variance = np.maximum(1.0 - (v * v).sum(0), 1e-12)
+        return mean * self.y_std + self.y_mean, np.sqrt(variance) * self.y_std
+
+
+def expected_improvement(mean, std, best, xi=EI_XI):
+    z = (mean - best - xi) / std
+    cdf = 0.5 * (1 + np.array([math.erf(v / math.sqrt(2)) for v in z]))
+    pdf = np.exp(-0.5 * z * z) / math.sqrt(2 * math.pi)
+    return (mean - best - xi) * cdf + std * pdf
+
+
+def upper_confidence_bound(mean, std, kappa=UCB_KAPPA):
+    return mean + kappa * std
+
+
+def rank_candidates(candidates, db_path, config=None):
+    '''
+    Function to rank candidate options files by the acquisition function of a surrogate fit
+    to the history of the workload. Without enough history the candidates keep their order.
+
+    Parameters:
+    - candidates (list): Tuples of (options, db_bench_args, reasoning, changed_value_dict)
+    - db_path (str): The database path of the session
+    - config (TuningConfig, optional): The session config. Default is the config of the current session.
+
+    Returns:
+    - order (list): The candidate indices, most promising first
+    - predictions (list): (mean, std, acquisition) per candidate in candidate order, None without a surrogate
+    '''
+    config = config or get_config()
+    order = list(range(len(candidates)))
+    if len(candidates) < 2:
+        return order, None
+
+    workload = workload_features(db_path, config)
+    history = [record for record in load_history(config) if config.objective in record["metrics"]]
+    # Only runs of the same workload are comparable, the device features weight the other devices
+    history = [record for record in history if f"workload.test_name={config.test_name}" in record["features"]]
+    if len(history) < SURROGATE_MIN_OBSERVATIONS:
+        log_update(f"[SUR] {len(history)} observations of {config.test_name}, not screening candidates yet")
+        return order, None
+
+    rows = [record["features"] for record in history]
+    y = np.array([objective_target(record["metrics"][config.objective], config.objective) for record in history])
+    candidate_rows = []
+    for options, db_bench_args, _, _ in candidates:
+        features = option_features(options, db_bench_args)
+        features.update(workload)
+        candidate_rows.append(features)
+
+    # Missing one-hot columns are 0, missing numeric options are assumed to be at their mean
+    columns = sorted(set().union(*rows, *candidate_rows))
+    fill = {}
+    for column in columns:
+        values = [features[column] for features in rows if column in features]
+        fill[column] = 0.0 if "=" in column or not values else float(np.mean(values))
+    x = feature_matrix(rows, columns, fill)
+    x_candidates = feature_matrix(candidate_rows, columns, fill)
+
+    # Columns that never change in the history tell the surrogate nothing
+    mean, std = x.mean(0), x.std(0)
+    varying = std > 1e-9
+    if not varying.any():
+        return order, None
+    x = (x[:, varying] - mean[varying]) / std[varying]
+    x_candidates = (x_candidates[:, varying] - mean[varying]) / std[varying]
+
+    model = GaussianProcess().fit(x, y)
+    predicted, uncertainty = model.predict(x_candidates)
+    if config.surrogate_acquisition == "ucb":
+        acquisition = upper_confidence_bound(predicted, uncertainty)
+    else:
+        acquisition = expected_improvement(predicted, uncertainty, y.max())
+
+    # Stable, so equally promising candidates keep their generation order
+    order = sorted(order, key=lambda i: -acquisition[i])
+    predictions = list(zip(predicted.tolist(), uncertainty.tolist(), acquisition.tolist()))
+    log_update(f"[SUR] Ranked {len(candidates)} candidates with {len(history)} observations: order {order}, "
+               f"(mean, std, {config.surrogate_acquisition}) {predictions}")
+    return order, predictions
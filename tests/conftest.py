@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from utils.config import TuningConfig, set_config
+from utils.utils import close_log_writer
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    '''
+    Session config of a test. The relative data/ paths of the caches resolve below the
+    temporary directory of the test, as does the output folder.
+    '''
+    monkeypatch.chdir(tmp_path)
+    config = TuningConfig(output_path=str(tmp_path / "output"))
+    set_config(config)
+    yield config
+    close_log_writer()
+    set_config(None)
@@ -0,0 +1,149 @@
+import json
+import time
+import asyncio
+import threading
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from gpt import async_gpt_request
+from gpt.async_gpt_request import get_loop, run_async, gather_async, chat_completion
+from utils.config import set_config
+
+
+class StubServer:
+    '''
+    Local stand-in for the chat completions API. Answers after `delay` seconds, fails the
+    first requests with the given status codes and tracks how many requests overlap.
+    '''
+
+    def __init__(self, delay=0.0, failures=()):
+        self.delay = delay
+        self.failures = list(failures)
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                with stub.lock:
+                    stub.requests += 1
+                    status = stub.failures.pop(0) if stub.failures else 200
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    time.sleep(stub.delay)
+                    body = stub.completion() if status == 200 else {"error": {"message": "stub error"}}
+                    payload = json.dumps(body).encode()
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @staticmethod
+    def completion():
+        return {
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "ok"}}],
+            "usage": {"prompt_tokens": 3, "completion_tokens": 1, "total_tokens": 4},
+        }
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+
+@pytest.fixture
+def stub(config, monkeypatch):
+    set_config(replace(config, llm_model="stub", llm_max_concurrency=2, llm_max_retries=3))
+    server = StubServer()
+    server.thread.start()
+    monkeypatch.setenv("OPENAI_BASE_URL", server.url)
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    monkeypatch.setattr(async_gpt_request, "BACKOFF_BASE_SECONDS", 0.05)
+    # The clients and the semaphore are built for the config of the first request
+    monkeypatch.setattr(async_gpt_request, "_clients", {})
+    monkeypatch.setattr(async_gpt_request, "_semaphore", None)
+    monkeypatch.setattr(async_gpt_request, "_stats", [])
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
+
+
+def ask():
+    return chat_completion([{"role": "user", "content": "hi"}])
+
+
+def test_concurrency_is_bounded(stub):
+    stub.delay = 0.2
+    completions = gather_async([ask() for _ in range(6)])
+
+    assert [c.choices[0].message.content for c in completions] == ["ok"] * 6
+    assert stub.requests == 6
+    assert stub.max_in_flight == 2
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retries_with_backoff(stub, status):
+    stub.failures = [status, status]
+    start_time = time.time()
+    completion = run_async(ask())
+
+    assert completion.choices[0].message.content == "ok"
+    assert stub.requests == 3
+    assert async_gpt_request.request_stats()["retries"] == 2
+    # Jittered backoff of at least half of 0.05 and 0.1 seconds
+    assert time.time() - start_time >= 0.075
+
+
+def test_gives_up_after_max_retries(stub):
+    import openai
+    stub.failures = [429] * 10
+    with pytest.raises(openai.RateLimitError):
+        run_async(ask())
+    assert stub.requests == 4
+
+
+def test_client_errors_are_not_retried(stub):
+    import openai
+    stub.failures = [400]
+    with pytest.raises(openai.BadRequestError):
+        run_async(ask())
+    assert stub.requests == 1
+
+
+def test_cancellation_releases_the_slot(stub):
+    stub.delay = 1.0
+    futures = [asyncio.run_coroutine_threadsafe(ask(), get_loop()) for _ in range(2)]
+    time.sleep(0.3)
+    for future in futures:
+        future.cancel()
+    for future in futures:
+        with pytest.raises(Exception):
+            future.result(timeout=5)
+        assert future.cancelled()
+
+    # Both slots were released, so a new request is not blocked by the cancelled ones
+    stub.delay = 0.0
+    start_time = time.time()
+    assert run_async(ask()).choices[0].message.content == "ok"
+    assert time.time() - start_time < 0.9
+    assert async_gpt_request._semaphore._value == 2
@@ -0,0 +1,78 @@
+import os
+import sys
+import threading
+import subprocess
+from dataclasses import replace
+
+import pytest
+
+from conftest import REPO_DIR
+from rocksdb.result_cache import result_cache_key
+from utils import constants
+from utils.config import SessionThread, TuningConfig, get_config, set_config
+from utils.utils import close_log_writer, log_gpt_response, log_update
+
+
+def test_get_config_requires_set_config():
+    set_config(None)
+    with pytest.raises(RuntimeError):
+        get_config()
+    with pytest.raises(RuntimeError):
+        constants.TEST_NAME
+
+
+def test_constants_follow_set_config(config):
+    key = result_cache_key("[DBOptions]\n", [])
+    set_config(replace(config, test_name="fillrandom", duration=5))
+
+    assert (constants.TEST_NAME, constants.DURATION) == ("fillrandom", 5)
+    assert result_cache_key("[DBOptions]\n", []) != key
+
+
+def run_session(config, barrier):
+    set_config(config)
+    barrier.wait()
+    log_update(f"[TST] Session {constants.TEST_NAME}")
+    # Threads started by the session, such as the db_bench reader, log to the session
+    worker = SessionThread(target=lambda: log_update(f"[TST] Worker {constants.TEST_NAME}"))
+    worker.start()
+    worker.join()
+    log_gpt_response("prompt", constants.TEST_NAME)
+    close_log_writer()
+
+
+def read_outputs(output_path):
+    with open(os.path.join(output_path, "log.txt")) as f:
+        log = f.read()
+    with open(os.path.join(output_path, "gpt_response", "response_1.txt")) as f:
+        response = f.read()
+    return log, response, os.listdir(os.path.join(output_path, "gpt_response"))
+
+
+def test_sessions_keep_separate_outputs(tmp_path):
+    configs = [TuningConfig(output_path=str(tmp_path / name), test_name=name) for name in ["fillrandom", "mixgraph"]]
+
+    # In parallel threads, then one after the other in the same thread
+    barrier = threading.Barrier(len(configs))
+    threads = [threading.Thread(target=run_session, args=(config, barrier)) for config in configs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for config in configs:
+        run_session(config, threading.Barrier(1))
+    set_config(None)
+
+    for config, other in [configs, configs[::-1]]:
+        log, response, responses = read_outputs(config.output_path)
+        assert log.count(f"Session {config.test_name}") == 2 and log.count(f"Worker {config.test_name}") == 2
+        assert other.test_name not in log and other.test_name not in response
+        assert sorted(responses) == ["response_1.txt", "response_2.txt"]
+
+
+def test_import_does_not_parse_arguments():
+    # argparse exits on the unknown argument if any module parses the command line at import
+    proc = subprocess.run([sys.executable, "-c", "import rocksdb.result_cache, rocksdb.preload_cache, "
+                           "trace_analyzer.trace_summarizer, gpt.async_gpt_request", "--unknown-argument"],
+                          cwd=REPO_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    assert proc.returncode == 0, proc.stderr
@@ -0,0 +1,66 @@
+import pytest
+
+from utils.dynamic_options import COMPRESSION_TYPES, OPTIONS_BY_NAME, parse_dynamic_options
+from utils.mmap_utils import add_mmap_file_to_option
+
+
+def parsed_values(text):
+    options, errors = parse_dynamic_options(text)
+    return {option.name: value for option, value in options.items()}, errors
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("64MB", 64 * 1024 ** 2),
+    ("64 MB", 64 * 1024 ** 2),
+    ("64 MiB", 64 * 1024 ** 2),
+    ("1G", 1024 ** 3),
+    ("512k", 512 * 1024),
+    ("67108864", 67108864),
+    ("6.4e+7", 64000000),
+])
+def test_units(value, expected):
+    values, errors = parsed_values(f"target_file_size_base={value}\n")
+    assert values == {"target_file_size_base": expected} and errors == []
+
+
+def test_exponent_and_comments():
+    values, errors = parsed_values("level0_slowdown_writes_trigger = 1e+3  # fewer stalls\n"
+                                   "  max_background_jobs=8;\n"
+                                   "write_buffer_size=`128MB`,\n")
+    assert values == {"level0_slowdown_writes_trigger": 1000, "max_background_jobs": 8,
+                      "write_buffer_size": 128 * 1024 ** 2}
+    assert errors == []
+
+
+@pytest.mark.parametrize("value", ["kLZ4HCCompression", "lz4hc", "LZ4HC", "LZ4HCCompression"])
+def test_compression_spellings(value):
+    values, _ = parsed_values(f"compression={value}\n")
+    assert values == {"compression": COMPRESSION_TYPES["kLZ4HCCompression"]}
+
+
+def test_compression_values_follow_the_enum_order():
+    # kNoCompression is 0 and kSnappyCompression 1, as in RocksDB's CompressionType
+    for value, expected in [("no", 0), ("none", 0), ("kNoCompression", 0), ("snappy", 1), ("kSnappyCompression", 1)]:
+        assert parsed_values(f"compression={value}\n")[0] == {"compression": expected}
+
+
+def test_values_are_clamped():
+    values, errors = parsed_values("max_background_jobs=1000\nmax_write_buffer_number=1\n"
+                                   "max_bytes_for_level_multiplier=0.5\n")
+    assert values == {"max_background_jobs": 256, "max_write_buffer_number": 2, "max_bytes_for_level_multiplier": 1.0}
+    assert len(errors) == 3 and all("out of boundaries" in error for error in errors)
+
+
+def test_invalid_and_ignored_values():
+    values, errors = parsed_values("max_background_jobs=many\ndisable_auto_compactions=maybe\n"
+                                   "write_buffer_size=1.5\ndelete_obsolete_files_period_micros=10\n")
+    assert values == {}
+    assert len(errors) == 3
+    assert OPTIONS_BY_NAME["delete_obsolete_files_period_micros"].scope == "none"
+
+
+def test_options_file_gets_the_published_values():
+    options_file = "[CFOptions \"default\"]\ntarget_file_size_base=1048576\ncompression=kNoCompression\nnum_levels=7"
+    updated = add_mmap_file_to_option(options_file, "target_file_size_base=64 MB\ncompression=lz4hc\nnum_levels=5\n")
+    assert updated.split("\n") == ["[CFOptions \"default\"]", "target_file_size_base = 67108864",
+                                   "compression = kLZ4HCCompression", "num_levels=7"]
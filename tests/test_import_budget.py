@@ -0,0 +1,78 @@
+import os
+import sys
+import subprocess
+import importlib.util
+
+import pytest
+
+from conftest import REPO_DIR
+
+# Modules that must only be imported when their subsystem is used
+LAZY_MODULES = ["langchain", "langchain_core", "langchain_openai", "langchain_community", "faiss",
+                "openai", "httpx", "scipy", "matplotlib", "pandas", "deepdiff", "cpuinfo"]
+IMPORT_BUDGET_MODULE = "main"
+# Slower machines can raise the budget with IMPORT_BUDGET_MS
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", 1500))
+
+# System dependencies of main that are not on PyPI or need a build, stubbed where missing
+STUB_MODULES = {
+    "cgroup_monitor": "class CGroupMonitor:\n    pass\n\n\nclass CGroupManager:\n    pass\n",
+    "psutil": "",
+}
+
+
+def stub_path(directory):
+    '''
+    Function to write stubs of the STUB_MODULES that are not installed
+
+    Parameters:
+    - directory (pathlib.Path): The directory of the stubs
+
+    Returns:
+    - path (str): The directory, to put on the PYTHONPATH
+    '''
+    for name, source in STUB_MODULES.items():
+        if importlib.util.find_spec(name) is None:
+            (directory / f"{name}.py").write_text(source)
+    return str(directory)
+
+
+def measure_imports(module, python_path=None):
+    '''
+    Function to import a module in a fresh interpreter with -X importtime
+
+    Parameters:
+    - module (str): The module to import
+    - python_path (str, optional): A directory put on the PYTHONPATH of the interpreter
+
+    Returns:
+    - imports (list): Tuples of (module name, self time in us, cumulative time in us), in import order
+    '''
+    env = dict(os.environ)
+    if python_path is not None:
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [python_path, env.get("PYTHONPATH")]))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=REPO_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if proc.returncode != 0:
+        error = "\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:"))
+        pytest.fail(f"import {module} failed:\n{error}")
+
+    # "import time:       self [us] |  cumulative | imported package"
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def test_import_budget(tmp_path):
+    imports = measure_imports(IMPORT_BUDGET_MODULE, stub_path(tmp_path))
+    total_ms = next(cumulative for name, _, cumulative in imports if name == IMPORT_BUDGET_MODULE) / 1000
+    top_level = sorted((entry for entry in imports if "." not in entry[0]), key=lambda entry: -entry[2])
+    slowest = ", ".join(f"{name} {cumulative / 1000:.0f} ms" for name, _, cumulative in top_level[:10])
+
+    eager = sorted({name.split(".")[0] for name, _, _ in imports} & set(LAZY_MODULES))
+    assert not eager, f"Imported eagerly, should be imported on first use: {', '.join(eager)}"
+    assert total_ms <= IMPORT_BUDGET_MS, f"import {IMPORT_BUDGET_MODULE} took {total_ms:.0f} ms, slowest: {slowest}"
@@ -0,0 +1,64 @@
+import os
+import sys
+import threading
+from dataclasses import replace
+
+from rocksdb.preload_cache import preload_db, store_preloaded_db, restore_preloaded_db
+from utils.config import in_session, set_config
+
+
+def make_db(path, files):
+    os.makedirs(path, exist_ok=True)
+    for name, content in files.items():
+        with open(os.path.join(path, name), "w") as f:
+            f.write(content)
+
+
+def test_concurrent_stores_of_one_key(config, tmp_path):
+    set_config(replace(config, preload_cache_dir=str(tmp_path / "cache")))
+    os.makedirs(tmp_path / "cache")
+    files = {f"{i:06d}.sst": "x" * 100000 for i in range(20)}
+    files.update({"CURRENT": "MANIFEST-000001\n", "MANIFEST-000001": "m"})
+    sources = [str(tmp_path / f"db_w{i}") for i in range(4)]
+    for source in sources:
+        make_db(source, files)
+
+    threads = [threading.Thread(target=in_session(store_preloaded_db), args=("key", source)) for source in sources]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert os.listdir(tmp_path / "cache") == ["key"]
+    assert restore_preloaded_db("key", str(tmp_path / "restored"))
+    assert sorted(os.listdir(tmp_path / "restored")) == sorted(files)
+
+
+def test_preload_runs_only_on_a_miss(config, tmp_path, capsys):
+    set_config(replace(config, preload_cache_dir=str(tmp_path / "cache")))
+    database_path = str(tmp_path / "db")
+    command = [sys.executable, "-c", f"import os; os.makedirs({database_path!r}); "
+               f"open(os.path.join({database_path!r}, '000001.sst'), 'w').write('data')"]
+
+    preload_db("readrandom", command, "[DBOptions]\n", database_path, "fillrandom to load the database")
+    assert "Running fillrandom to load the database" in capsys.readouterr().out
+
+    preload_db("readrandom", command, "[DBOptions]\n", database_path, "fillrandom to load the database")
+    output = capsys.readouterr().out
+    assert "Running fillrandom" not in output
+    assert "Restored preloaded database" in output
+    assert os.listdir(database_path) == ["000001.sst"]
+
+
+def test_failed_preload_is_not_cached(config, tmp_path, capsys):
+    set_config(replace(config, preload_cache_dir=str(tmp_path / "cache")))
+    database_path = str(tmp_path / "db")
+    write_db = (f"import os; os.makedirs({database_path!r}); "
+                f"open(os.path.join({database_path!r}, '000001.sst'), 'w').write('partial'); ")
+
+    # Killed halfway, and rejecting the options file with exit code 0
+    for script in [write_db + "os._exit(137)", write_db + "print('Unable to load options file options.ini')"]:
+        preload_db("readrandom", [sys.executable, "-c", script], "[DBOptions]\n", database_path, "fillrandom to load the database")
+        assert "Preload failed" in capsys.readouterr().out
+        assert not os.path.exists(database_path)
+        assert os.listdir(tmp_path / "cache") == []
@@ -0,0 +1,25 @@
+from dataclasses import replace
+
+import pytest
+
+from rocksdb.proxy_tier import proxy_unscalable, spearman
+
+
+@pytest.mark.parametrize("test_name, pre_load_db_path, scalable", [
+    ("fillrandom", "", True),
+    ("mixgraph", "", True),
+    ("readrandom", "", True),
+    ("mixgraph", "/data/preloaded", False),
+    ("readrandom", "/data/preloaded", False),
+    ("fillrandom", "/data/preloaded", True),
+    ("tracefile", "", False),
+])
+def test_proxy_unscalable(config, test_name, pre_load_db_path, scalable):
+    reason = proxy_unscalable(replace(config, test_name=test_name, pre_load_db_path=pre_load_db_path))
+    assert (reason is None) == scalable
+
+
+def test_spearman():
+    assert spearman([1, 2, 3, 4], [10, 20, 30, 40]) == pytest.approx(1.0)
+    assert spearman([1, 2, 3, 4], [4, 3, 2, 1]) == pytest.approx(-1.0)
+    assert spearman([1, 1, 1], [1, 2, 3]) is None
@@ -0,0 +1,40 @@
+from dataclasses import replace
+
+from rocksdb.result_cache import result_cache_key, lookup_result, record_result
+from utils.config import set_config
+
+OPTIONS = "[DBOptions]\n  max_background_jobs=4\n"
+
+
+def results(ops_per_sec):
+    return {"ops_per_sec": ops_per_sec, "data_speed": 10.0, "error": None}
+
+
+def test_key_covers_the_resources_of_the_run(config):
+    full = result_cache_key(OPTIONS, [])
+    assert result_cache_key(OPTIONS, [], cpu_limit=config.cgroup_cpu_limit,
+                            memory_limit=config.cgroup_memory_limit) == full
+
+    slot = result_cache_key(OPTIONS, [], cpu_limit=config.cgroup_cpu_limit // 2,
+                            memory_limit=config.cgroup_memory_limit // 2, workers=2)
+    assert slot != full
+
+    set_config(replace(config, sine_a=1))
+    assert result_cache_key(OPTIONS, []) != full
+    set_config(replace(config, pre_load_db_path="/data/preloaded"))
+    assert result_cache_key(OPTIONS, []) != full
+
+
+def test_lookup_needs_two_agreeing_samples(config):
+    key = result_cache_key(OPTIONS, [])
+    record_result(key, results(1000.0), 50.0, 20.0)
+    assert lookup_result(key) is None
+
+    record_result(key, results(1020.0), 50.0, 20.0)
+    cached, cpu, memory = lookup_result(key)
+    assert (cached["ops_per_sec"], cached["cached_samples"], cpu, memory) == (1020.0, 2, 50.0, 20.0)
+
+    noisy = result_cache_key(OPTIONS, ["--bloom_bits=10"])
+    record_result(noisy, results(1000.0), 50.0, 20.0)
+    record_result(noisy, results(2000.0), 50.0, 20.0)
+    assert lookup_result(noisy) is None
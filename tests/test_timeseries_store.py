@@ -0,0 +1,32 @@
+import io
+
+from rocksdb.parse_db_bench_output import DBBenchOutputParser, parse_db_bench_output
+from rocksdb.side_checker import OutputReader
+from utils.timeseries_store import new_run_dir, throughput_series
+
+LINES = [f"2024/01/01-00:00:{i:02d} ... thread 0: (1000,{i}000) ops and ({1000.0 + i},{900.0 + i}) ops/second "
+         f"in (1.000000,{i}.000000) seconds\n" for i in range(1, 26)]
+LINES.append("mixgraph     :      10.000 micros/op 100000 ops/sec 25.000 seconds 2500000 operations;\n")
+
+
+def test_series_is_read_from_the_store(config, tmp_path):
+    parser = DBBenchOutputParser(run_dir=new_run_dir(str(tmp_path / "timeseries")))
+    reader = OutputReader(io.StringIO("".join(LINES)), parser, num_threads=8)
+    reader.start()
+    samples = list(reader.samples())
+    reader.stop()
+    results = parser.result()
+
+    # The side checker sees the stored samples, scaled to all threads
+    assert samples[0] == (1.0, 8008.0, 7208.0) and len(samples) == 25
+    assert "ops_per_second_graph" not in results
+    times, ops_per_sec = throughput_series(results)
+    assert list(times) == [float(i) for i in range(1, 26)]
+    assert list(ops_per_sec) == [1000.0 + i for i in range(1, 26)]
+
+
+def test_series_without_a_store(config):
+    results = parse_db_bench_output("".join(LINES))
+    assert throughput_series(results) == [[float(i) for i in range(1, 26)], [1000.0 + i for i in range(1, 26)]]
+    # Cached results of a session whose output folder is gone
+    assert throughput_series({"timeseries": "/nonexistent"}) == ([], [])
@@ -0,0 +1,45 @@
+from trace_analyzer.trace_converter import FEATURE_COLUMNS, convert_txt_to_table, load_table
+
+
+def feature_line(value):
+    return ",".join(str(value + i) for i in range(len(FEATURE_COLUMNS))) + ","
+
+
+def test_single_line_without_line_break(config, tmp_path):
+    # The trace analyzer writes the whole-trace features as one line without a line break
+    input_file = tmp_path / "ml_feature.txt"
+    input_file.write_text(feature_line(1))
+    table_path = str(tmp_path / "ml_feature.bin")
+
+    assert convert_txt_to_table(str(input_file), table_path, FEATURE_COLUMNS) == 1
+    table = load_table(table_path)
+    assert table["get_access_count"][0] == 1 and table["get_unique_keys"][0] == 2
+
+
+def test_resume_leaves_incomplete_line(config, tmp_path):
+    input_file = tmp_path / "ml_feature.txt"
+    input_file.write_text(feature_line(1) + "\n" + feature_line(2)[:10])
+    table_path = str(tmp_path / "ml_feature.bin")
+
+    assert convert_txt_to_table(str(input_file), table_path, FEATURE_COLUMNS, resume=True) == 1
+    # The rest of the line is appended by the trace analyzer and read on the next resume
+    with open(input_file, "a") as f:
+        f.write(feature_line(2)[10:] + "\n")
+    assert convert_txt_to_table(str(input_file), table_path, FEATURE_COLUMNS, resume=True) == 2
+    assert list(load_table(table_path)["get_access_count"]) == [1, 2]
+
+
+def test_resume_drops_rows_without_meta(config, tmp_path):
+    input_file = tmp_path / "ml_feature.txt"
+    input_file.write_text(feature_line(1) + "\n")
+    table_path = str(tmp_path / "ml_feature.bin")
+    assert convert_txt_to_table(str(input_file), table_path, FEATURE_COLUMNS, resume=True) == 1
+
+    # A conversion that died after writing its rows but before updating the meta file
+    with open(input_file, "a") as f:
+        f.write(feature_line(2) + "\n")
+    with open(table_path, "ab") as table:
+        table.write(bytes(load_table(table_path).dtype.itemsize))
+
+    assert convert_txt_to_table(str(input_file), table_path, FEATURE_COLUMNS, resume=True) == 2
+    assert list(load_table(table_path)["get_access_count"]) == [1, 2]
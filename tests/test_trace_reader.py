@@ -0,0 +1,96 @@
+import struct
+
+from trace_analyzer.trace_reader import TraceTailReader
+from trace_analyzer.trace_reader import TRACE_BEGIN, TRACE_WRITE, TRACE_GET, TRACE_ITERATOR_SEEK, TRACE_MULTIGET
+
+# Encoding of trace version 0.2 as written by Tracer in trace_replay/trace_replay.cc,
+# with the TracePayloadType values of trace_replay/trace_replay.h
+WRITE_BATCH_DATA, GET_CF_ID, GET_KEY, ITER_CF_ID, ITER_KEY, ITER_LOWER_BOUND, ITER_UPPER_BOUND = 1, 2, 3, 4, 5, 6, 7
+MULTIGET_SIZE, MULTIGET_CF_IDS, MULTIGET_KEYS = 8, 9, 10
+
+
+def put_varint32(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def put_slice(data):
+    return put_varint32(len(data)) + data
+
+
+def put_fixed32(value):
+    return struct.pack("<I", value)
+
+
+def payload(*fields):
+    # SetPayloadMap sets bit 1 << type, the fields are encoded in the order of their types
+    payload_map = 0
+    for payload_type, _ in fields:
+        payload_map |= 1 << payload_type
+    return struct.pack("<Q", payload_map) + b"".join(encoded for _, encoded in fields)
+
+
+def record(timestamp, trace_type, data):
+    return struct.pack("<QBI", timestamp, trace_type, len(data)) + data
+
+
+def write_batch(*puts):
+    # Sequence number and count, then kTypeValue records
+    rep = struct.pack("<QI", 1, len(puts))
+    for key, value in puts:
+        rep += b"\x01" + put_slice(key) + put_slice(value)
+    return rep
+
+
+def trace_file(path):
+    header = b"feedcafedeadbeef\tTrace Version: 0.2\tRocksDB Version: 8.8\tFormat: Timestamp OpType Payload\n"
+    records = [
+        record(0, TRACE_BEGIN, header),
+        record(10, TRACE_WRITE, payload((WRITE_BATCH_DATA, put_slice(write_batch((b"key1", b"v" * 10), (b"key2", b"v" * 20)))))),
+        record(20, TRACE_GET, payload((GET_CF_ID, put_fixed32(0)), (GET_KEY, put_slice(b"key1")))),
+        record(30, TRACE_GET, payload((GET_CF_ID, put_fixed32(0)), (GET_KEY, put_slice(b"key_three")))),
+        record(40, TRACE_ITERATOR_SEEK, payload((ITER_CF_ID, put_fixed32(0)), (ITER_KEY, put_slice(b"key2")),
+                                                (ITER_LOWER_BOUND, put_slice(b"a")), (ITER_UPPER_BOUND, put_slice(b"z")))),
+        record(50, TRACE_MULTIGET, payload((MULTIGET_SIZE, put_fixed32(3)),
+                                           (MULTIGET_CF_IDS, put_slice(put_fixed32(0) * 3)),
+                                           (MULTIGET_KEYS, put_slice(put_slice(b"k1") + put_slice(b"k2") + put_slice(b"k1"))))),
+    ]
+    with open(path, "wb") as f:
+        f.write(b"".join(records))
+    return records
+
+
+def test_decodes_every_record_type(tmp_path):
+    path = tmp_path / "tracefile"
+    trace_file(path)
+    reader = TraceTailReader(str(path), sample_ratio=1)
+    reader.update()
+
+    table, first_window = reader.feature_table()
+    assert first_window == 0 and len(table) == 1
+    row = table[0]
+    assert (row["put_access_count"], row["put_unique_keys"], row["put_value_size_average"]) == (2, 2, 15.0)
+    assert (row["get_access_count"], row["get_unique_keys"], row["get_key_size_average"]) == (2, 2, 6.5)
+    assert (row["iterator_seek_access_count"], row["iterator_seek_key_size_average"]) == (1, 4.0)
+    assert (row["multiget_access_count"], row["multiget_unique_keys"]) == (3, 2)
+
+
+def test_reads_only_complete_records(tmp_path):
+    path = tmp_path / "tracefile"
+    records = trace_file(path)
+    data = b"".join(records)
+    split = len(b"".join(records[:3])) + 5
+    path.write_bytes(data[:split])
+
+    reader = TraceTailReader(str(path), sample_ratio=1)
+    reader.update()
+    assert reader.feature_table()[0][0]["get_access_count"] == 1
+
+    with open(path, "ab") as f:
+        f.write(data[split:])
+    reader.update()
+    assert reader.feature_table()[0][0]["get_access_count"] == 2
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from trace_analyzer import trace_summarizer
+
+# Access count and frequency, in the 2 column layout of the key size distributions
+ZIPF_LIKE = "".join(f"{rank} {1000 // rank ** 2}\n" for rank in range(1, 11))
+
+
+@pytest.fixture
+def summarizer(monkeypatch):
+    monkeypatch.setattr(trace_summarizer, "_fit_cache", {})
+    monkeypatch.setattr(trace_summarizer, "FIT_WORKERS", 1)
+    return trace_summarizer
+
+
+def write_distribution(tmp_path, name, content):
+    data_file = tmp_path / name
+    # The first character is taken by the empty file check of read_data
+    data_file.write_text("#" + content)
+    return str(data_file)
+
+
+def test_normalizations_are_computed_once(summarizer, tmp_path, monkeypatch):
+    data_files = [write_distribution(tmp_path, f"{i}_accessed_key_size_distribution.txt",
+                                     ZIPF_LIKE + f"{11 + i} 1\n") for i in range(2)]
+    lengths = []
+    compute = summarizer.zipf_normalizations
+    monkeypatch.setattr(summarizer, "zipf_normalizations", lambda n: lengths.append(list(n)) or compute(lengths[-1]))
+
+    fits = summarizer.fit_distributions(data_files)
+
+    # Both files are 11 points long, their constants are computed once in the parent
+    assert lengths == [[11, 11]]
+    assert all(not fit.startswith(summarizer.FIT_ERROR_PREFIX) for fit in fits.values())
+    assert fits[data_files[0]] == summarizer.fit_distribution(data_files[0])[0]
+    normalizations = compute([11])
+    assert normalizations[(11, 2.0)] == pytest.approx(np.sum(1 / np.arange(1, 12) ** 2) / (np.pi ** 2 / 6))
+
+
+def test_errors_are_not_cached(summarizer, tmp_path, monkeypatch):
+    data_file = write_distribution(tmp_path, "accessed_key_size_distribution.txt", ZIPF_LIKE)
+    fit_distribution = summarizer.fit_distribution
+    calls = []
+
+    def flaky_fit(data_file, normalizations=None):
+        calls.append(data_file)
+        if len(calls) == 1:
+            raise RuntimeError("Optimal parameters not found")
+        return fit_distribution(data_file, normalizations)
+
+    monkeypatch.setattr(summarizer, "fit_distribution", flaky_fit)
+
+    assert summarizer.fit_distributions([data_file])[data_file] == "Error: Optimal parameters not found"
+    assert summarizer._fit_cache == {}
+    # The file is fit again, and the successful fit is cached
+    best_fit = summarizer.fit_distributions([data_file])[data_file]
+    assert not best_fit.startswith(summarizer.FIT_ERROR_PREFIX)
+    assert summarizer.fit_distributions([data_file])[data_file] == best_fit
+    assert len(calls) == 2
@@ -1,14 +1,18 @@
 import os
+import time
 import subprocess
 from utils.utils import log_update
-from utils.constants import TRACE_ANALYZER_PATH, OUTPUT_PATH
-from trace_analyzer.trace_converter import convert_txt_to_csv, convert_txt_to_csv_windows
-from trace_analyzer.trace_summarizer import generate_summary, generate_summary_windows, generate_summary_row
+from utils import constants
+from trace_analyzer.trace_converter import FEATURE_COLUMNS, WINDOW_FEATURE_COLUMNS, convert_txt_to_table
+from trace_analyzer.trace_summarizer import generate_summary, generate_summary_windows, generate_window_summaries
+from trace_analyzer.trace_reader import TraceTailReader
 import base64
 from gpt.gpt_request import send_gpt_request
 import re
 import json
-import pandas as pd
+
+# Incremental readers of the tracefiles analyzed during dynamic option tuning
+trace_readers = {}
 
 
 def analyze_tracefile(tracefile_path):
@@ -22,22 +26,22 @@ def analyze_tracefile(tracefile_path):
     - A workload summary from tracefile.
     '''
 
-    # Convert ml_feature.txt or ml_feature_windows.txt to ml_feature.csv
-    output_csv = f"{OUTPUT_PATH}/trace_data/ml_feature.csv"
-    output_csv_windows = f"{OUTPUT_PATH}/trace_data/ml_feature_windows.csv"
+    # Convert ml_feature.txt or ml_feature_windows.txt to a binary feature table
+    output_table = f"{constants.OUTPUT_PATH}/trace_data/ml_feature.table"
+    output_table_windows = f"{constants.OUTPUT_PATH}/trace_data/ml_feature_windows.table"
 
-    input_txt = f"{OUTPUT_PATH}/trace_data/ml_feature.txt"
-    input_txt_windows = f"{OUTPUT_PATH}/trace_data/ml_feature_windows.txt"
+    input_txt = f"{constants.OUTPUT_PATH}/trace_data/ml_feature.txt"
+    input_txt_windows = f"{constants.OUTPUT_PATH}/trace_data/ml_feature_windows.txt"
 
-    # If ml_feature.csv doesn't exist, run trace analyzer
-    if ((not (os.path.exists(output_csv) and (os.path.getsize(output_csv) != 0))) or 
-        not (os.path.exists(output_csv_windows) and (os.path.getsize(output_csv_windows) != 0))):
+    # If the feature table doesn't exist, run trace analyzer
+    if ((not (os.path.exists(output_table) and (os.path.getsize(output_table) != 0))) or 
+        not (os.path.exists(output_table_windows) and (os.path.getsize(output_table_windows) != 0))):
         
         # Create trace data folder
-        os.makedirs(f"{OUTPUT_PATH}/trace_data", exist_ok=True)
+        os.makedirs(f"{constants.OUTPUT_PATH}/trace_data", exist_ok=True)
 
         command = [
-            TRACE_ANALYZER_PATH,
+            constants.TRACE_ANALYZER_PATH,
             "-analyze_get",
             "-analyze_put",
             "-analyze_delete",
@@ -46,8 +50,8 @@ def analyze_tracefile(tracefile_path):
             "-analyze_multiget",
             "-analyze_range_delete",
             "-analyze_single_delete",
-            f"-key_space_dir={OUTPUT_PATH}/trace_data",
-            f"-output_dir={OUTPUT_PATH}/trace_data",
+            f"-key_space_dir={constants.OUTPUT_PATH}/trace_data",
+            f"-output_dir={constants.OUTPUT_PATH}/trace_data",
             # "-convert_to_human_readable_trace",
             "-output_ml_features_windows",
             "-output_ml_features_windows_size=10",
@@ -82,105 +86,63 @@ def analyze_tracefile(tracefile_path):
             exit(1)
 
         # Write output log to the qlt.txt
-        with open(f"{OUTPUT_PATH}/trace_data/qlt.txt", "w") as of:
+        with open(f"{constants.OUTPUT_PATH}/trace_data/qlt.txt", "w") as of:
             of.write(proc_out.stdout.decode())
 
         if os.path.exists(input_txt_windows):
-            convert_txt_to_csv_windows(input_txt_windows, output_csv_windows)
+            convert_txt_to_table(input_txt_windows, output_table_windows, WINDOW_FEATURE_COLUMNS)
         elif os.path.exists(input_txt):
-            convert_txt_to_csv(input_txt, output_csv)
+            convert_txt_to_table(input_txt, output_table, FEATURE_COLUMNS)
         else:
             raise FileNotFoundError("Neither 'ml_feature_windows.txt' nor 'ml_feature.txt' was found.")
 
     if os.path.exists(input_txt_windows):
-        trace_result = generate_summary_windows(f"{OUTPUT_PATH}/trace_data/ml_feature_windows.csv")
+        trace_result = generate_summary_windows(output_table_windows)
     else:
         # Create summary trace text
-        trace_result = generate_summary(f"{OUTPUT_PATH}/trace_data/ml_feature.csv")
+        trace_result = generate_summary(output_table)
 
     return trace_result
 
-def analyze_last_n_tracefile_windows(tracefile_path, n=2):
-    # Create trace data folder
-    os.makedirs(f"{OUTPUT_PATH}/trace_data_dyn", exist_ok=True)
-
-    command = [
-        TRACE_ANALYZER_PATH,
-        "-analyze_get",
-        "-analyze_put",
-        "-analyze_delete",
-        "-analyze_iterator",
-        "-analyze_merge",
-        "-analyze_multiget",
-        "-analyze_range_delete",
-        "-analyze_single_delete",
-        f"-key_space_dir={OUTPUT_PATH}/trace_data_dyn",
-        f"-output_dir={OUTPUT_PATH}/trace_data_dyn",
-        # "-convert_to_human_readable_trace",
-        "-output_ml_features_windows",
-        "-output_ml_features_windows_size=10",
-        # "-output_key_distribution",
-        # "-output_access_count_stats",
-        # "-output_key_stats",
-        # "-output_qps_stats",
-        # "-output_value_distribution",
-        # "-print_overall_stats",
-        # "-print_top_k_access=5",
-        "-sample_ratio=0.01",
-        # "-output_ml_features",
-        f"-trace_path={tracefile_path}"
-    ]
-
-    log_update(f"[TAL] Run trace_analyzer for last {n} lines of tracefile")
-    print(f"[TAL] Run trace_analyzer for last {n} lines of tracefile")
+def get_trace_reader(tracefile_path):
+    '''
+    Function to get the incremental reader of a tracefile, kept across calls so every
+    call only reads the records written since the previous one
 
-    proc_out = subprocess.run(
-        command,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        check=False
-    )
+    Parameters:
+    - tracefile_path (str): The path of tracefile
 
-    log_update(f"[TAL] Finish analyze last {n} lines of tracefile")
-    print(f"[TAL] Finish analyze last {n} lines of tracefile")
+    Returns:
+    - reader (TraceTailReader): The reader
+    '''
+    if tracefile_path not in trace_readers:
+        trace_readers[tracefile_path] = TraceTailReader(tracefile_path)
+    return trace_readers[tracefile_path]
 
-    if proc_out.returncode != 0:
-        log_update(f"[TAL] Trace Analyzer error occurred. Output:\n{proc_out.stdout.decode()}")
-        print(f"[TAL] Trace Analyzer error occurred. Output:\n{proc_out.stdout.decode()}")
-        exit(1)
+def analyze_last_n_tracefile_windows(tracefile_path, n=2):
+    '''
+    Function to summarize the last windows of a tracefile that is still being written.
 
-    # Write output log to the qlt.txt
-    with open(f"{OUTPUT_PATH}/trace_data_dyn/qlt.txt", "w") as of:
-        of.write(proc_out.stdout.decode())
-    
-    # Convert ml_feature.txt or ml_feature_windows.txt to ml_feature.csv
-    output_csv = f"{OUTPUT_PATH}/trace_data_dyn/ml_feature.csv"
-    output_csv_windows = f"{OUTPUT_PATH}/trace_data_dyn/ml_feature_windows.csv"
+    Parameters:
+    - tracefile_path (str): The path of tracefile
+    - n (int): The number of windows (10 seconds each) to summarize
 
-    input_txt = f"{OUTPUT_PATH}/trace_data_dyn/ml_feature.txt"
-    input_txt_windows = f"{OUTPUT_PATH}/trace_data_dyn/ml_feature_windows.txt"
+    Returns:
+    - A workload summary of the last n windows.
+    '''
+    reader = get_trace_reader(tracefile_path)
 
-    if os.path.exists(input_txt_windows):
-        convert_txt_to_csv_windows(input_txt_windows, output_csv_windows)
-    elif os.path.exists(input_txt):
-        convert_txt_to_csv(input_txt, output_csv)
-    else:
-        raise FileNotFoundError("Neither 'ml_feature_windows.txt' nor 'ml_feature.txt' was found.")
+    start_time = time.time()
+    new_bytes = reader.update()
+    log_update(f"[TAL] Read {new_bytes} new bytes of tracefile in {time.time() - start_time:.2f} seconds")
+    print(f"[TAL] Read {new_bytes} new bytes of tracefile in {time.time() - start_time:.2f} seconds")
 
     trace_result_summary = ["The workload information is as follows:\n"]
-    if os.path.exists(input_txt_windows):
-        trace_result_summary.append("Here is the converted summary of the last 2 windows (10 seconds each) of the trace:\n")
-        data = pd.read_csv(f"{OUTPUT_PATH}/trace_data_dyn/ml_feature_windows.csv")
-        column_names = data.columns.tolist()
-
-        count = 0
-        for index, row in data.iterrows():
-            count += 1
-            if count <= len(data) - n:
-                continue
-
-            row_summary = generate_summary_row(row, column_names)
-            trace_result_summary.append(f"Time window {count}:{row_summary}\n")
+    data, first_window = reader.feature_table(last_n=n)
+    if len(data) > 0:
+        trace_result_summary.append(f"Here is the converted summary of the last {len(data)} windows (10 seconds each) of the trace:\n")
+        for window, row_summary in generate_window_summaries(data, first_window=first_window):
+            trace_result_summary.append(f"Time window {window}:{row_summary}\n")
 
     trace_result = "".join(trace_result_summary)
 
@@ -285,7 +247,7 @@ def save_model_as_json(model_response):
         return None
 
     if json_data:
-        with open(f"{OUTPUT_PATH}/trace_model.json", "w") as json_file:
+        with open(f"{constants.OUTPUT_PATH}/trace_model.json", "w") as json_file:
             json.dump(json_data, json_file, indent=4)
     else: 
         print("Something really went wrong")
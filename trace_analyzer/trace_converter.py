@@ -1,117 +1,236 @@
-import csv
+import os
+import json
 
-def convert_txt_to_csv(input_file, output_file):
-    
-    """
-    Convert a TXT file to a CSV file with specified columns.
+import numpy as np
+
+from utils.utils import log_update
+
+# Columns of ml_feature.txt, written by the trace analyzer for the whole trace
+FEATURE_COLUMNS = [
+    'get_access_count', 'get_unique_keys', 'get_key_size_average', 'get_key_size_median',
+    'get_key_size_variance', 'get_value_size_average', 'get_value_size_median',
+    'get_value_size_variance', 'get_mean', 'get_mode', 'get_median', 'get_quartiles[0]',
+    'get_quartiles[2]', 'get_skewness', 'get_kurtosis', 'put_access_count', 'put_unique_keys',
+    'put_key_size_average', 'put_key_size_median', 'put_key_size_variance', 'put_value_size_average',
+    'put_value_size_median', 'put_value_size_variance', 'put_mean', 'put_mode', 'put_median',
+    'put_quartiles[0]', 'put_quartiles[2]', 'put_skewness', 'put_kurtosis', 'delete_access_count',
+    'delete_unique_keys', 'delete_key_size_average', 'delete_key_size_median', 'delete_key_size_variance',
+    'delete_value_size_average', 'delete_value_size_median', 'delete_value_size_variance', 'delete_mean',
+    'delete_mode', 'delete_median', 'delete_quartiles[0]', 'delete_quartiles[2]', 'delete_skewness',
+    'delete_kurtosis', 'singledelete_access_count', 'singledelete_unique_keys',
+    'singledelete_key_size_average', 'singledelete_key_size_median', 'singledelete_key_size_variance',
+    'singledelete_value_size_average', 'singledelete_value_size_median', 'singledelete_value_size_variance',
+    'singledelete_mean', 'singledelete_mode', 'singledelete_median', 'singledelete_quartiles[0]',
+    'singledelete_quartiles[2]', 'singledelete_skewness', 'singledelete_kurtosis',
+    'rangedelete_access_count', 'rangedelete_unique_keys', 'rangedelete_key_size_average',
+    'rangedelete_key_size_median', 'rangedelete_key_size_variance', 'rangedelete_value_size_average',
+    'rangedelete_value_size_median', 'rangedelete_value_size_variance', 'rangedelete_mean',
+    'rangedelete_mode', 'rangedelete_median', 'rangedelete_quartiles[0]', 'rangedelete_quartiles[2]',
+    'rangedelete_skewness', 'rangedelete_kurtosis', 'merge_access_count', 'merge_unique_keys',
+    'merge_key_size_average', 'merge_key_size_median', 'merge_key_size_variance', 'merge_value_size_average',
+    'merge_value_size_median', 'merge_value_size_variance', 'merge_mean', 'merge_mode', 'merge_median',
+    'merge_quartiles[0]', 'merge_quartiles[2]', 'merge_skewness', 'merge_kurtosis',
+    'iterator_seek_access_count', 'iterator_seek_unique_keys', 'iterator_seek_key_size_average',
+    'iterator_seek_key_size_median', 'iterator_seek_key_size_variance', 'iterator_seek_value_size_average',
+    'iterator_seek_value_size_median', 'iterator_seek_value_size_variance', 'iterator_seek_mean',
+    'iterator_seek_mode', 'iterator_seek_median', 'iterator_seek_quartiles[0]', 'iterator_seek_quartiles[2]',
+    'iterator_seek_skewness', 'iterator_seek_kurtosis', 'iterator_seekForPrev_access_count',
+    'iterator_seekForPrev_unique_keys', 'iterator_seekForPrev_key_size_average',
+    'iterator_seekForPrev_key_size_median', 'iterator_seekForPrev_key_size_variance',
+    'iterator_seekForPrev_value_size_average', 'iterator_seekForPrev_value_size_median',
+    'iterator_seekForPrev_value_size_variance', 'iterator_seekForPrev_mean', 'iterator_seekForPrev_mode',
+    'iterator_seekForPrev_median', 'iterator_seekForPrev_quartiles[0]', 'iterator_seekForPrev_quartiles[2]',
+    'iterator_seekForPrev_skewness', 'iterator_seekForPrev_kurtosis', 'multiget_access_count',
+    'multiget_unique_keys', 'multiget_key_size_average', 'multiget_key_size_median',
+    'multiget_key_size_variance', 'multiget_value_size_average', 'multiget_value_size_median',
+    'multiget_value_size_variance', 'multiget_mean', 'multiget_mode', 'multiget_median',
+    'multiget_quartiles[0]', 'multiget_quartiles[2]', 'multiget_skewness', 'multiget_kurtosis'
+]
+
+# Columns of ml_feature_windows.txt, one row per 10 second window
+WINDOW_FEATURE_COLUMNS = [
+    'get_access_count', 'get_unique_keys', 'get_key_size_average', 'get_key_size_median', 'get_key_size_variance',
+    'get_value_size_average', 'get_value_size_median', 'get_value_size_variance', 'get_mean', 'get_mode', 'get_median',
+    'put_access_count', 'put_unique_keys', 'put_key_size_average', 'put_key_size_median', 'put_key_size_variance',
+    'put_value_size_average', 'put_value_size_median', 'put_value_size_variance', 'put_mean', 'put_mode', 'put_median', 
+    'delete_access_count', 'delete_unique_keys', 'delete_key_size_average', 'delete_key_size_median', 'delete_key_size_variance',
+    'delete_value_size_average', 'delete_value_size_median', 'delete_value_size_variance', 'delete_mean', 'delete_mode', 'delete_median',
+    'singledelete_access_count', 'singledelete_unique_keys', 'singledelete_key_size_average', 'singledelete_key_size_median', 
+    'singledelete_key_size_variance', 'singledelete_value_size_average', 'singledelete_value_size_median', 'singledelete_value_size_variance',
+    'singledelete_mean', 'singledelete_mode', 'singledelete_median', 
+    'rangedelete_access_count', 'rangedelete_unique_keys', 'rangedelete_key_size_average', 'rangedelete_key_size_median', 
+    'rangedelete_key_size_variance', 'rangedelete_value_size_average', 'rangedelete_value_size_median', 'rangedelete_value_size_variance',
+    'rangedelete_mean', 'rangedelete_mode', 'rangedelete_median', 'merge_access_count', 'merge_unique_keys', 'merge_key_size_average',
+    'merge_key_size_median', 'merge_key_size_variance', 'merge_value_size_average', 'merge_value_size_median', 'merge_value_size_variance',
+    'merge_mean', 'merge_mode', 'merge_median', 
+    'iterator_seek_access_count', 'iterator_seek_unique_keys', 'iterator_seek_key_size_average', 'iterator_seek_key_size_median',
+    'iterator_seek_key_size_variance', 'iterator_seek_value_size_average', 'iterator_seek_value_size_median', 'iterator_seek_value_size_variance',
+    'iterator_seek_mean', 'iterator_seek_mode', 'iterator_seek_median', 'iterator_seekForPrev_access_count', 'iterator_seekForPrev_unique_keys',
+    'iterator_seekForPrev_key_size_average', 'iterator_seekForPrev_key_size_median', 'iterator_seekForPrev_key_size_variance', 
+    'iterator_seekForPrev_value_size_average', 'iterator_seekForPrev_value_size_median', 'iterator_seekForPrev_value_size_variance',
+    'iterator_seekForPrev_mean', 'iterator_seekForPrev_mode', 'iterator_seekForPrev_median', 
+    'multiget_access_count', 'multiget_unique_keys', 'multiget_key_size_average', 'multiget_key_size_median', 'multiget_key_size_variance',
+    'multiget_value_size_average', 'multiget_value_size_median', 'multiget_value_size_variance', 'multiget_mean', 'multiget_mode', 'multiget_median'
+]
+
+# Columns holding counts, every other feature column is a float statistic
+INTEGER_FEATURES = ("_access_count", "_unique_keys")
+
+# The text is read in chunks of this size, only one chunk and its parsed rows are in memory
+CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def feature_table_dtype(columns):
+    return np.dtype([(name, np.int64 if name.endswith(INTEGER_FEATURES) else np.float64) for name in columns])
+
+
+def parse_feature_lines(lines, columns):
+    '''
+    Function to parse complete ml_feature lines into records
 
     Parameters:
-    input_file (str): The path to the input TXT file.
-    output_file (str): The path to the output CSV file.
-    columns (list): The list of column names for the CSV file.
-    """
-
-    # Column names as specified
-    columns = [
-        'get_access_count', 'get_unique_keys', 'get_key_size_average', 'get_key_size_median',
-        'get_key_size_variance', 'get_value_size_average', 'get_value_size_median',
-        'get_value_size_variance', 'get_mean', 'get_mode', 'get_median', 'get_quartiles[0]',
-        'get_quartiles[2]', 'get_skewness', 'get_kurtosis', 'put_access_count', 'put_unique_keys',
-        'put_key_size_average', 'put_key_size_median', 'put_key_size_variance', 'put_value_size_average',
-        'put_value_size_median', 'put_value_size_variance', 'put_mean', 'put_mode', 'put_median',
-        'put_quartiles[0]', 'put_quartiles[2]', 'put_skewness', 'put_kurtosis', 'delete_access_count',
-        'delete_unique_keys', 'delete_key_size_average', 'delete_key_size_median', 'delete_key_size_variance',
-        'delete_value_size_average', 'delete_value_size_median', 'delete_value_size_variance', 'delete_mean',
-        'delete_mode', 'delete_median', 'delete_quartiles[0]', 'delete_quartiles[2]', 'delete_skewness',
-        'delete_kurtosis', 'singledelete_access_count', 'singledelete_unique_keys',
-        'singledelete_key_size_average', 'singledelete_key_size_median', 'singledelete_key_size_variance',
-        'singledelete_value_size_average', 'singledelete_value_size_median', 'singledelete_value_size_variance',
-        'singledelete_mean', 'singledelete_mode', 'singledelete_median', 'singledelete_quartiles[0]',
-        'singledelete_quartiles[2]', 'singledelete_skewness', 'singledelete_kurtosis',
-        'rangedelete_access_count', 'rangedelete_unique_keys', 'rangedelete_key_size_average',
-        'rangedelete_key_size_median', 'rangedelete_key_size_variance', 'rangedelete_value_size_average',
-        'rangedelete_value_size_median', 'rangedelete_value_size_variance', 'rangedelete_mean',
-        'rangedelete_mode', 'rangedelete_median', 'rangedelete_quartiles[0]', 'rangedelete_quartiles[2]',
-        'rangedelete_skewness', 'rangedelete_kurtosis', 'merge_access_count', 'merge_unique_keys',
-        'merge_key_size_average', 'merge_key_size_median', 'merge_key_size_variance', 'merge_value_size_average',
-        'merge_value_size_median', 'merge_value_size_variance', 'merge_mean', 'merge_mode', 'merge_median',
-        'merge_quartiles[0]', 'merge_quartiles[2]', 'merge_skewness', 'merge_kurtosis',
-        'iterator_seek_access_count', 'iterator_seek_unique_keys', 'iterator_seek_key_size_average',
-        'iterator_seek_key_size_median', 'iterator_seek_key_size_variance', 'iterator_seek_value_size_average',
-        'iterator_seek_value_size_median', 'iterator_seek_value_size_variance', 'iterator_seek_mean',
-        'iterator_seek_mode', 'iterator_seek_median', 'iterator_seek_quartiles[0]', 'iterator_seek_quartiles[2]',
-        'iterator_seek_skewness', 'iterator_seek_kurtosis', 'iterator_seekForPrev_access_count',
-        'iterator_seekForPrev_unique_keys', 'iterator_seekForPrev_key_size_average',
-        'iterator_seekForPrev_key_size_median', 'iterator_seekForPrev_key_size_variance',
-        'iterator_seekForPrev_value_size_average', 'iterator_seekForPrev_value_size_median',
-        'iterator_seekForPrev_value_size_variance', 'iterator_seekForPrev_mean', 'iterator_seekForPrev_mode',
-        'iterator_seekForPrev_median', 'iterator_seekForPrev_quartiles[0]', 'iterator_seekForPrev_quartiles[2]',
-        'iterator_seekForPrev_skewness', 'iterator_seekForPrev_kurtosis', 'multiget_access_count',
-        'multiget_unique_keys', 'multiget_key_size_average', 'multiget_key_size_median',
-        'multiget_key_size_variance', 'multiget_value_size_average', 'multiget_value_size_median',
-        'multiget_value_size_variance', 'multiget_mean', 'multiget_mode', 'multiget_median',
-        'multiget_quartiles[0]', 'multiget_quartiles[2]', 'multiget_skewness', 'multiget_kurtosis'
-    ]
-
-    # Read the data from the input file
-    with open(input_file, 'r') as file:
-        lines = file.readlines()
-
-    # Write the data to a CSV file
-    with open(output_file, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(columns)  # Write the header
-
-        for line in lines:
-            values = line.strip().split(',')
-            writer.writerow(values)
-
-def convert_txt_to_csv_windows(input_file, output_file):
-    
-    """
-    Convert a TXT file to a CSV file with specified columns.
+    - lines (list): The lines, without line breaks
+    - columns (list): The column names of the schema
+
+    Returns:
+    - records (np.ndarray): The records of the lines that have exactly one value per column
+    - skipped (int): The number of lines with another number of values
+    '''
+    rows = []
+    skipped = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        # The trace analyzer ends every line with a comma
+        values = line.rstrip(",").split(",")
+        if len(values) != len(columns):
+            skipped += 1
+            continue
+        rows.append(values)
+
+    dtype = feature_table_dtype(columns)
+    records = np.empty(len(rows), dtype=dtype)
+    if rows:
+        values = np.array([[value or "nan" for value in row] for row in rows], dtype=np.float64)
+        for index, name in enumerate(columns):
+            column = values[:, index]
+            # Missing counts are 0, missing statistics stay NaN
+            if dtype[name] == np.int64:
+                column = np.nan_to_num(column, nan=0.0)
+            records[name] = column
+    return records, skipped
+
+
+def read_feature_chunks(input_file, columns, offset=0, chunk_bytes=CHUNK_BYTES, complete=True):
+    '''
+    Function to read an ml_feature text file in chunks. A trailing line without a line break
+    is converted when the file is complete, e.g. the single line of a whole-trace ml_feature.txt.
+    Otherwise the trace analyzer may still be writing it, so it is left for the next read.
 
     Parameters:
-    input_file (str): The path to the input TXT file.
-    output_file (str): The path to the output CSV file.
-    columns (list): The list of column names for the CSV file.
-    """
-
-    # Column names as specified
-    columns = [
-        'get_access_count', 'get_unique_keys', 'get_key_size_average', 'get_key_size_median', 'get_key_size_variance',
-        'get_value_size_average', 'get_value_size_median', 'get_value_size_variance', 'get_mean', 'get_mode', 'get_median',
-        'put_access_count', 'put_unique_keys', 'put_key_size_average', 'put_key_size_median', 'put_key_size_variance',
-        'put_value_size_average', 'put_value_size_median', 'put_value_size_variance', 'put_mean', 'put_mode', 'put_median', 
-        'delete_access_count', 'delete_unique_keys', 'delete_key_size_average', 'delete_key_size_median', 'delete_key_size_variance',
-        'delete_value_size_average', 'delete_value_size_median', 'delete_value_size_variance', 'delete_mean', 'delete_mode', 'delete_median',
-        'singledelete_access_count', 'singledelete_unique_keys', 'singledelete_key_size_average', 'singledelete_key_size_median', 
-        'singledelete_key_size_variance', 'singledelete_value_size_average', 'singledelete_value_size_median', 'singledelete_value_size_variance',
-        'singledelete_mean', 'singledelete_mode', 'singledelete_median', 
-        'rangedelete_access_count', 'rangedelete_unique_keys', 'rangedelete_key_size_average', 'rangedelete_key_size_median', 
-        'rangedelete_key_size_variance', 'rangedelete_value_size_average', 'rangedelete_value_size_median', 'rangedelete_value_size_variance',
-        'rangedelete_mean', 'rangedelete_mode', 'rangedelete_median', 'merge_access_count', 'merge_unique_keys', 'merge_key_size_average',
-        'merge_key_size_median', 'merge_key_size_variance', 'merge_value_size_average', 'merge_value_size_median', 'merge_value_size_variance',
-        'merge_mean', 'merge_mode', 'merge_median', 
-        'iterator_seek_access_count', 'iterator_seek_unique_keys', 'iterator_seek_key_size_average', 'iterator_seek_key_size_median',
-        'iterator_seek_key_size_variance', 'iterator_seek_value_size_average', 'iterator_seek_value_size_median', 'iterator_seek_value_size_variance',
-        'iterator_seek_mean', 'iterator_seek_mode', 'iterator_seek_median', 'iterator_seekForPrev_access_count', 'iterator_seekForPrev_unique_keys',
-        'iterator_seekForPrev_key_size_average', 'iterator_seekForPrev_key_size_median', 'iterator_seekForPrev_key_size_variance', 
-        'iterator_seekForPrev_value_size_average', 'iterator_seekForPrev_value_size_median', 'iterator_seekForPrev_value_size_variance',
-        'iterator_seekForPrev_mean', 'iterator_seekForPrev_mode', 'iterator_seekForPrev_median', 
-        'multiget_access_count', 'multiget_unique_keys', 'multiget_key_size_average', 'multiget_key_size_median', 'multiget_key_size_variance',
-        'multiget_value_size_average', 'multiget_value_size_median', 'multiget_value_size_variance', 'multiget_mean', 'multiget_mode', 'multiget_median'
-    ]
-
-    # Read the data from the input file
-    with open(input_file, 'r') as file:
-        lines = file.readlines()
-
-    # Write the data to a CSV file
-    with open(output_file, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(columns)  # Write the header
-
-        for line in lines:
-            values = line.strip().split(',')
-            writer.writerow(values)
\ No newline at end of file
+    - input_file (str): The path of ml_feature.txt or ml_feature_windows.txt
+    - columns (list): The column names of the schema
+    - offset (int): The byte offset to start at, a line boundary
+    - chunk_bytes (int): The number of bytes read at once
+    - complete (bool): Whether the trace analyzer has finished writing the file
+
+    Yields:
+    - records (np.ndarray): The records of the complete lines of a chunk
+    - consumed (int): The byte offset after the last complete line
+    - skipped (int): The number of lines of the chunk that do not match the schema
+    '''
+    consumed = offset
+    carry = b""
+    with open(input_file, "rb") as f:
+        f.seek(offset)
+        while True:
+            chunk = f.read(chunk_bytes)
+            if not chunk:
+                break
+            data = carry + chunk
+            end = data.rfind(b"\n") + 1
+            carry = data[end:]
+            if end == 0:
+                continue
+            consumed += end
+            records, skipped = parse_feature_lines(data[:end].decode().split("\n"), columns)
+            yield records, consumed, skipped
+
+    if carry and complete:
+        records, skipped = parse_feature_lines([carry.decode()], columns)
+        yield records, consumed + len(carry), skipped
+    elif carry:
+        log_update(f"[TCV] Left {len(carry)} bytes of an incomplete line at the end of {input_file}")
+
+
+def convert_txt_to_table(input_file, table_path, columns, resume=False):
+    '''
+    Function to convert an ml_feature text file into a binary feature table: the records
+    as raw bytes at table_path, and table_path.json with the columns, the number of rows
+    and the bytes of the text that were converted. With resume, only the text appended
+    since the last conversion is read, e.g. while the trace analyzer is still writing.
+
+    Parameters:
+    - input_file (str): The path of ml_feature.txt or ml_feature_windows.txt
+    - table_path (str): The path of the table
+    - columns (list): The column names, FEATURE_COLUMNS or WINDOW_FEATURE_COLUMNS
+    - resume (bool): Whether to append to an existing table of the same file
+
+    Returns:
+    - rows (int): The number of rows of the table
+    '''
+    meta = read_table_meta(table_path) if resume else None
+    if meta is None or meta["columns"] != list(columns) or meta["consumed_bytes"] > os.path.getsize(input_file):
+        meta = {"columns": list(columns), "rows": 0, "consumed_bytes": 0, "skipped_lines": 0}
+        open(table_path, "wb").close()
+
+    with open(table_path, "ab") as table:
+        # Rows written by a conversion that died before updating the meta file are dropped,
+        # their lines are read again from consumed_bytes
+        table.truncate(meta["rows"] * feature_table_dtype(columns).itemsize)
+        for records, consumed, skipped in read_feature_chunks(input_file, columns, meta["consumed_bytes"], complete=not resume):
+            table.write(records.tobytes())
+            table.flush()
+            meta["rows"] += len(records)
+            meta["consumed_bytes"] = consumed
+            meta["skipped_lines"] += skipped
+            # The records are written before the row count, so readers never see a partial row
+            write_table_meta(table_path, meta)
+    write_table_meta(table_path, meta)
+
+    if meta["skipped_lines"]:
+        log_update(f"[TCV] Skipped {meta['skipped_lines']} lines of {input_file} without {len(columns)} values")
+    return meta["rows"]
+
+
+def read_table_meta(table_path):
+    if not os.path.exists(f"{table_path}.json"):
+        return None
+    with open(f"{table_path}.json") as f:
+        return json.load(f)
+
+
+def write_table_meta(table_path, meta):
+    with open(f"{table_path}.json.tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(f"{table_path}.json.tmp", f"{table_path}.json")
+
+
+def load_table(table_path):
+    '''
+    Function to map a feature table written by convert_txt_to_table
+
+    Parameters:
+    - table_path (str): The path of the table
+
+    Returns:
+    - table (np.ndarray): Read-only structured array with one record per row
+    '''
+    meta = read_table_meta(table_path)
+    if meta is None:
+        raise FileNotFoundError(f"No feature table at {table_path}")
+    dtype = feature_table_dtype(meta["columns"])
+    if meta["rows"] == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(table_path, dtype=dtype, mode="r", shape=(meta["rows"],))
@@ -0,0 +1,410 @@
+import os
+import struct
+from collections import deque
+
+import numpy as np
+from trace_analyzer.trace_summarizer import operations
+
+# Trace record framing, see trace_replay/trace_replay.h
+# fixed64 timestamp in microseconds, 1 byte trace type, fixed32 payload length
+FRAME_HEADER = struct.Struct("<QBI")
+FIXED32 = struct.Struct("<I")
+FIXED64 = struct.Struct("<Q")
+
+# TraceType from include/rocksdb/trace_record.h
+TRACE_BEGIN = 1
+TRACE_END = 2
+TRACE_WRITE = 3
+TRACE_GET = 4
+TRACE_ITERATOR_SEEK = 5
+TRACE_ITERATOR_SEEK_FOR_PREV = 6
+TRACE_MULTIGET = 13
+
+# TracePayloadType from trace_replay/trace_replay.h. The values are shared by all record
+# types, a field is bit 1 << value of the payload map and the fields follow the map in
+# the order of their values.
+PAYLOAD_WRITE_BATCH_DATA = 1
+PAYLOAD_GET_CF_ID = 2
+PAYLOAD_GET_KEY = 3
+PAYLOAD_ITER_CF_ID = 4
+PAYLOAD_ITER_KEY = 5
+PAYLOAD_ITER_LOWER_BOUND = 6
+PAYLOAD_ITER_UPPER_BOUND = 7
+PAYLOAD_MULTIGET_SIZE = 8
+PAYLOAD_MULTIGET_CF_IDS = 9
+PAYLOAD_MULTIGET_KEYS = 10
+
+# Fields written with PutFixed32, all other fields are length prefixed slices
+FIXED32_PAYLOADS = {PAYLOAD_GET_CF_ID, PAYLOAD_ITER_CF_ID, PAYLOAD_MULTIGET_SIZE}
+
+# Read trace type -> (operation, payload field of its key)
+READ_TRACE_TYPES = {
+    TRACE_GET: ("get", PAYLOAD_GET_KEY),
+    TRACE_ITERATOR_SEEK: ("iterator_seek", PAYLOAD_ITER_KEY),
+    TRACE_ITERATOR_SEEK_FOR_PREV: ("iterator_seekForPrev", PAYLOAD_ITER_KEY),
+}
+
+# WriteBatch record tags from db/dbformat.h -> (operation, has column family, has value)
+WRITE_BATCH_TAGS = {
+    0x0: ("delete", False, False),
+    0x1: ("put", False, True),
+    0x2: ("merge", False, True),
+    0x4: ("delete", True, False),
+    0x5: ("put", True, True),
+    0x6: ("merge", True, True),
+    0x7: ("singledelete", False, False),
+    0x8: ("singledelete", True, False),
+    0xE: ("rangedelete", True, True),
+    0xF: ("rangedelete", False, True),
+    0x10: ("put", True, True),
+    0x11: ("put", False, True),
+    0x16: ("put", False, True),
+    0x17: ("put", True, True),
+}
+WRITE_BATCH_LOG_DATA = 0x3
+WRITE_BATCH_NOOP = 0xD
+WRITE_BATCH_HEADER_SIZE = 12
+
+WINDOW_SECONDS = 10
+MAX_WINDOWS = 64
+# Same sampling as the -sample_ratio the trace_analyzer was run with
+TRACE_SAMPLE_RATIO = 0.01
+READ_CHUNK_BYTES = 64 * 1024 * 1024
+
+FEATURES = [
+    ("access_count", np.int64),
+    ("unique_keys", np.int64),
+    ("key_size_average", np.float64),
+    ("key_size_variance", np.float64),
+    ("value_size_average", np.float64),
+    ("value_size_variance", np.float64),
+    ("mean", np.float64),
+]
+
+
+def decode_varint32(buffer, position):
+    '''
+    Function to decode a varint32 as written by PutVarint32
+
+    Parameters:
+    - buffer (memoryview): The buffer
+    - position (int): The position of the varint
+
+    Returns:
+    - value (int): The decoded value
+    - position (int): The position after the varint
+    '''
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def decode_slice(buffer, position):
+    '''
+    Function to decode a length prefixed slice as written by PutLengthPrefixedSlice
+
+    Returns:
+    - slice (memoryview): The slice
+    - position (int): The position after the slice
+    '''
+    length, position = decode_varint32(buffer, position)
+    return buffer[position:position + length], position + length
+
+
+class WindowFeatures:
+    '''
+    Running per-operation features of one trace window
+    '''
+
+    def __init__(self, index):
+        self.index = index
+        self.access_count = dict.fromkeys(operations, 0)
+        self.keys = {op: set() for op in operations}
+        self.key_sizes = {op: [0, 0, 0] for op in operations}
+        self.value_sizes = {op: [0, 0, 0] for op in operations}
+
+    def add(self, op, key, value_size=None):
+        self.access_count[op] += 1
+        self.keys[op].add(bytes(key))
+        sizes = self.key_sizes[op]
+        sizes[0] += 1
+        sizes[1] += len(key)
+        sizes[2] += len(key) ** 2
+        if value_size is not None:
+            sizes = self.value_sizes[op]
+            sizes[0] += 1
+            sizes[1] += value_size
+            sizes[2] += value_size ** 2
+
+    def row(self):
+        '''
+        Function to get the features in the column order of feature_dtype()
+
+        Returns:
+        - row (tuple): The feature values
+        '''
+        values = []
+        for op in operations:
+            unique_keys = len(self.keys[op])
+            values += [self.access_count[op], unique_keys]
+            for count, total, squares in [self.key_sizes[op], self.value_sizes[op]]:
+                if count == 0:
+                    values += [0.0, 0.0]
+                else:
+                    average = total / count
+                    values += [average, max(squares / count - average ** 2, 0.0)]
+            values.append(self.access_count[op] / unique_keys if unique_keys else 0.0)
+        return tuple(values)
+
+
+def feature_dtype():
+    return [(f"{op}_{name}", field_type) for op in operations for name, field_type in FEATURES]
+
+
+class TraceTailReader:
+    '''
+    Incremental reader of a RocksDB query trace that is still being written. Each update
+    only reads the records appended since the previous one, starting from the remembered
+    byte offset, and adds them to rolling per-window features. An incomplete record at the
+    end of the file is left for the next update.
+
+    Like the trace_analyzer, only a sample of the records is decoded. The frame headers of
+    all records are still walked, as records have variable length.
+    '''
+
+    def __init__(self, path, window_seconds=WINDOW_SECONDS, max_windows=MAX_WINDOWS, sample_ratio=TRACE_SAMPLE_RATIO):
+        '''
+        Parameters:
+        - path (str): The path of the trace file
+        - window_seconds (int): The length of a window
+        - max_windows (int): The number of most recent windows kept
+        - sample_ratio (float): The share of records decoded
+        '''
+        self.path = path
+        self.window_micros = window_seconds * 1000000
+        self.sample_every = max(1, round(1 / sample_ratio))
+        self.windows = deque(maxlen=max_windows)
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.inode = None
+        self.trace_version = None
+        self.start_micros = None
+        self.records = 0
+        self.windows.clear()
+
+    def update(self):
+        '''
+        Function to read the records appended since the last update
+
+        Returns:
+        - new_bytes (int): The number of bytes processed
+        '''
+        if not os.path.exists(self.path):
+            return 0
+
+        stat = os.stat(self.path)
+        # A new benchmark run recreates the trace file
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            self.reset()
+            self.inode = stat.st_ino
+
+        start_offset = self.offset
+        with open(self.path, "rb") as f:
+            while self.offset < stat.st_size:
+                f.seek(self.offset)
+                data = f.read(min(READ_CHUNK_BYTES, stat.st_size - self.offset))
+                consumed = self.process(memoryview(data))
+                if consumed == 0 and len(data) >= FRAME_HEADER.size:
+                    # A record larger than the chunk is read whole once it is complete
+                    record_size = FRAME_HEADER.size + FRAME_HEADER.unpack_from(data, 0)[2]
+                    if record_size <= stat.st_size - self.offset:
+                        f.seek(self.offset)
+                        consumed = self.process(memoryview(f.read(record_size)))
+                if consumed == 0:
+                    break
+                self.offset += consumed
+
+        return self.offset - start_offset
+
+    def process(self, buffer):
+        '''
+        Function to add the complete records of a buffer to the windows
+
+        Parameters:
+        - buffer (memoryview): Bytes starting at a record boundary
+
+        Returns:
+        - consumed (int): The number of bytes of complete records
+        '''
+        position = 0
+        end = len(buffer)
+        header_size = FRAME_HEADER.size
+
+        while position + header_size <= end:
+            timestamp, trace_type, length = FRAME_HEADER.unpack_from(buffer, position)
+            payload_start = position + header_size
+            if payload_start + length > end:
+                break
+            position = payload_start + length
+
+            if trace_type == TRACE_BEGIN:
+                self.read_header(bytes(buffer[payload_start:position]))
+                continue
+            if trace_type == TRACE_END:
+                continue
+
+            if self.start_micros is None:
+                self.start_micros = timestamp
+            self.records += 1
+            if self.records % self.sample_every != 0:
+                continue
+
+            window = self.window_at(timestamp)
+            if window is not None:
+                self.decode(window, trace_type, buffer[payload_start:position])
+
+        return position
+
+    def read_header(self, payload):
+        # "<magic>\tTrace Version: <major>.<minor>\tRocksDB Version: ..."
+        fields = payload.decode(errors="replace").split("\t")
+        try:
+            major, minor = fields[1].split(":")[-1].strip().split(".")[:2]
+            self.trace_version = (int(major), int(minor))
+        except (IndexError, ValueError):
+            self.trace_version = (0, 2)
+
+    def window_at(self, timestamp):
+        '''
+        Function to get the window of a timestamp, opening new windows as time moves on
+
+        Returns:
+        - window (WindowFeatures): The window, or None for records older than the kept windows
+        '''
+        index = max(timestamp - self.start_micros, 0) // self.window_micros
+        if self.windows and index <= self.windows[-1].index:
+            for window in reversed(self.windows):
+                if window.index == index:
+                    return window
+            return None
+        self.windows.append(WindowFeatures(index))
+        return self.windows[-1]
+
+    def decode(self, window, trace_type, payload):
+        '''
+        Function to add the accesses of one record to its window
+        '''
+        try:
+            if trace_type == TRACE_WRITE:
+                self.decode_write(window, payload)
+            elif trace_type in READ_TRACE_TYPES:
+                self.decode_read(window, *READ_TRACE_TYPES[trace_type], payload)
+            elif trace_type == TRACE_MULTIGET:
+                self.decode_multiget(window, payload)
+        except (IndexError, struct.error):
+            # A corrupt record only loses its own accesses
+            pass
+
+    def payload_fields(self, payload, wanted):
+        '''
+        Function to find a field of a trace version 0.2 payload, which starts with the fixed64
+        payload map followed by the fields of its set bits
+
+        Parameters:
+        - payload (memoryview): The payload of the record
+        - wanted (int): The TracePayloadType of the field
+
+        Returns:
+        - field (memoryview): The field, None if the record does not have it
+        '''
+        payload_map = FIXED64.unpack_from(payload, 0)[0]
+        position = FIXED64.size
+        for payload_type in range(payload_map.bit_length()):
+            if not payload_map >> payload_type & 1:
+                continue
+            if payload_type in FIXED32_PAYLOADS:
+                field, position = payload[position:position + FIXED32.size], position + FIXED32.size
+            else:
+                field, position = decode_slice(payload, position)
+            if payload_type == wanted:
+                return field
+        return None
+
+    def decode_read(self, window, op, key_payload_type, payload):
+        # Version 0.1: fixed32 column family, then the raw key
+        if self.trace_version is not None and self.trace_version < (0, 2):
+            window.add(op, payload[FIXED32.size:])
+            return
+
+        key = self.payload_fields(payload, key_payload_type)
+        if key is not None:
+            window.add(op, key)
+
+    def decode_multiget(self, window, payload):
+        # The keys are length prefixed slices within the keys field
+        keys = self.payload_fields(payload, PAYLOAD_MULTIGET_KEYS)
+        if keys is None:
+            return
+        key_position = 0
+        while key_position < len(keys):
+            key, key_position = decode_slice(keys, key_position)
+            window.add("multiget", key)
+
+    def decode_write(self, window, payload):
+        if self.trace_version is not None and self.trace_version < (0, 2):
+            rep = payload
+        else:
+            rep = self.payload_fields(payload, PAYLOAD_WRITE_BATCH_DATA)
+            if rep is None:
+                return
+
+        position = WRITE_BATCH_HEADER_SIZE
+        count = FIXED32.unpack_from(rep, 8)[0]
+        for _ in range(count):
+            tag = rep[position]
+            position += 1
+            if tag == WRITE_BATCH_NOOP:
+                continue
+            if tag == WRITE_BATCH_LOG_DATA:
+                _, position = decode_slice(rep, position)
+                continue
+            if tag not in WRITE_BATCH_TAGS:
+                # Transaction markers and newer record types end the decoding of this batch
+                return
+
+            op, has_column_family, has_value = WRITE_BATCH_TAGS[tag]
+            if has_column_family:
+                _, position = decode_varint32(rep, position)
+            key, position = decode_slice(rep, position)
+            value_size = None
+            if has_value:
+                value, position = decode_slice(rep, position)
+                # The end key of a range deletion is not a value
+                value_size = None if op == "rangedelete" else len(value)
+            window.add(op, key, value_size)
+
+    def feature_table(self, last_n=None):
+        '''
+        Function to get the features of the kept windows, including the current one
+
+        Parameters:
+        - last_n (int, optional): Only the last n windows. Default is all kept windows.
+
+        Returns:
+        - table (np.ndarray): Structured array with the ml_feature column names
+        - first_window (int): The number of windows before the first row, since the trace began
+        '''
+        windows = list(self.windows)
+        if last_n is not None:
+            windows = windows[-last_n:]
+        table = np.array([window.row() for window in windows], dtype=feature_dtype())
+        first_window = windows[0].index if windows else 0
+        return table, first_window
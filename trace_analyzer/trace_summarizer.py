@@ -1,27 +1,114 @@
-import pandas as pd
-from utils.constants import OUTPUT_PATH
+from utils import constants
+from utils.utils import log_update
 import numpy as np
-from scipy.optimize import curve_fit
-from scipy.stats import zipf, uniform, norm, expon
+import warnings
 import glob
 import os
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from trace_analyzer.trace_converter import INTEGER_FEATURES, load_table
+
+# Distribution files fit at once are fit in this many worker processes
+FIT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Content hash of a distribution file -> its best fit, so unchanged files are not fit again
+_fit_cache = {}
+
+# Prefix of the result of a fit that failed, these results are not cached
+FIT_ERROR_PREFIX = "Error: "
+
+# Zipf exponents the access distributions are compared against
+THETA_VALUES = [0.5, 0.8, 1.0, 1.2, 1.5, 1.8, 2.0, 2.5, 3.0]
 
 operations = ["get", "put", "delete", "singledelete", "rangedelete", "merge", "iterator_seek", "iterator_seekForPrev", "multiget"]
 
+def load_feature_table(feature_table_path):
+    '''
+    Function to load the ml_feature table written by trace_converter.convert_txt_to_table, or
+    an ml_feature CSV in one pass, into a NumPy structured array
+
+    Parameters:
+    - feature_table_path (str): The path of the feature table, or of ml_feature.csv or ml_feature_windows.csv
+
+    Returns:
+    - table (np.ndarray): One record per window, with a field per column of the header
+    '''
+    if not feature_table_path.endswith(".csv"):
+        return load_table(feature_table_path)
+
+    with open(feature_table_path, 'r') as file:
+        names = file.readline().strip().split(',')
+
+    dtype = [(name, np.int64 if name.endswith(INTEGER_FEATURES) else np.float64) for name in names]
+    if os.path.getsize(feature_table_path) == 0:
+        return np.empty(0, dtype=dtype)
+
+    # The trace analyzer ends every line with a comma, so only the named columns are read
+    table = np.genfromtxt(
+        feature_table_path,
+        delimiter=',',
+        skip_header=1,
+        usecols=range(len(names)),
+        dtype=dtype,
+        filling_values={index: 0 for index, (_, field_type) in enumerate(dtype) if field_type is np.int64},
+    )
+    table = np.atleast_1d(table)
+    # genfromtxt strips characters such as the brackets of get_quartiles[0] from the names
+    table.dtype.names = names
+    return table
+
+def table_operations(table):
+    '''
+    Function to list the operations that have features in the table
+
+    Parameters:
+    - table (np.ndarray): The feature table
+
+    Returns:
+    - operations (list): The operations in column order
+    '''
+    return [op for op in operations if f"{op}_access_count" in table.dtype.names]
+
+def access_count_matrix(table):
+    '''
+    Function to get the access counts of all windows and operations at once
+
+    Parameters:
+    - table (np.ndarray): The feature table
+
+    Returns:
+    - ops (list): The operations of the columns
+    - counts (np.ndarray): Windows x operations access counts
+    '''
+    ops = table_operations(table)
+    counts = np.empty((len(table), len(ops)), dtype=np.int64)
+    for index, op in enumerate(ops):
+        counts[:, index] = table[f"{op}_access_count"]
+    return ops, counts
+
+def operation_shares(counts):
+    '''
+    Function to compute the share of each operation in percent, per window
+
+    Parameters:
+    - counts (np.ndarray): Windows x operations access counts
+
+    Returns:
+    - shares (np.ndarray): Windows x operations percentages, 0 for windows without accesses
+    '''
+    totals = counts.sum(axis=1, keepdims=True)
+    return np.divide(counts * 100.0, totals, out=np.zeros(counts.shape), where=totals > 0)
+
 def count_total_queries(data):
-    access_count_columns = data.filter(like='_access_count').columns
-    total_queries = data[access_count_columns].sum(axis=1).sum()
-    return total_queries
+    _, counts = access_count_matrix(data)
+    return int(counts.sum())
 
 def count_percentages(data):
-    access_count_columns = data.filter(like='_access_count').columns
-    column_sums = data[access_count_columns].sum()
-    total_access_count = column_sums.sum()
-    column_percentages = (column_sums / total_access_count) * 100
-    rename_dict = {col: col.replace('_access_count', '').capitalize() for col in access_count_columns}
-    column_percentages.rename(index=rename_dict, inplace=True)
-    non_zero_percentages = column_percentages[column_percentages > 0]
-    return non_zero_percentages
+    ops, counts = access_count_matrix(data)
+    shares = operation_shares(counts.sum(axis=0, keepdims=True))[0]
+    return {op.capitalize(): share for op, share in zip(ops, shares) if share > 0}
 
 def convert_output(query_type):
     if query_type == 'Get':
@@ -40,12 +127,17 @@ def profile_query_composition(data):
     elif all(45 <= data.get(i, 0) <= 55 for i in [0, 1]):
         workload_type = "heavy updating"
     else:
-        max_type = data.idxmax()
+        max_type = max(data, key=data.get)
         workload_type = f"{convert_output(max_type)} heavy"
     return workload_type
 
+def format_number(value):
+    # Counts read as floats are printed as integers, like the CSV holds them
+    return int(value) if float(value).is_integer() else value
+
 def analyze_detailed_access_distribution(data):
     descriptions = []
+    columns = data.dtype.names
 
     for op in operations:
         mean_key = f'{op}_mean'
@@ -55,13 +147,14 @@ def analyze_detailed_access_distribution(data):
         quartile3_key = f'{op}_quartiles[2]'
         kurtosis_key = f'{op}_kurtosis'
 
-        if mean_key in data.columns:
-            mean = data[mean_key].iloc[0]
-            mode = data[mode_key].iloc[0]
-            median = data[median_key].iloc[0]
-            quartile1 = data[quartile1_key].iloc[0] if quartile1_key in data.columns else None
-            quartile3 = data[quartile3_key].iloc[0] if quartile3_key in data.columns else None
-            kurtosis = data[kurtosis_key].iloc[0] if kurtosis_key in data.columns else None
+        if mean_key in columns and len(data) > 0:
+            first = data[0]
+            mean = first[mean_key]
+            mode = format_number(first[mode_key])
+            median = format_number(first[median_key])
+            quartile1 = format_number(first[quartile1_key]) if quartile1_key in columns else None
+            quartile3 = format_number(first[quartile3_key]) if quartile3_key in columns else None
+            kurtosis = first[kurtosis_key] if kurtosis_key in columns else None
             
             if mode == 0:
                 continue
@@ -84,25 +177,39 @@ def analyze_detailed_access_distribution(data):
     
     return descriptions
 
-def profile_size(data):
-    messages = []
+def size_statistics(data):
+    '''
+    Function to average the key and value size statistics over all windows
 
+    Parameters:
+    - data (np.ndarray): The feature table
+
+    Returns:
+    - stats (dict): (operation, "key" or "value") -> (average, median, variance), NaN windows skipped
+    '''
+    stats = {}
+    columns = data.dtype.names
     for operation in operations:
-        value_size_average_col = f"{operation}_value_size_average"
-        value_size_median_col = f"{operation}_value_size_median"
-        value_size_variance_col = f"{operation}_value_size_variance"
+        for kind in ["key", "value"]:
+            names = [f"{operation}_{kind}_size_{stat}" for stat in ["average", "median", "variance"]]
+            if all(name in columns for name in names) and len(data) > 0:
+                values = np.column_stack([data[name] for name in names])
+                with np.errstate(invalid='ignore'), warnings.catch_warnings():
+                    # All-NaN columns give NaN, like pandas mean(skipna=True)
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    stats[(operation, kind)] = tuple(np.nanmean(values, axis=0))
+    return stats
 
-        key_size_average_col = f"{operation}_key_size_average"
-        key_size_median_col = f"{operation}_key_size_median"
-        key_size_variance_col = f"{operation}_key_size_variance"
+def profile_size(data):
+    messages = []
+    stats = size_statistics(data)
 
+    for operation in operations:
         gen_message = f"For {operation} operations: "
         messages.append(gen_message)
 
-        if key_size_average_col in data.columns and key_size_median_col in data.columns and key_size_variance_col in data.columns:
-            key_average = data[key_size_average_col].mean(skipna=True)
-            key_median = data[key_size_median_col].mean(skipna=True)
-            key_variance = data[key_size_variance_col].mean(skipna=True)
+        if (operation, "key") in stats:
+            key_average, key_median, key_variance = stats[(operation, "key")]
 
             if key_average > 0:
                 if key_variance == 0:
@@ -115,10 +222,8 @@ def profile_size(data):
                     )
                 messages.append(key_message)
         
-        if value_size_average_col in data.columns and value_size_median_col in data.columns and value_size_variance_col in data.columns:
-            average = data[value_size_average_col].mean(skipna=True)
-            median = data[value_size_median_col].mean(skipna=True)
-            variance = data[value_size_variance_col].mean(skipna=True)
+        if (operation, "value") in stats:
+            average, median, variance = stats[(operation, "value")]
 
             if average > 0 and median > 0:
                 if variance == 0:
@@ -133,19 +238,22 @@ def profile_size(data):
 
     return messages
 
-def generate_summary(csv_file_path):
-    data = pd.read_csv(csv_file_path, index_col=False)
+def format_query_composition(percentages, cf_num=1):
+    return (
+        "The workload consists of interleaved "
+        + ", ".join(f"{value:.2f}% {index}" for index, value in percentages.items())
+        + f". There are {cf_num} column family in this workload.\n"
+    )
+
+def generate_summary(feature_table_path):
+    data = load_feature_table(feature_table_path)
     cf_num = 1
     
     non_zero_percentages = count_percentages(data)
     key_value_sizes_message = "".join(f"{message}\n" for message in profile_size(data))
     key_access_message = "".join(f"{message}\n" for message in analyze_detailed_access_distribution(data))
 
-    query_composition = (
-        "The workload consists of interleaved "
-        + ", ".join(f"{value:.2f}% {index}" for index, value in non_zero_percentages.items())
-        + f". There are {cf_num} column family in this workload.\n"
-    )
+    query_composition = format_query_composition(non_zero_percentages, cf_num)
 
     summary = (
         "The workload information is as follows:\n"
@@ -187,7 +295,97 @@ def read_data(file_path):
 
     return np.array(access_count), np.array(frequency)
 
-def fit_distribution(data_file):
+def file_digest(file_path):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def data_points(data_file):
+    # A file that cannot be read has its error reported by its fit
+    try:
+        return len(read_data(data_file)[0])
+    except Exception:
+        return 0
+
+def zipf_normalizations(lengths):
+    '''
+    Function to compute the sums of the Zipf pmf over the ranks 1..n once for all files to fit,
+    so the fit workers, and the fits of files of the same length, share them
+
+    Parameters:
+    - lengths (iterable): The numbers of data points of the files
+
+    Returns:
+    - normalizations (dict): (n, theta) -> sum of the Zipf pmf over the ranks 1..n
+    '''
+    from scipy.stats import zipf
+    return {(n, theta): np.sum(zipf.pmf(np.arange(1, n + 1), theta))
+            for n in set(lengths) for theta in THETA_VALUES}
+
+def fit_best(data_file, normalizations=None):
+    '''
+    Function to find the best fitting distribution of a file, run in the fit worker processes
+
+    Parameters:
+    - data_file (str): The path of the distribution file
+    - normalizations (dict, optional): The Zipf normalizations computed by zipf_normalizations
+
+    Returns:
+    - best_fit (str): The name of the distribution, or the error of the fit
+    '''
+    try:
+        best_fit, _ = fit_distribution(data_file, normalizations)
+        return best_fit
+    except Exception as e:
+        return f"{FIT_ERROR_PREFIX}{str(e)}"
+
+def fit_distributions(data_files):
+    '''
+    Function to find the best fitting distributions of several files. Files whose content
+    was fit before are taken from the cache, the others are fit in parallel worker processes.
+    Failed fits are not cached, so they are retried on the next call.
+
+    Parameters:
+    - data_files (list): The paths of the distribution files
+
+    Returns:
+    - fits (dict): Path -> best fit, or the error of the fit
+    '''
+    digests = {data_file: file_digest(data_file) for data_file in data_files}
+    pending = sorted({digest: data_file for data_file, digest in digests.items() if digest not in _fit_cache}.items())
+    fits = {}
+
+    if pending:
+        # Only files of at least 5 data points are fit to the Zipf distributions
+        lengths = [data_points(data_file) for _, data_file in pending]
+        normalizations = zipf_normalizations(n for n in lengths if n >= 5)
+
+    if len(pending) > 1 and FIT_WORKERS > 1:
+        try:
+            # spawn, the tuning process runs threads that a forked child would inherit mid-operation
+            with ProcessPoolExecutor(max_workers=min(FIT_WORKERS, len(pending)),
+                                     mp_context=multiprocessing.get_context("spawn")) as executor:
+                data_files = [data_file for _, data_file in pending]
+                for (digest, _), best_fit in zip(pending, executor.map(fit_best, data_files, [normalizations] * len(pending))):
+                    fits[digest] = best_fit
+        except Exception as e:
+            log_update(f"[TSU] Parallel distribution fitting failed, fitting serially: {e}")
+
+    for digest, data_file in pending:
+        if digest not in fits:
+            fits[digest] = fit_best(data_file, normalizations)
+        if not fits[digest].startswith(FIT_ERROR_PREFIX):
+            _fit_cache[digest] = fits[digest]
+
+    return {data_file: fits.get(digest, _fit_cache.get(digest)) for data_file, digest in digests.items()}
+
+def fit_distribution(data_file, normalizations=None):
+    # scipy is only needed for the fits, and is slow to import
+    from scipy.optimize import curve_fit
+    from scipy.stats import zipf, uniform, norm, expon
+
     # Load data
     access_count, frequency = read_data(data_file)
 
@@ -220,12 +418,14 @@ def fit_distribution(data_file):
     loc_exp, scale_exp = expon.fit(access_count, floc=0)
 
     # Fit and evaluate Zipfian distribution for different theta values
+    if normalizations is None:
+        normalizations = zipf_normalizations([len(access_count)])
+
     def fit_zipf(x, s):
-        return zipf.pmf(x, s) / np.sum(zipf.pmf(np.arange(1, len(x) + 1), s))
+        return zipf.pmf(x, s) / normalizations[(len(x), s)]
 
-    theta_values = [0.5, 0.8, 1.0, 1.2, 1.5, 1.8, 2.0, 2.5, 3.0]
     metrics_zipf = {}
-    for theta in theta_values:
+    for theta in THETA_VALUES:
         y_fit_zipf = fit_zipf(access_count, theta)
         r_squared = 1 - np.sum((frequency_normalized - y_fit_zipf) ** 2) / np.sum((frequency_normalized - np.mean(frequency_normalized)) ** 2)
         rmse = np.sqrt(np.mean((frequency_normalized - y_fit_zipf) ** 2))
@@ -275,6 +475,9 @@ def fit_distribution(data_file):
 
     return best_fit[0], [access_count, frequency]
 
+def pattern_files(pattern_name):
+    return glob.glob(f"{constants.OUTPUT_PATH}/trace_data/*accessed_{pattern_name}_distribution.txt")
+
 def generate_pattern_message_from_trace(pattern_name):
     # Define the file path pattern
     operations = [
@@ -282,11 +485,10 @@ def generate_pattern_message_from_trace(pattern_name):
         "merge", "iterator_seek", "iterator_seekForPrev", "multiget"
     ]
 
-    filename_pattern = f"{OUTPUT_PATH}/trace_data/*accessed_{pattern_name}_distribution.txt"
-    
     # Find all matching files
-    txt_files = glob.glob(filename_pattern)
-    
+    txt_files = pattern_files(pattern_name)
+    fits = fit_distributions(txt_files)
+
     # Dictionary to store results
     results = {}
     pattern_info_dict = {}
@@ -304,49 +506,44 @@ def generate_pattern_message_from_trace(pattern_name):
             acc, freq = read_data(txt_file)
             pattern_info_dict[operation_matched] = [acc, freq]
 
-            try:
-                best_fit, _ = fit_distribution(txt_file)
-                results[operation_matched] = best_fit
-            except Exception as e:
-                results[operation_matched] = f"Error: {str(e)}"
+            results[operation_matched] = fits[txt_file]
         else:
             # Handle cases where no operation matches (optional)
             results[txt_file] = "Operation not matched"
 
     return results, pattern_info_dict
 
-def generate_summary_row(row, column_names):
-    # Convert the row to a DataFrame with a single row to work with existing functions
-    data = pd.DataFrame([row], columns=column_names)
-
-    # Extract necessary values for summary
-    non_zero_percentages = count_percentages(data)
-    key_value_sizes_message = "".join(f"{message}\n" for message in profile_size(data))
-    # key_access_message = "".join(f"{message}\n" for message in analyze_detailed_access_distribution(data))
-    # key_access_message = 
+def generate_window_summaries(data, last_n=None, first_window=0):
+    '''
+    Function to summarize the query composition of every window. The shares of all
+    windows are computed at once, and only the requested tail windows are formatted.
+
+    Parameters:
+    - data (np.ndarray): The feature table
+    - last_n (int, optional): Only summarize the last n windows. Default is all windows.
+    - first_window (int, optional): The number of windows before the first row of the table
+
+    Returns:
+    - summaries (list): (window number starting at 1, summary) of each window
+    '''
+    first = 0 if last_n is None else max(len(data) - last_n, 0)
+    ops, counts = access_count_matrix(data[first:])
+    shares = operation_shares(counts)
+    names = [op.capitalize() for op in ops]
     cf_num = 1  # Update logic if needed
 
-    query_composition = (
-        "The workload consists of interleaved "
-        + ", ".join(f"{value:.2f}% {index}" for index, value in non_zero_percentages.items())
-        + f". There are {cf_num} column family in this workload.\n"
-    )
-
-    summary = (
-        # "The workload information is as follows:\n"
-        f"Query Compositions: {query_composition}"
-        # f"Key and Value Size Characteristics: {key_value_sizes_message}"
-        # f"Key access distribution: {key_access_message}"
-    )
-
-    return summary
+    summaries = []
+    for offset, window_shares in enumerate(shares):
+        non_zero_percentages = {name: share for name, share in zip(names, window_shares) if share > 0}
+        summaries.append((first_window + first + offset + 1, f"Query Compositions: {format_query_composition(non_zero_percentages, cf_num)}"))
+    return summaries
 
-def generate_summary_windows(csv_file_path):
+def generate_summary_windows(feature_table_path):
     # Read the CSV file
-    data = pd.read_csv(csv_file_path, index_col=False)
+    data = load_feature_table(feature_table_path)
 
-    # Get column names
-    column_names = data.columns.tolist()
+    # The files of all three patterns are fit in one pool, the messages then hit the cache
+    fit_distributions([txt_file for name in ["key_count", "key_size", "value_size"] for txt_file in pattern_files(name)])
 
     key_access_message, key_access_pattern_info_dict = generate_pattern_message_from_trace("key_count")
     key_size_message, key_size_pattern_info_dict = generate_pattern_message_from_trace("key_size")
@@ -377,11 +574,7 @@ def generate_summary_windows(csv_file_path):
     # summaries.append("\n\nHere is the converted string from the csv file:\n")
     # summaries.append("Each time window equals to 10 seconds.\n")
 
-    # # Iterate through each row and generate summaries
-    # time_index=0
-    # for index, row in data.iterrows():
-    #     row_summary = generate_summary_row(row, column_names)
-    #     summaries.append(f"Time window {time_index}:{row_summary}\n")
-    #     time_index+= 1
+    # for window, row_summary in generate_window_summaries(data):
+    #     summaries.append(f"Time window {window - 1}:{row_summary}\n")
 
     return "".join(summaries)
@@ -0,0 +1,290 @@
+import os
+import argparse
+import threading
+import contextvars
+from dataclasses import dataclass, fields
+from datetime import datetime
+
+
+def str2bool(v):
+    if isinstance(v, bool):
+        return v
+    if v.lower() in ('yes', 'true', 't', 'y', '1'):
+        return True
+    elif v.lower() in ('no', 'false', 'f', 'n', '0'):
+        return False
+    else:
+        raise argparse.ArgumentTypeError('Boolean value expected!')
+
+
+@dataclass(frozen=True)
+class TuningConfig:
+    '''
+    Settings of one tuning session. Built once by load_config and passed to the code that
+    needs it, so several sessions with different settings can share a process. Use
+    dataclasses.replace to derive a changed copy.
+
+    Field names are the lower case names of the utils.constants they replace, e.g.
+    config.test_name is TEST_NAME.
+    '''
+    # Workload, Device, and LSM-KVS Version
+    iteration_count: int = 3
+    case_number: int = 3
+    device: str = "data"
+    test_name: str = "mixgraph"
+    version: str = "8.8.1"
+    output_path: str = None
+    num_entries: int = 2500000
+    num_threads: int = 8
+    duration: int = 200
+    sine_write_rate_interval_milliseconds: int = 1000
+    sine_a: float = 2000000  # 2M/80 for ~ 25k ops/sec
+    sine_b: float = 2.3873241464  # 15/(2*pi) for a 30 second period
+    sine_c: float = 0
+    sine_d: float = 10000000  # 10M/80 for ~ 125k ops/sec
+
+    # Sesame Controller
+    side_checker: bool = True
+    early_accept: bool = False
+    error_correction_count: int = 2
+    finetune_iteration: int = 2
+    dynamic_option_tuning: bool = True
+    llm_model: str = "o1-preview"
+    embedding_model: str = "text-embedding-3-small"
+    llm_max_concurrency: int = 4
+    llm_max_retries: int = 5
+    rag: bool = False
+    abstraction: bool = False
+    local_option_extraction: bool = True
+    tracefile_path: str = None
+    pre_load_cmd: str = None
+    pre_load_db_path: str = ""
+    parallel_workers: int = 1
+    readiness_timeout: float = 30
+    preload_cache: bool = True
+    preload_cache_budget_gb: float = 100
+    result_cache: bool = True
+    result_cache_max_age_hours: float = 168
+    force_remeasure: bool = False
+    objective: str = "throughput"
+    throughput_target: float = 0
+    pareto_objectives: str = "throughput,p99_read,p99_write"
+    surrogate_candidates: int = 1
+    surrogate_acquisition: str = "ei"
+    proxy_tier: bool = False
+    proxy_duration: int = 20
+    proxy_eta: int = 2
+
+    # Paths locally
+    db_bench_path: str = "/data/viraj/projects/trace-llm-project/rocksdb/db_bench"
+    trace_analyzer_path: str = "/data/viraj/projects/trace-llm-project/rocksdb/trace_analyzer"
+    db_path: str = "/data/gpt_project/db"
+    fio_profile_dir: str = "data/fio/profiles"
+    default_option_file_dir: str = "options_files/default_options_files"
+    # Kept next to the database so the cache can be hard linked into it
+    preload_cache_dir: str = "/data/gpt_project/preload_cache"
+    # Paths docker
+    # db_bench_path = f"/rocksdb-{version}/db_bench"
+    # trace_analyzer_path = f"/rocksdb-{version}/trace_analyzer"
+    # db_path = f"/{device}/gpt_project/db"
+    # preload_cache_dir = f"/{device}/gpt_project/preload_cache"
+
+    # Resources
+    # The total budget is split evenly between the workers when parallel_workers > 1
+    cgroup_name: str = "llm_cgroup"
+    cgroup_cpu_limit: int = 4
+    cgroup_memory_limit: int = 4*1024*1024*1024
+
+    @property
+    def result_cache_path(self):
+        return f"data/result_cache/results_{self.device}.sqlite"
+
+    @property
+    def surrogate_history_path(self):
+        return "data/surrogate/history.jsonl"
+
+    @property
+    def proxy_pairs_path(self):
+        return f"data/proxy_tier/pairs_{self.device}.jsonl"
+
+    @property
+    def initial_options_file_name(self):
+        return f"dbbench_default_options-{self.version}.ini"
+
+    @property
+    def options_file_dir(self):
+        return f"{self.output_path}/options_file.ini"
+
+
+def default_output_path(device):
+    '''
+    Function to choose the timestamped output folder of a session. The folder is created
+    when the session starts, not here.
+
+    Parameters:
+    - device (str): The device name
+
+    Returns:
+    - output_folder_dir (str): The output folder directory
+    '''
+    date_time_string = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    return f"output/output_{device}/output_{date_time_string}"
+
+
+def build_parser():
+    '''
+    Function to build the argument parser. Environment variables named like the constants
+    provide the defaults, the arguments replace them if they are set.
+
+    Returns:
+    - parser (argparse.ArgumentParser): The parser
+    '''
+    d = TuningConfig()
+
+    def env(name, default):
+        return os.getenv(name, default)
+
+    parser = argparse.ArgumentParser(description='Description of your script')
+    parser.add_argument('-i', '--iteration_count', type=int, default=env("ITERATION_COUNT", d.iteration_count), help='Specify the number of iterations')
+    parser.add_argument('-c', '--case', dest='case_number', type=int, default=env("CASE_NUMBER", d.case_number), help='Specify the case number')
+    parser.add_argument('-d', '--device', type=str, default=env("DEVICE", d.device), help='Specify the device')
+    parser.add_argument('-t', '--workload', dest='test_name', type=str, default=env("TEST_NAME", d.test_name), help='Specify the test name')
+    parser.add_argument('-v', '--version', type=str, default=env("VERSION", d.version), help='Specify the version of RocksDB')
+    parser.add_argument('-o', '--output', dest='output_path', type=str, default=env("OUTPUT_PATH", d.output_path), help='Specify the output path')
+    parser.add_argument('-n', '--num_entries', type=int, default=env("NUM_ENTRIES", d.num_entries), help='Specify the number of entries')
+    parser.add_argument('-th', '--num_threads', type=int, default=env("NUM_THREADS", d.num_threads), help='Specify the number of threads')
+    parser.add_argument('-u', '--duration', type=int, default=env("DURATION", d.duration), help='Specify the duration')
+    parser.add_argument('-s', '--side_checker', type=str2bool, default=env("SIDE_CHECKER", d.side_checker), help='Specify if side checker is enabled')
+    parser.add_argument('--early_accept', type=str2bool, default=env("EARLY_ACCEPT", d.early_accept), help='Specify if confidently better candidates finish early')
+    parser.add_argument('-ec', '--error_correction_count', type=int, default=env("ERROR_CORRECTION_COUNT", d.error_correction_count), help='Specify the error correction count')
+    parser.add_argument('-f', '--finetune_iteration', type=int, default=env("FINETUNE_ITERATION", d.finetune_iteration), help='Specify the Number of Fine-Tuning Iterations')
+    parser.add_argument('-dt', '--dynamic_option_tuning', type=str2bool, default=env("DYNAMIC_OPTION_TUNING", d.dynamic_option_tuning), help='Specify if dynamic option tuning is enabled')
+    parser.add_argument('-m', '--llm_model', type=str, default=env("LLM_MODEL", d.llm_model), help='Specify the LLM model to use')
+    parser.add_argument('-e', '--embedding_model', type=str, default=env("EMBEDDING_MODEL", d.embedding_model), help='Specify the embedding model to use')
+    parser.add_argument('--llm_max_concurrency', type=int, default=env("LLM_MAX_CONCURRENCY", d.llm_max_concurrency), help='Specify the maximum number of concurrent LLM requests')
+    parser.add_argument('--llm_max_retries', type=int, default=env("LLM_MAX_RETRIES", d.llm_max_retries), help='Specify the number of retries of a failed LLM request')
+    parser.add_argument('-r', '--rag', type=str2bool, default=env("RAG", d.rag), help='Specify if RAG is enabled')
+    parser.add_argument('-a', '--abstraction', type=str2bool, default=env("ABSTRACTION", d.abstraction), help='Specify if using Abstraction or not')
+    parser.add_argument('--local_option_extraction', type=str2bool, default=env("LOCAL_OPTION_EXTRACTION", d.local_option_extraction), help='Specify if options are extracted from LLM replies without a second LLM call')
+    parser.add_argument('--tracefile_path', type=str, default=env("TRACEFILE_PATH", d.tracefile_path), help='Specify the path of the tracefile')
+    parser.add_argument('--pre_load_cmd', type=str, default=env("PRE_LOAD_CMD", d.pre_load_cmd), help='Specify the pre-load command')
+    # If the pre-load db path is set, Sesame will simply copy the db to the db path
+    # If the pre-load db path is not set, Sesame will run the pre-load command
+    parser.add_argument('--pre_load_db_path', type=str, default=env("PRE_LOAD_DB_PATH", d.pre_load_db_path), help='Specify the pre-load db path')
+    # Each worker gets its own DB path, options file and cgroup slice
+    parser.add_argument('-w', '--parallel_workers', type=int, default=env("PARALLEL_WORKERS", d.parallel_workers), help='Specify the number of candidates benchmarked in parallel')
+    parser.add_argument('--readiness_timeout', type=float, default=env("READINESS_TIMEOUT", d.readiness_timeout), help='Specify the maximum wait in seconds for the system to become quiescent before a run')
+    # Preloaded databases are built once per workload and layout, then cloned for every run
+    parser.add_argument('--preload_cache', type=str2bool, default=env("PRELOAD_CACHE", d.preload_cache), help='Specify if preloaded databases are cached and cloned between runs')
+    parser.add_argument('--preload_cache_budget_gb', type=float, default=env("PRELOAD_CACHE_BUDGET_GB", d.preload_cache_budget_gb), help='Specify the disk budget of the preload cache in GB')
+    # Results of already measured options files are reused across iterations and sessions
+    # Set FORCE_REMEASURE to run every options file again (the new results are still recorded)
+    parser.add_argument('--result_cache', type=str2bool, default=env("RESULT_CACHE", d.result_cache), help='Specify if benchmark results are cached by options file and workload')
+    parser.add_argument('--result_cache_max_age_hours', type=float, default=env("RESULT_CACHE_MAX_AGE_HOURS", d.result_cache_max_age_hours), help='Specify the age in hours after which cached results are re-measured')
+    parser.add_argument('--force_remeasure', type=str2bool, default=env("FORCE_REMEASURE", d.force_remeasure), help='Specify if cached results are ignored and every options file is benchmarked')
+    # Candidates are ranked by the objective, those below the throughput target rank last
+    parser.add_argument('--objective', type=str, default=env("OBJECTIVE", d.objective), help='Specify the objective candidates are ranked by, see utils.scoring.OBJECTIVES')
+    parser.add_argument('--throughput_target', type=float, default=env("THROUGHPUT_TARGET", d.throughput_target), help='Specify the ops/sec a candidate has to sustain, 0 for none')
+    parser.add_argument('--pareto_objectives', type=str, default=env("PARETO_OBJECTIVES", d.pareto_objectives), help='Specify the comma separated objectives of the logged Pareto front')
+    # LLM candidates are ranked by a surrogate fit to the measured runs, only the best are benchmarked
+    parser.add_argument('--surrogate_candidates', type=int, default=env("SURROGATE_CANDIDATES", d.surrogate_candidates), help='Specify the number of candidates generated per benchmarked options file, 1 to disable screening')
+    parser.add_argument('--surrogate_acquisition', type=str, choices=["ei", "ucb"], default=env("SURROGATE_ACQUISITION", d.surrogate_acquisition), help='Specify the acquisition function candidates are ranked by')
+    # Candidates first run shorter on a smaller database, the best are promoted (successive halving)
+    parser.add_argument('--proxy_tier', type=str2bool, default=env("PROXY_TIER", d.proxy_tier), help='Specify if candidates are triaged with short proxy runs before full runs')
+    parser.add_argument('--proxy_duration', type=int, default=env("PROXY_DURATION", d.proxy_duration), help='Specify the duration of the first proxy tier, the fillrandom preload is scaled down by the same fraction')
+    parser.add_argument('--proxy_eta', type=int, default=env("PROXY_ETA", d.proxy_eta), help='Specify the factor candidates are reduced by and the duration grows by per proxy tier')
+    parser.add_argument('--sine_write_rate_interval_milliseconds', type=int, default=env("SINE_WRITE_RATE_INTERVAL_MILLISECONDS", d.sine_write_rate_interval_milliseconds), help='Specify the sine write rate interval in milliseconds')
+    parser.add_argument('--sine_a', type=float, default=env("SINE_A", d.sine_a), help='Specify the sine parameter a')
+    parser.add_argument('--sine_b', type=float, default=env("SINE_B", d.sine_b), help='Specify the sine parameter b')
+    parser.add_argument('--sine_c', type=float, default=env("SINE_C", d.sine_c), help='Specify the sine parameter c')
+    parser.add_argument('--sine_d', type=float, default=env("SINE_D", d.sine_d), help='Specify the sine parameter d')
+    return parser
+
+
+def load_config(argv=None, **overrides):
+    '''
+    Function to build a session config from the environment (and .env) and the command line
+
+    Parameters:
+    - argv (list, optional): The arguments. Default is the command line.
+    - overrides: Fields to set regardless of the arguments, e.g. output_path
+
+    Returns:
+    - config (TuningConfig): The config. output_path is set to a new timestamped folder if not given.
+    '''
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    args = build_parser().parse_args(argv)
+    names = {f.name for f in fields(TuningConfig)}
+    values = {name: value for name, value in vars(args).items() if name in names}
+    values.update(overrides)
+    if not values.get("output_path"):
+        values["output_path"] = default_output_path(values["device"])
+    return TuningConfig(**values)
+
+
+# The config of the session run by the current thread. Each session sets its own, threads
+# started by a session get it through SessionThread or in_session.
+_config = contextvars.ContextVar("tuning_config", default=None)
+
+
+def get_config():
+    '''
+    Function to get the config of the session of the current thread. The command line is
+    only parsed by main, so importing a module never does.
+
+    Returns:
+    - config (TuningConfig): The config set with set_config
+    '''
+    config = _config.get()
+    if config is None:
+        raise RuntimeError("No config is set, call utils.config.set_config(load_config()) first")
+    return config
+
+
+def set_config(config):
+    '''
+    Function to set the config of the session of the current thread. The modules using
+    utils.constants read it at call time, so a new config applies to the following calls.
+    Sessions running in other threads keep their own config.
+
+    Parameters:
+    - config (TuningConfig): The config
+    '''
+    _config.set(config)
+
+
+def in_session(function):
+    '''
+    Function to bind a function to the session of the caller, e.g. before handing it to
+    an executor. Each call runs in its own copy of the context, so calls may overlap.
+
+    Parameters:
+    - function (callable): The function
+
+    Returns:
+    - function (callable): The function running with the config of the caller
+    '''
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(function, *args, **kwargs)
+    return run
+
+
+class SessionThread(threading.Thread):
+    '''
+    Thread running with the config of the session that created it. Subclasses implement
+    run_in_session instead of run.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.context = contextvars.copy_context()
+
+    def run(self):
+        self.context.run(self.run_in_session)
+
+    def run_in_session(self):
+        super().run()
@@ -0,0 +1,241 @@
+import re
+from dataclasses import dataclass, field
+
+INT64_MIN = -2**63
+INT64_MAX = 2**63 - 1
+
+UNIT_MULTIPLIERS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+NUMBER_PATTERN = re.compile(r"^(-?\d+(?:\.\d+)?(?:e[+-]?\d+)?)\s*([kmgt]?)(?:i?b)?$", re.IGNORECASE)
+# The value runs to the end of the line or a comment, so units after a space (64 MB) and
+# exponents (1e+3) are kept
+ASSIGNMENT_PATTERN = re.compile(r'(\w+)\s*=\s*([^\n;#]+)')
+
+BOOLEAN_VALUES = {"true": 1, "1": 1, "yes": 1, "on": 1, "false": 0, "0": 0, "no": 0, "off": 0}
+
+# CompressionType values and their names in RocksDB options files
+COMPRESSION_TYPES = {
+    "kNoCompression": 0,
+    "kSnappyCompression": 1,
+    "kZlibCompression": 2,
+    "kBZip2Compression": 3,
+    "kLZ4Compression": 4,
+    "kLZ4HCCompression": 5,
+    "kXpressCompression": 6,
+    "kZSTD": 7,
+}
+
+
+@dataclass(frozen=True, eq=False)
+class DynamicOption:
+    '''
+    An option db_bench can change while running.
+
+    - id: Stable id of the option in the mmap file, new options get new ids
+    - name: The RocksDB option name
+    - scope: "db" for SetDBOptions, "cf" for SetOptions, "none" to keep it out of the updates
+    - kind: "int", "bool", "double" or "enum"
+    - minimum, maximum: Values outside are clamped
+    - enum: Name -> value of an enum option, the names are passed to RocksDB
+    '''
+    id: int
+    name: str
+    scope: str
+    kind: str = "int"
+    minimum: float = INT64_MIN
+    maximum: float = INT64_MAX
+    enum: dict = field(default_factory=dict)
+
+    @property
+    def wire_type(self):
+        return "double" if self.kind == "double" else "int64"
+
+
+# Registry of the mutable options that can be retuned mid-run. Adding an entry is enough to
+# include an option in the dynamic tuning prompt and the mmap updates. Regenerate the db_bench
+# header with python -m utils.mmap_utils afterwards.
+DYNAMIC_OPTIONS = (
+    DynamicOption(1, "max_open_files", "db", minimum=-1),
+    DynamicOption(2, "max_total_wal_size", "db", minimum=0),
+    DynamicOption(3, "delete_obsolete_files_period_micros", "none", minimum=0),  # Currently ignored
+    DynamicOption(4, "max_background_jobs", "db", minimum=1, maximum=256),
+    DynamicOption(5, "max_background_compactions", "db", minimum=-1, maximum=256),
+    DynamicOption(6, "max_subcompactions", "db", minimum=1, maximum=256),
+    DynamicOption(7, "stats_dump_period_sec", "db", minimum=0),
+    DynamicOption(8, "compaction_readahead_size", "db", minimum=0),
+    DynamicOption(9, "writable_file_max_buffer_size", "db", minimum=0),
+    DynamicOption(10, "bytes_per_sync", "db", minimum=0),
+    DynamicOption(11, "wal_bytes_per_sync", "db", minimum=0),
+    DynamicOption(12, "delayed_write_rate", "db", minimum=0),
+    DynamicOption(13, "avoid_flush_during_shutdown", "db", kind="bool"),
+    DynamicOption(14, "write_buffer_size", "cf", minimum=64 * 1024),
+    DynamicOption(15, "compression", "cf", kind="enum", enum=COMPRESSION_TYPES),
+    DynamicOption(16, "level0_file_num_compaction_trigger", "cf", minimum=1),
+    DynamicOption(17, "max_bytes_for_level_base", "cf", minimum=1),
+    DynamicOption(18, "disable_auto_compactions", "cf", kind="bool"),
+    DynamicOption(19, "memtable_max_range_deletions", "cf", minimum=0),
+    DynamicOption(20, "target_file_size_base", "cf", minimum=1),
+    DynamicOption(21, "target_file_size_multiplier", "cf", minimum=1),
+    DynamicOption(22, "level0_slowdown_writes_trigger", "cf", minimum=1),
+    DynamicOption(23, "level0_stop_writes_trigger", "cf", minimum=1),
+    DynamicOption(24, "max_write_buffer_number", "cf", minimum=2),
+    DynamicOption(25, "soft_pending_compaction_bytes_limit", "cf", minimum=0),
+    DynamicOption(26, "hard_pending_compaction_bytes_limit", "cf", minimum=0),
+    DynamicOption(27, "max_bytes_for_level_multiplier", "cf", kind="double", minimum=1.0, maximum=1000.0),
+    DynamicOption(28, "strict_bytes_per_sync", "db", kind="bool"),
+    DynamicOption(29, "stats_persist_period_sec", "db", minimum=0),
+    DynamicOption(30, "stats_history_buffer_size", "db", minimum=0),
+)
+
+OPTIONS_BY_NAME = {option.name: option for option in DYNAMIC_OPTIONS}
+OPTIONS_BY_ID = {option.id: option for option in DYNAMIC_OPTIONS}
+
+
+def enum_aliases(enum):
+    '''
+    Function to build the lookup of the spellings of enum values, e.g. kSnappyCompression,
+    snappy and SNAPPY all map to the value of kSnappyCompression
+
+    Parameters:
+    - enum (dict): Name -> value
+
+    Returns:
+    - aliases (dict): Lower case spelling -> value
+    '''
+    aliases = {}
+    for name, value in enum.items():
+        lower = name.lower()
+        aliases[lower] = value
+        short = lower[1:] if lower.startswith("k") else lower
+        aliases[short] = value
+        if short.endswith("compression") and short != "compression":
+            aliases[short[:-len("compression")]] = value
+    if "kNoCompression" in enum:
+        aliases["none"] = enum["kNoCompression"]
+    return aliases
+
+
+ENUM_ALIASES = {option.name: enum_aliases(option.enum) for option in DYNAMIC_OPTIONS if option.kind == "enum"}
+
+
+def parse_number(value):
+    '''
+    Function to parse a number with an optional K/M/G/T unit, e.g. 64MB or 1GiB
+
+    Parameters:
+    - value (str): The value
+
+    Returns:
+    - number (float): The number, or None if it is not a number
+    '''
+    match = NUMBER_PATTERN.match(value.strip().replace(",", "").replace("_", ""))
+    if match is None:
+        return None
+    return float(match.group(1)) * UNIT_MULTIPLIERS[match.group(2).lower()]
+
+
+def parse_option_value(option, value):
+    '''
+    Function to convert an options file value to the value of a dynamic option
+
+    Parameters:
+    - option (DynamicOption): The option
+    - value (str): The value as written in the options file
+
+    Returns:
+    - value (int or float): The value within the bounds of the option, or None if it cannot be parsed
+    '''
+    text = value.strip().lower()
+    if option.kind == "bool":
+        return BOOLEAN_VALUES.get(text)
+    if option.kind == "enum":
+        return ENUM_ALIASES[option.name].get(text)
+
+    number = parse_number(text)
+    if number is None:
+        return None
+    if option.kind == "int":
+        if number != int(number):
+            return None
+        number = int(number)
+    return max(option.minimum, min(option.maximum, number))
+
+
+def format_option_value(option, value):
+    '''
+    Function to write the value of a dynamic option the way RocksDB options files spell it
+
+    Parameters:
+    - option (DynamicOption): The option
+    - value (int or float): The parsed value
+
+    Returns:
+    - text (str): The value, e.g. kLZ4HCCompression or true
+    '''
+    if option.kind == "enum":
+        return next(name for name, number in option.enum.items() if number == value)
+    if option.kind == "bool":
+        return "true" if value else "false"
+    return str(value)
+
+
+def parse_dynamic_options(text):
+    '''
+    Function to extract the dynamic options from an options file
+
+    Parameters:
+    - text (str): The options file or the options part of an LLM reply
+
+    Returns:
+    - options (dict): DynamicOption -> parsed value, for the options found in the text
+    - errors (list): Messages of the values that could not be parsed or were clamped
+    '''
+    options = {}
+    errors = []
+    for name, value in ASSIGNMENT_PATTERN.findall(text):
+        value = value.strip().strip("\"'`,").strip()
+        option = OPTIONS_BY_NAME.get(name)
+        if option is None or option.scope == "none":
+            continue
+        parsed = parse_option_value(option, value)
+        if parsed is None:
+            errors.append(f"Could not convert value of {name} to {option.kind}: {value}")
+            continue
+        if option.kind in ("int", "double") and parse_number(value) != parsed:
+            errors.append(f"Value for {name} is out of boundaries: {value}. Clamped to {parsed}.")
+        options[option] = parsed
+    return options, errors
+
+
+def tunable_option_names():
+    '''
+    Function to list the options that can be changed while the workload is running
+
+    Returns:
+    - names (list): The option names
+    '''
+    return [option.name for option in DYNAMIC_OPTIONS if option.scope != "none"]
+
+
+def describe_tunable_options():
+    '''
+    Function to describe the options that can be changed while the workload is running, for prompts
+
+    Returns:
+    - description (str): One line per option with its type and allowed values
+    '''
+    lines = []
+    for option in DYNAMIC_OPTIONS:
+        if option.scope == "none":
+            continue
+        if option.kind == "enum":
+            allowed = "one of " + ", ".join(option.enum)
+        elif option.kind == "bool":
+            allowed = "true or false"
+        elif option.maximum != INT64_MAX:
+            allowed = f"{option.kind} from {option.minimum} to {option.maximum}"
+        elif option.minimum != INT64_MIN:
+            allowed = f"{option.kind} of at least {option.minimum}"
+        else:
+            allowed = option.kind
+        lines.append(f"{option.name}: {allowed}")
+    return "\n".join(lines)
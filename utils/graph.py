@@ -1,6 +1,7 @@
-import matplotlib.pyplot as plt
 import numpy as np
 
+# matplotlib is imported by the plotting functions, so importing this module stays cheap
+
 def plot(values, title, file):
     '''
     Plots a single line graph based on a list of values.
@@ -16,6 +17,8 @@ def plot(values, title, file):
     - None. The plot is saved to the specified file path.
 
     '''
+    import matplotlib.pyplot as plt
+
     # Calculate y-limit
     y_limit = 1.5*max(values)
 
@@ -54,6 +57,8 @@ def plot_2axis(keys, values, title, file):
     Returns:
     - None. The plot is saved to the specified file path.
     '''
+    import matplotlib.pyplot as plt
+
     # Plotting
     plt.figure(figsize=(12, 6))
     plt.plot(keys, values, label=title, linestyle='-')
@@ -88,6 +93,8 @@ def plot_multiple(data, title, file):
     - None. The plot is saved to the specified file path.
 
     '''
+    import matplotlib.pyplot as plt
+
 
     # Plotting setup
     plt.figure(figsize=(12, 6))
@@ -99,13 +106,18 @@ def plot_multiple(data, title, file):
     plt.legend()
     plt.grid(True)
 
-    plt.ylim(0, 1.5*max(max(row) for row in [x[1]["ops_per_second_graph"][1] for x in data]))
+    # Runs whose time series is gone have an empty series
+    peak = max((max(row, default=0) for row in [x[1]["ops_per_second_graph"][1] for x in data]), default=0)
+    if peak > 0:
+        plt.ylim(0, 1.5*peak)
 
     # Save the plot to a file
     plt.savefig(file)
     plt.close()
 
 def plot_multiple_manual(data, file):
+    import matplotlib.pyplot as plt
+
     # Plotting
     plt.figure(figsize=(16.5, 8))
     # labels = ["Default file", "Iteration 3", "Iteration 3", "Iteration 7"]
@@ -126,6 +138,8 @@ def plot_multiple_manual(data, file):
     plt.close()
 
 def plot_finetune(values, title, file):
+    import matplotlib.pyplot as plt
+
     y_limit = 1.5*max([max(x) for x in values])
     iterations = [f"Iteration-{i+1}" for i in range(len(values))]
     finetune_iter = {
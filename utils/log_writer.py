@@ -0,0 +1,143 @@
+import os
+import re
+import json
+import uuid
+import atexit
+import threading
+from datetime import datetime
+
+LOG_MAX_BYTES = 50 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_FLUSH_INTERVAL_SECONDS = 1.0
+
+TAG_PATTERN = re.compile(r"^\[(\w+)\]\s*")
+RESPONSE_FILE_PATTERN = re.compile(r"^response_(\d+)\.txt$")
+
+
+class LogWriter:
+    '''
+    Log writer keeping the log files open for the whole run. Every message is written to
+    the text log and as a JSON-lines record tagged with the run and iteration ids. Writes
+    are buffered and flushed by a background thread, at exit, and before rotation. A file
+    is rotated to <name>.1 ... <name>.N once it grows beyond `max_bytes`.
+    '''
+
+    def __init__(self, text_path, jsonl_path, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT,
+                 flush_interval=LOG_FLUSH_INTERVAL_SECONDS):
+        '''
+        Parameters:
+        - text_path (str): The path of the text log
+        - jsonl_path (str): The path of the JSON-lines log
+        - max_bytes (int): The size at which a log file is rotated
+        - backup_count (int): The number of rotated files kept
+        - flush_interval (float): Time between background flushes in seconds
+        '''
+        self.paths = [text_path, jsonl_path]
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.run_id = uuid.uuid4().hex[:12]
+        self.iteration = None
+        self.lock = threading.Lock()
+        self.files = [open(path, "a", buffering=1024 * 1024) for path in self.paths]
+        # Tracked by hand, tell() on a text file flushes the buffer
+        self.sizes = [os.path.getsize(path) for path in self.paths]
+        self.closed = False
+
+        self.stop_event = threading.Event()
+        self.flush_thread = threading.Thread(target=self._flush_loop, args=(flush_interval,), name="log-flush", daemon=True)
+        self.flush_thread.start()
+        atexit.register(self.close)
+
+    def write(self, message):
+        '''
+        Write one message to both logs
+
+        Parameters:
+        - message (str): The message, optionally starting with a [TAG]
+
+        Returns:
+        - None
+        '''
+        now = datetime.now()
+        tag_match = TAG_PATTERN.match(message)
+        record = {
+            "time": now.isoformat(timespec="milliseconds"),
+            "run_id": self.run_id,
+            "iteration": self.iteration,
+            "tag": tag_match.group(1) if tag_match else None,
+            "message": message[tag_match.end():] if tag_match else message,
+        }
+        lines = [
+            f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] {message}\n",
+            json.dumps(record) + "\n",
+        ]
+
+        with self.lock:
+            if self.closed:
+                return
+            for index, line in enumerate(lines):
+                self.files[index].write(line)
+                self.sizes[index] += len(line)
+                if self.sizes[index] >= self.max_bytes:
+                    self._rotate(index)
+
+    def _rotate(self, index):
+        '''
+        Rotate one log file. Must be called with the lock held.
+        '''
+        path = self.paths[index]
+        self.files[index].close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+        self.files[index] = open(path, "a", buffering=1024 * 1024)
+        self.sizes[index] = 0
+
+    def flush(self):
+        with self.lock:
+            if not self.closed:
+                for f in self.files:
+                    f.flush()
+
+    def _flush_loop(self, flush_interval):
+        while not self.stop_event.wait(flush_interval):
+            self.flush()
+
+    def close(self):
+        '''
+        Flush and close the logs. Called at interpreter exit.
+        '''
+        self.stop_event.set()
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            for f in self.files:
+                f.close()
+
+
+class ResponseCounter:
+    '''
+    Thread-safe counter of the GPT response files of a directory. The directory is scanned
+    once for the highest existing index, after which indices are handed out in O(1).
+    '''
+
+    def __init__(self, directory):
+        '''
+        Parameters:
+        - directory (str): The directory holding the response_<i>.txt files
+        '''
+        os.makedirs(directory, exist_ok=True)
+        indices = [int(m.group(1)) for m in map(RESPONSE_FILE_PATTERN.match, os.listdir(directory)) if m]
+        self.next_index = max(indices, default=0) + 1
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            index = self.next_index
+            self.next_index += 1
+            return index
@@ -5,38 +5,89 @@ import re
 import time
 
 from utils.utils import log_update
+from utils.dynamic_options import DYNAMIC_OPTIONS, OPTIONS_BY_ID, format_option_value, parse_dynamic_options, tunable_option_names
 
 mmap_file_path = "/tmp/mmap_file.mmap"
-mmap_size = 1024
+mmap_size = 4096
+
+# Layout v2, all little endian:
+#   header (64 bytes): magic u32, version u16, header size u16, sequence u64, applied sequence u64, slot size u32
+#   two slots: sequence u64, payload length u32, crc32c u32, entry count u32, padding u32, entries
+#   entry (16 bytes): option id u16, value type u8, padding, value int64 or double
+# A writer fills the slot of sequence % 2 and then publishes the sequence in the header, so the
+# slot db_bench may be reading is never written. db_bench checks the slot sequence and checksum,
+# skips a torn slot until the next poll, and stores the sequence it applied in the header.
+MMAP_MAGIC = 0x54504F44  # "DOPT"
+MMAP_VERSION = 2
+MMAP_HEADER = struct.Struct("<IHHQQI")
+MMAP_HEADER_SIZE = 64
+MMAP_SEQUENCE_OFFSET = 8
+MMAP_APPLIED_SEQUENCE_OFFSET = 16
+MMAP_SLOT_HEADER = struct.Struct("<QIIIxxxx")
+MMAP_SLOT_SIZE = (mmap_size - MMAP_HEADER_SIZE) // 2
+MMAP_ENTRY_SIZE = 16
+ENTRY_STRUCTS = {"int64": struct.Struct("<HBxxxxxq"), "double": struct.Struct("<HBxxxxxd")}
+MMAP_TYPE_IDS = {"int64": 1, "double": 2}
+
+DYNAMIC_OPTIONS_HEADER_PATH = os.path.join(os.path.dirname(__file__), "../db_bench_dynamic_opts/dynamic_options_table.h")
+
+
+def crc32c_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+CRC32C_TABLE = crc32c_table()
+
+
+def crc32c(data):
+    '''
+    Function to compute the CRC32C (Castagnoli) of the data, as crc32c::Value in RocksDB
+
+    Parameters:
+    - data (bytes): The data
+
+    Returns:
+    - crc (int): The checksum
+    '''
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc = CRC32C_TABLE[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
 
 def create_mmap_file():
-    if not(os.path.exists(mmap_file_path)):
-        with open(mmap_file_path, "wb") as f:
-            f.write(b'\x00' * mmap_size)
-    else:
-        log_update("MMap file already exists. Setting top bit to 0 to avoid db_bench reads.")
-        with open(mmap_file_path, "r+b") as f:
-            with mmap.mmap(f.fileno(), mmap_size, access=mmap.ACCESS_WRITE) as m:
-                m[0] = 0
+    '''
+    Create the dynamic options file with an empty v2 header. An existing file is reset, so a new
+    db_bench run never applies the options written for the previous one.
+    '''
+    if os.path.exists(mmap_file_path):
+        log_update("MMap file already exists. Resetting it to sequence 0 to avoid db_bench reads.")
+    with open(mmap_file_path, "wb") as f:
+        f.write(MMAP_HEADER.pack(MMAP_MAGIC, MMAP_VERSION, MMAP_HEADER_SIZE, 0, 0, MMAP_SLOT_SIZE).ljust(mmap_size, b'\x00'))
 
 def add_mmap_file_to_option(option_file, mmap_str):
     '''
-    Add the mmap file path to the option string
+    Add the mmap file path to the option string. The options file gets the values as they
+    were published to db_bench, e.g. 64 MB is written as 67108864.
     '''
-    pattern = re.compile(r'(\w+)\s*=\s*([\w\.\-]+)')
-    
+    pattern = re.compile(r'(\w+)\s*=')
+
     # Convert mmap_str to a dictionary
-    mmap_options = {}
-    for match in pattern.finditer(mmap_str):
-        key, value = match.groups()
-        mmap_options[key] = value
+    options, _ = parse_dynamic_options(mmap_str)
+    mmap_options = {option.name: format_option_value(option, value) for option, value in options.items()}
     
     # Update option_file line by line
     updated_lines = []
     for line in option_file.split('\n'):
         match = pattern.match(line)
         if match:
-            key, _ = match.groups()
+            key = match.group(1)
             if key in mmap_options:
                 line = f"{key} = {mmap_options[key]}"
         updated_lines.append(line)
@@ -47,143 +98,186 @@ def add_mmap_file_to_option(option_file, mmap_str):
 
 def convert_option_string_to_list(data):
     '''
-    Convert the string to a mmap specific list of integers
-    '''
-    dataKey = [
-        'max_open_files', 
-        'max_total_wal_size', 
-        'delete_obsolete_files_period_micros', # Currently ignored
-        'max_background_jobs', 
-        'max_background_compactions', 
-        'max_subcompactions', 
-        'stats_dump_period_sec', 
-        'compaction_readahead_size', 
-        'writable_file_max_buffer_size', 
-        'bytes_per_sync', 
-        'wal_bytes_per_sync', 
-        'delayed_write_rate', 
-        'avoid_flush_during_shutdown', 
-        'write_buffer_size', 
-        'compression', 
-        'level0_file_num_compaction_trigger', 
-        'max_bytes_for_level_base', 
-        'disable_auto_compactions', 
-        'memtable_max_range_deletions', 
-    ]
-    
-    # Extract key-value pairs from the input string using regex
-    options = {}
-    pattern = re.compile(r'(\w+)\s*=\s*([\w\.\-]+)')
-    for match in pattern.finditer(data):
-        key, value = match.groups()
-        options[key] = value
-    
-    # Create the list of values based on dataKey
-    result = []
-    for key in dataKey:
-        if key in options:
-            if options[key].lower() == 'false':
-                value = 0
-            elif options[key].lower() == 'true':
-                value = 1
-            elif 'no' in options[key].lower():
-                value = 0
-            elif 'snappy' in options[key].lower():
-                value = 1
-            elif 'zlib' in options[key].lower():
-                value = 2
-            elif 'bzip2' in options[key].lower():
-                value = 3
-            elif 'lz4' in options[key].lower():
-                value = 4
-            elif 'lz4hc' in options[key].lower():
-                value = 5
-            elif 'xpress' in options[key].lower():
-                value = 6
-            elif 'zstd' in options[key].lower():
-                value = 7
-            else:
-                try:
-                    value = int(options[key])
-                    if not(-2147483648 <= value <= 2147483647):
-                        log_update(f"Value for {key} is out of boundaries: {value}. Clamping applied.")
-                        value = max(-2147483648, min(2147483647, value))
-                except:
-                    log_update(f"Error converting value of {key} to integer: " + options[key])
-                    log_update("Forcing value to 0 for key: " + key)
-                    value = 0
-        else:
-            log_update("Error key not found in options file: " + key)
-            log_update("Forcing value to 0 for key: " + key)
-            value = 0  # Default value if key is not found
-        
-        result.append(value)
-    
-    return result
+    Convert the string to the list of dynamic options it sets, see utils/dynamic_options.py
 
-def write_to_mmap_file(data):
+    Returns:
+    - entries (list): (DynamicOption, value) in registry order
+    '''
+    options, errors = parse_dynamic_options(data)
+    for error in errors:
+        log_update(f"[MMAP] {error}")
+
+    missing = [name for name in tunable_option_names() if name not in {option.name for option in options}]
+    if missing:
+        log_update(f"[MMAP] Options not in the options file, left unchanged: {', '.join(missing)}")
+
+    return sorted(options.items(), key=lambda entry: entry[0].id)
+
+def encode_mmap_payload(entries):
+    '''
+    Encode (DynamicOption, value) pairs into slot entries
     '''
-    The file is memory mapped and we do not perform any error checking. 
-    All operations are type and order sensistive.
-    The data is written in the following order:
-        int max_open_file = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 1);
-        int max_total_wal_size = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 5);
-        int delete_obsolete_files_period_micros = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 9);
-        int max_background_jobs = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 13);
-        int max_background_compactions = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 17);
-        int max_subcompactions = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 21);
-        int stats_dump_period_sec = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 25);
-        int compaction_readahead_size = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 29);
-        int writable_file_max_buffer_size = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 33);
-        int bytes_per_sync = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 37);
-        int wal_bytes_per_sync = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 41);
-        int delayed_write_rate = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 45);
-        int avoid_flush_during_shutdown = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 49);
-
-        int write_buffer_size = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 53);
-        int compression = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 57);
-        int level0_file_num_compaction_trigger = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 61);
-        int max_bytes_for_level_base = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 65);
-        int disable_auto_compactions = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 69);
-        int memtable_max_range_deletions = *reinterpret_cast<int*>(mmap_dynamic_file_addr_ + 73);
+    return b''.join(ENTRY_STRUCTS[option.wire_type].pack(option.id, MMAP_TYPE_IDS[option.wire_type], value)
+                    for option, value in entries)
+
+def write_to_mmap_file(data):
     '''
+    Publish a new set of dynamic options. The entries are written to the slot db_bench is not
+    reading, then the header sequence is advanced to point at it.
 
+    Parameters:
+    - data (str or list): The options file, or (DynamicOption, value) pairs
+
+    Returns:
+    - sequence (int): The sequence of the update
+    '''
     if type(data) == str:
         data = convert_option_string_to_list(data)
-    
+
+    payload = encode_mmap_payload(data)
+    if MMAP_SLOT_HEADER.size + len(payload) > MMAP_SLOT_SIZE:
+        raise ValueError(f"{len(data)} dynamic options do not fit in a {MMAP_SLOT_SIZE} byte slot")
+    if not data:
+        log_update("[MMAP] No dynamic options in the update, nothing published")
+        return None
+
     with open(mmap_file_path, "r+b") as f:
         with mmap.mmap(f.fileno(), mmap_size, access=mmap.ACCESS_WRITE) as m:
-            
-            # Set ready flag to 0 while writing
-            m[0] = 0 
+            magic, version, _, sequence, _, _ = MMAP_HEADER.unpack_from(m, 0)
+            if magic != MMAP_MAGIC or version != MMAP_VERSION:
+                raise ValueError(f"{mmap_file_path} is not a version {MMAP_VERSION} dynamic options file")
+
+            sequence += 1
+            slot = MMAP_HEADER_SIZE + (sequence % 2) * MMAP_SLOT_SIZE
+            m[slot + MMAP_SLOT_HEADER.size:slot + MMAP_SLOT_HEADER.size + len(payload)] = payload
+            MMAP_SLOT_HEADER.pack_into(m, slot, sequence, len(payload), crc32c(payload), len(data))
+
+            # Publish the slot
+            struct.pack_into("<Q", m, MMAP_SEQUENCE_OFFSET, sequence)
+            m.flush()
+
+    log_update(f"[MMAP] Published dynamic options update {sequence}")
+    return sequence
+
+def read_mmap_file(path=mmap_file_path):
+    '''
+    Read the current dynamic options the way db_bench does
+
+    Parameters:
+    - path (str): The path of the mmap file
+
+    Returns:
+    - sequence (int): The published sequence, 0 if nothing was published
+    - applied_sequence (int): The last sequence db_bench applied
+    - options (dict): Option name -> value of the published slot, None if the slot is torn
+    '''
+    with open(path, "rb") as f:
+        data = f.read(mmap_size)
 
-            # Write compaction speed and cache size after the flag
-            m.seek(1)  # Move to position 1 after the flag byte
-            for i in range(len(data)):
-                m.write(struct.pack('i', data[i]))
+    magic, version, header_size, sequence, applied_sequence, slot_size = MMAP_HEADER.unpack_from(data, 0)
+    if magic != MMAP_MAGIC or version != MMAP_VERSION:
+        raise ValueError(f"{path} is not a version {MMAP_VERSION} dynamic options file")
+    if sequence == 0:
+        return 0, applied_sequence, {}
+
+    slot = header_size + (sequence % 2) * slot_size
+    slot_sequence, payload_length, crc, count = MMAP_SLOT_HEADER.unpack_from(data, slot)
+    payload = data[slot + MMAP_SLOT_HEADER.size:slot + MMAP_SLOT_HEADER.size + payload_length]
+    if slot_sequence != sequence or payload_length != count * MMAP_ENTRY_SIZE or crc32c(payload) != crc:
+        return sequence, applied_sequence, None
+
+    options = {}
+    type_names = {type_id: value_type for value_type, type_id in MMAP_TYPE_IDS.items()}
+    for offset in range(0, payload_length, MMAP_ENTRY_SIZE):
+        option_id, type_id = struct.unpack_from("<HB", payload, offset)
+        if option_id in OPTIONS_BY_ID and type_id in type_names:
+            value = ENTRY_STRUCTS[type_names[type_id]].unpack_from(payload, offset)[2]
+            options[OPTIONS_BY_ID[option_id].name] = value
+    return sequence, applied_sequence, options
+
+def generate_dynamic_options_header(path=DYNAMIC_OPTIONS_HEADER_PATH):
+    '''
+    Write the C++ header with the mmap layout and the option id table used by db_bench_tool.cc
+    '''
+    scopes = {"db": "kDynamicOptionDB", "cf": "kDynamicOptionCF", "none": "kDynamicOptionIgnored"}
+    types = {"int64": "kDynamicOptionInt64", "double": "kDynamicOptionDouble"}
+
+    # Enum options are passed to RocksDB by name, indexed by value
+    enum_tables = []
+    enum_fields = {}
+    for option in DYNAMIC_OPTIONS:
+        if option.kind != "enum":
+            continue
+        names = [""] * (max(option.enum.values()) + 1)
+        for name, value in option.enum.items():
+            names[value] = name
+        table = f"k{''.join(part.capitalize() for part in option.name.split('_'))}Names"
+        enum_tables += [f"constexpr const char* {table}[] = {{", *[f"    \"{name}\"," for name in names], "};", ""]
+        enum_fields[option.id] = f"{table}, {len(names)}"
+
+    lines = [
+        "// Generated by utils/mmap_utils.py (generate_dynamic_options_header), do not edit.",
+        "#pragma once",
+        "",
+        "#include <cstddef>",
+        "#include <cstdint>",
+        "",
+        "namespace ROCKSDB_NAMESPACE {",
+        "",
+        f"constexpr uint32_t kDynamicOptionsMagic = 0x{MMAP_MAGIC:08X};",
+        f"constexpr uint16_t kDynamicOptionsVersion = {MMAP_VERSION};",
+        f"constexpr size_t kDynamicOptionsFileSize = {mmap_size};",
+        f"constexpr size_t kDynamicOptionsHeaderSize = {MMAP_HEADER_SIZE};",
+        f"constexpr size_t kDynamicOptionsSequenceOffset = {MMAP_SEQUENCE_OFFSET};",
+        f"constexpr size_t kDynamicOptionsAppliedSequenceOffset = {MMAP_APPLIED_SEQUENCE_OFFSET};",
+        f"constexpr size_t kDynamicOptionsSlotSize = {MMAP_SLOT_SIZE};",
+        f"constexpr size_t kDynamicOptionsSlotHeaderSize = {MMAP_SLOT_HEADER.size};",
+        f"constexpr size_t kDynamicOptionsEntrySize = {MMAP_ENTRY_SIZE};",
+        "",
+        "enum DynamicOptionType : uint8_t {",
+        *[f"  {types[value_type]} = {type_id}," for value_type, type_id in MMAP_TYPE_IDS.items()],
+        "};",
+        "",
+        "enum DynamicOptionScope : uint8_t {",
+        "  kDynamicOptionDB = 0,",
+        "  kDynamicOptionCF = 1,",
+        "  kDynamicOptionIgnored = 2,",
+        "};",
+        "",
+        "struct DynamicOptionInfo {",
+        "  uint16_t id;",
+        "  const char* name;",
+        "  DynamicOptionType type;",
+        "  DynamicOptionScope scope;",
+        "  // Names of the values of enum options, nullptr otherwise",
+        "  const char* const* enum_names;",
+        "  size_t enum_count;",
+        "};",
+        "",
+        *enum_tables,
+        "constexpr DynamicOptionInfo kDynamicOptions[] = {",
+        *[f"    {{{option.id}, \"{option.name}\", {types[option.wire_type]}, {scopes[option.scope]}, "
+          f"{enum_fields.get(option.id, 'nullptr, 0')}}},"
+          for option in DYNAMIC_OPTIONS],
+        "};",
+        "",
+        "inline const DynamicOptionInfo* FindDynamicOption(uint16_t id) {",
+        "  for (const auto& info : kDynamicOptions) {",
+        "    if (info.id == id) {",
+        "      return &info;",
+        "    }",
+        "  }",
+        "  return nullptr;",
+        "}",
+        "",
+        "}  // namespace ROCKSDB_NAMESPACE",
+        "",
+    ]
+    with open(path, "w") as f:
+        f.write("\n".join(lines))
 
-            m[0] = 1  # Flag to indicate "ready"
+if __name__ == "__main__":
+    generate_dynamic_options_header()
 
 # create_mmap_file()
-# data = [
-#     -1, # max_open_files
-#     0, # max_total_wal_size
-#     216, # delete_obsolete_files_period_micros ->  Currently Ignored
-#     2, # max_background_jobs
-#     -1, # max_background_compactions
-#     1, # max_subcompactions
-#     600, # stats_dump_period_sec
-#     2097152, # compaction_readahead_size
-#     1048576, # writable_file_max_buffer_size
-#     0, # bytes_per_sync
-#     0, # wal_bytes_per_sync
-#     8388608, # delayed_write_rate
-#     0, # avoid_flush_during_shutdown
-#     67108864, # write_buffer_size
-#     0, # compression
-#     4, # level0_file_num_compaction_trigger
-#     268435456, # max_bytes_for_level_base
-#     0, # disable_auto_compactions
-#     0 # memtable_max_range_deletions
-# ]
-# write_to_mmap_file(data)
+# write_to_mmap_file("max_background_jobs = 4\nwrite_buffer_size = 64MB\ncompression = kLZ4Compression\n")
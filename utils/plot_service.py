@@ -0,0 +1,187 @@
+import atexit
+import queue
+import threading
+import multiprocessing
+
+import numpy as np
+
+from utils.timeseries_store import throughput_series
+from utils.utils import log_update
+
+# Longer series are reduced to this many points, each the mean of a bucket of samples
+PLOT_MAX_POINTS = 2000
+PLOT_CLOSE_TIMEOUT_SECONDS = 60
+# Plots are dropped once the renderer died this many times, e.g. if matplotlib is missing
+PLOT_MAX_RESTARTS = 3
+
+
+def downsample(keys, values, max_points=PLOT_MAX_POINTS):
+    '''
+    Function to reduce a series to at most max_points points by averaging consecutive buckets
+
+    Parameters:
+    - keys (list): The X values
+    - values (list): The Y values
+    - max_points (int): The maximum number of points, None to keep all
+
+    Returns:
+    - keys (list): The X values of the buckets
+    - values (list): The mean Y values of the buckets
+    '''
+    if max_points is None or len(values) <= max_points:
+        return list(keys), list(values)
+
+    starts = np.linspace(0, len(values), max_points, endpoint=False).astype(np.int64)
+    counts = np.diff(np.append(starts, len(values)))
+    keys = np.add.reduceat(np.asarray(keys, dtype=np.float64), starts) / counts
+    values = np.add.reduceat(np.asarray(values, dtype=np.float64), starts) / counts
+    return keys.tolist(), values.tolist()
+
+
+def render_loop(jobs):
+    '''
+    Function run by the renderer process. Jobs that queued up while a plot was rendering
+    are coalesced, only the newest job of each output file is rendered.
+
+    Parameters:
+    - jobs (multiprocessing.Queue): Tuples of (utils.graph function name, arguments), None to stop
+    '''
+    import matplotlib
+    matplotlib.use("Agg")
+    from utils import graph
+
+    running = True
+    while running:
+        pending = {}
+        job = jobs.get()
+        while True:
+            if job is None:
+                running = False
+                break
+            name, args = job
+            # The output file is the last argument of every plot function
+            pending.pop(args[-1], None)
+            pending[args[-1]] = job
+            try:
+                job = jobs.get_nowait()
+            except queue.Empty:
+                break
+
+        for name, args in pending.values():
+            try:
+                getattr(graph, name)(*args)
+            except Exception as e:
+                print(f"[PLT] Rendering {args[-1]} failed: {e}")
+
+
+class PlotService:
+    '''
+    Renders the graphs in a separate process with the Agg backend, so plotting never
+    blocks the tuning loop. Submitting only queues the job. The process is restarted if
+    it died, up to PLOT_MAX_RESTARTS times, and the pending plots are finished at exit.
+    '''
+
+    def __init__(self, max_points=PLOT_MAX_POINTS):
+        '''
+        Parameters:
+        - max_points (int): Series are downsampled to this many points before they are sent, None to keep all
+        '''
+        self.max_points = max_points
+        # spawn, the tuning process runs threads that a forked child would inherit mid-operation
+        self.context = multiprocessing.get_context("spawn")
+        self.lock = threading.Lock()
+        self.process = None
+        self.jobs = None
+        self.restarts = 0
+        self.closed = False
+
+    def start(self):
+        '''
+        Function to start the renderer process. Must be called with the lock held.
+        '''
+        self.jobs = self.context.Queue()
+        self.process = self.context.Process(target=render_loop, args=(self.jobs,), name="plot-renderer", daemon=True)
+        self.process.start()
+
+    def submit(self, name, *args):
+        '''
+        Function to queue a plot
+
+        Parameters:
+        - name (str): The utils.graph function
+        - args: Its arguments, ending with the output file
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            if self.process is None:
+                atexit.register(self.close)
+                self.start()
+            elif not self.process.is_alive():
+                # Jobs the dead renderer did not read must not block the exit of this process
+                self.jobs.cancel_join_thread()
+                if self.restarts >= PLOT_MAX_RESTARTS:
+                    log_update(f"[PLT] Plot renderer exited with {self.process.exitcode}, dropping plots")
+                    self.closed = True
+                    return
+                self.restarts += 1
+                log_update(f"[PLT] Plot renderer exited with {self.process.exitcode}, restarting it")
+                self.start()
+            self.jobs.put((name, args))
+
+    def close(self, timeout=PLOT_CLOSE_TIMEOUT_SECONDS):
+        '''
+        Function to render the pending plots and stop the renderer process
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self.process is None:
+                return
+            self.jobs.put(None)
+            self.process.join(timeout)
+            if self.process.is_alive():
+                log_update(f"[PLT] Plot renderer did not finish within {timeout} seconds, stopping it")
+                self.process.terminate()
+            if self.process.exitcode != 0:
+                self.jobs.cancel_join_thread()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_plot_service():
+    '''
+    Function to get the process-wide plot service
+    '''
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = PlotService()
+        return _service
+
+
+# Same signatures as utils.graph, the plots are rendered by the plot service
+
+def plot(values, title, file):
+    get_plot_service().submit("plot", list(values), title, file)
+
+
+def plot_2axis(keys, values, title, file):
+    service = get_plot_service()
+    keys, values = downsample(keys, values, service.max_points)
+    service.submit("plot_2axis", keys, values, title, file)
+
+
+def plot_multiple(data, title, file):
+    # Only the per second series of the iterations are sent to the renderer
+    service = get_plot_service()
+    series = [(None, {"ops_per_second_graph": downsample(*throughput_series(entry[1]), service.max_points)})
+              for entry in data]
+    service.submit("plot_multiple", series, title, file)
+
+
+def plot_finetune(values, title, file):
+    get_plot_service().submit("plot_finetune", [list(v) for v in values], title, file)
@@ -0,0 +1,227 @@
+import math
+
+from utils.config import get_config
+
+# name -> (description, unit, whether higher is better)
+OBJECTIVES = {
+    "throughput": ("Operations per second", "ops/sec", True),
+    "p99_read": ("P99 read latency", "us", False),
+    "p999_read": ("P99.9 read latency", "us", False),
+    "p99_write": ("P99 write latency", "us", False),
+    "p999_write": ("P99.9 write latency", "us", False),
+    "cpu": ("CPU used", "%", False),
+    "memory": ("Memory used", "%", False),
+    "write_amplification": ("Write amplification", "x", False),
+}
+
+
+def parse_objectives(value):
+    '''
+    Function to parse a comma separated list of objective names
+
+    Parameters:
+    - value (str): e.g. "throughput,p99_read"
+
+    Returns:
+    - names (list): The objective names
+    '''
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    for name in names:
+        if name not in OBJECTIVES:
+            raise ValueError(f"Unknown objective {name}, expected one of {', '.join(OBJECTIVES)}")
+    return names
+
+
+def needs_statistics(config=None):
+    '''
+    Function to check whether db_bench has to print its --statistics dump, which is only
+    needed for the write amplification and costs a few percent of throughput
+    '''
+    config = config or get_config()
+    return "write_amplification" in parse_objectives(f"{config.objective},{config.pareto_objectives}")
+
+
+def attach_resources(benchmark_results, average_cpu_usage, average_memory_usage):
+    '''
+    Function to store the resource usage of a run in its results, so it can be scored
+    together with the results. -1 means the usage was not measured.
+    '''
+    if average_cpu_usage is not None and average_cpu_usage != -1:
+        benchmark_results["cpu_percent"] = average_cpu_usage
+    if average_memory_usage is not None and average_memory_usage != -1:
+        benchmark_results["memory_percent"] = average_memory_usage
+    return benchmark_results
+
+
+def _percentile(benchmark_results, operation, percentile):
+    histogram = (benchmark_results.get("histograms") or {}).get(operation)
+    if histogram is None:
+        return None
+    return histogram["percentiles"].get(percentile)
+
+
+def metric(benchmark_results, name):
+    '''
+    Function to get one objective of a run
+
+    Parameters:
+    - benchmark_results (dict): The results of the run
+    - name (str): The objective
+
+    Returns:
+    - value (float): The value, None if the run did not report it
+    '''
+    if name == "throughput":
+        return benchmark_results.get("ops_per_sec")
+    if name == "p99_read":
+        return _percentile(benchmark_results, "read", "P99")
+    if name == "p999_read":
+        return _percentile(benchmark_results, "read", "P99.9")
+    if name == "p99_write":
+        return _percentile(benchmark_results, "write", "P99")
+    if name == "p999_write":
+        return _percentile(benchmark_results, "write", "P99.9")
+    if name == "cpu":
+        return benchmark_results.get("cpu_percent")
+    if name == "memory":
+        return benchmark_results.get("memory_percent")
+    if name == "write_amplification":
+        return benchmark_results.get("write_amplification")
+    raise ValueError(f"Unknown objective {name}")
+
+
+def _signed(benchmark_results, name):
+    # Larger is better, missing values lose against any measured value
+    value = metric(benchmark_results, name)
+    if value is None:
+        return -math.inf
+    return value if OBJECTIVES[name][2] else -value
+
+
+def objective_target(value, objective):
+    '''
+    Function to map an objective value to a target where larger is better. The log makes the
+    target relative, a 10% gain counts the same at any throughput or latency.
+    '''
+    target = math.log(max(value, 1e-9))
+    return target if OBJECTIVES[objective][2] else -target
+
+
+def score(benchmark_results, config=None):
+    '''
+    Function to rank a run by the objective of the session. Runs below the throughput
+    target rank below every run that meets it, whatever their objective. Ties are broken
+    by throughput.
+
+    Parameters:
+    - benchmark_results (dict): The results of the run
+    - config (TuningConfig, optional): The session config. Default is the config of the current session.
+
+    Returns:
+    - key (tuple): Sort key, larger is better
+    '''
+    config = config or get_config()
+    throughput = benchmark_results.get("ops_per_sec") or 0
+    feasible = throughput >= config.throughput_target
+    return (feasible, _signed(benchmark_results, config.objective), throughput)
+
+
+def best_entry(entries, results_index=1, config=None):
+    '''
+    Function to choose the best entry, e.g. of the options files list. Among equal scores
+    the first entry wins, as with max().
+
+    Parameters:
+    - entries (list): Tuples holding the benchmark results of a run
+    - results_index (int): The position of the benchmark results in the tuples
+
+    Returns:
+    - entry (tuple): The best entry
+    '''
+    return max(entries, key=lambda entry: score(entry[results_index], config))
+
+
+def dominates(a, b, objectives):
+    '''
+    Function to check whether run a is at least as good as run b in every objective and
+    better in one of them
+    '''
+    better = False
+    for name in objectives:
+        value_a, value_b = _signed(a, name), _signed(b, name)
+        if value_a < value_b:
+            return False
+        if value_a > value_b:
+            better = True
+    return better
+
+
+def pareto_front(entries, results_index=1, config=None):
+    '''
+    Function to find the entries no other entry dominates in the Pareto objectives of the session
+
+    Parameters:
+    - entries (list): Tuples holding the benchmark results of a run
+    - results_index (int): The position of the benchmark results in the tuples
+
+    Returns:
+    - indices (list): The indices of the non-dominated entries, in order
+    '''
+    config = config or get_config()
+    objectives = parse_objectives(config.pareto_objectives)
+    results = [entry[results_index] for entry in entries]
+    return [i for i, a in enumerate(results)
+            if not any(dominates(b, a, objectives) for j, b in enumerate(results) if j != i)]
+
+
+def incumbent_throughput(benchmark_results, config=None):
+    '''
+    Function to choose the throughput a running candidate is compared against by the side
+    checker. For other objectives than throughput a slower candidate can still be better,
+    so it is only stopped below the throughput target.
+
+    Returns:
+    - throughput (float): The throughput, None to disable the comparison
+    '''
+    config = config or get_config()
+    if config.objective == "throughput":
+        return benchmark_results["ops_per_sec"]
+    if config.throughput_target > 0:
+        return config.throughput_target
+    return None
+
+
+def describe(benchmark_results, include_throughput=True, config=None):
+    '''
+    Function to describe the objectives of a run for the prompts
+
+    Parameters:
+    - benchmark_results (dict): The results of the run
+    - include_throughput (bool): Whether the throughput is described, e.g. False if the prompt already has it
+
+    Returns:
+    - description (str): e.g. "P99 read latency: 250.3 us, Operations per second: 51234 ops/sec."
+    '''
+    config = config or get_config()
+    names = [config.objective] + [n for n in parse_objectives(config.pareto_objectives) if n != config.objective]
+    parts = []
+    for name in names:
+        if name == "throughput" and not include_throughput:
+            continue
+        value = metric(benchmark_results, name)
+        if value is not None:
+            label, unit, _ = OBJECTIVES[name]
+            parts.append(f"{label}: {value} {unit}")
+    return ", ".join(parts) + "." if parts else ""
+
+
+def describe_goal(config=None):
+    '''
+    Function to describe the tuning goal of the session for the prompts
+    '''
+    config = config or get_config()
+    label, _, higher_is_better = OBJECTIVES[config.objective]
+    goal = f"The goal is to {'maximize' if higher_is_better else 'minimize'} the {label}"
+    if config.throughput_target > 0 and config.objective != "throughput":
+        goal += f" while sustaining at least {config.throughput_target} operations per second"
+    return goal + "."
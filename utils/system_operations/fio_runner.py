@@ -1,117 +1,353 @@
 import subprocess
-import re
+import hashlib
+import json
+import time
 import os
 
+from utils.utils import log_update
 
-def fio_run(test_type, file_path):
+# Profiling matrix: (name, rw, block size, iodepth, read share of mixed jobs)
+PROFILE_MATRIX = [
+    ("randread_4k_qd1", "randread", "4k", 1, None),
+    ("randread_4k_qd32", "randread", "4k", 32, None),
+    ("randwrite_4k_qd1", "randwrite", "4k", 1, None),
+    ("randwrite_4k_qd32", "randwrite", "4k", 32, None),
+    ("read_1m_qd8", "read", "1m", 8, None),
+    ("write_1m_qd8", "write", "1m", 8, None),
+    ("randrw70_16k_qd16", "randrw", "16k", 16, 70),
+]
+# Bump when the jobs change, so profiles measured with other jobs are not reused
+PROFILE_VERSION = 1
+PROFILE_MAX_AGE_DAYS = 30
+
+FIO_TEST_FILE = "elmo_fio_test"
+FIO_SIZE = "4G"
+FIO_MAX_RUNTIME_SECONDS = 60
+FIO_RAMP_SECONDS = 5
+# A job stops early once the IOPS slope over the window is within the tolerance
+FIO_STEADY_STATE = "iops_slope:0.5%"
+FIO_STEADY_STATE_SECONDS = 15
+
+# Profiles read in this process, keyed by profile path
+_profiles = {}
+
+
+def device_of_path(path):
+    '''
+    Function to find the block device and filesystem a path is stored on
+
+    Parameters:
+    - path (str): An existing path
+
+    Returns:
+    - device (dict): Name, model, serial and rotational flag of the device, and the filesystem type
+    '''
+    st_dev = os.stat(path).st_dev
+    sys_path = f"/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}"
+    name = ""
+    if os.path.exists(sys_path):
+        real_path = os.path.realpath(sys_path)
+        name = os.path.basename(real_path)
+        # Partitions are described by their parent device
+        if os.path.exists(os.path.join(real_path, "partition")):
+            real_path = os.path.dirname(real_path)
+        sys_path = real_path
+
+    def read_sys(*parts):
+        try:
+            with open(os.path.join(sys_path, *parts)) as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+
+    filesystem = ""
+    mount_point = ""
+    real = os.path.realpath(path)
+    with open("/proc/mounts") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) >= 3 and (real == fields[1] or real.startswith(fields[1].rstrip("/") + "/")):
+                # The longest mount point containing the path wins
+                if len(fields[1]) >= len(mount_point):
+                    mount_point, filesystem = fields[1], fields[2]
+
+    return {
+        "name": name,
+        "model": read_sys("device", "model"),
+        "serial": read_sys("device", "serial") or read_sys("wwid") or read_sys("device", "wwid"),
+        "rotational": read_sys("queue", "rotational") == "1",
+        "filesystem": filesystem,
+    }
+
+
+def fio_version():
+    try:
+        proc = subprocess.run(["fio", "--version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
+        return proc.stdout.decode().strip()
+    except OSError:
+        return ""
+
+
+def profile_path(profile_dir, device):
     '''
-    Function to run fio benchmark
+    Function to get the profile file of a device
 
     Parameters:
-    - test_type: string containing the type of test to run
+    - profile_dir (str): The directory of the profiles
+    - device (dict): The device, see device_of_path
 
     Returns:
-    - parsed_res: string containing the parsed result of the fio test
+    - path (str): The profile path, keyed by the model, serial and filesystem of the device
     '''
+    identity = json.dumps([device["model"], device["serial"], device["name"], device["filesystem"], PROFILE_VERSION])
+    key = hashlib.sha1(identity.encode()).hexdigest()[:16]
+    return os.path.join(profile_dir, f"{device['name'] or 'device'}_{key}.json")
+
+
+def fio_run(job, directory, direct=True):
+    '''
+    Function to run one fio job of the profiling matrix
+
+    Parameters:
+    - job (tuple): The job of PROFILE_MATRIX
+    - directory (str): The directory to run in, on the device being profiled
+    - direct (bool): Whether to bypass the page cache
+
+    Returns:
+    - result (dict): IOPS, bandwidth and latency per direction, or None if fio failed
+    '''
+    name, rw, block_size, iodepth, read_share = job
     command = [
         "fio",
-        "--name=test",
-        "--ioengine=posixaio",
-        f"--rw={test_type}",
-        "--bs=4k",
+        f"--name={name}",
+        f"--directory={directory}",
+        f"--filename={FIO_TEST_FILE}",
+        "--ioengine=libaio",
+        f"--direct={1 if direct else 0}",
+        f"--rw={rw}",
+        f"--bs={block_size}",
+        f"--iodepth={iodepth}",
         "--numjobs=1",
-        "--size=10G",
-        "--runtime=60",
-        "--time_based"
+        f"--size={FIO_SIZE}",
+        f"--runtime={FIO_MAX_RUNTIME_SECONDS}",
+        f"--ramp_time={FIO_RAMP_SECONDS}",
+        "--time_based",
+        f"--steadystate={FIO_STEADY_STATE}",
+        f"--steadystate_duration={FIO_STEADY_STATE_SECONDS}",
+        "--output-format=json",
     ]
+    if read_share is not None:
+        command.append(f"--rwmixread={read_share}")
 
-    print("[FIO] running fio test now", test_type + "\n")
-    proc = subprocess.run(
-        command,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-    )
+    print(f"[FIO] running fio job {name}")
+    proc = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if proc.returncode != 0:
+        log_update(f"[FIO] fio job {name} failed: {proc.stderr.decode().strip()}")
+        return None
 
-    output = proc.stdout.decode()
-    print("[FIO] output :", output)
+    try:
+        output = proc.stdout.decode()
+        # fio may print notes before the JSON document
+        result = parse_fio_output(json.loads(output[output.index("{"):]))
+    except (ValueError, KeyError, IndexError) as e:
+        log_update(f"[FIO] Could not parse the output of fio job {name}: {e}")
+        return None
 
-    parsed_res = parse_fio_output(output, test_type)
+    result["direct"] = direct
+    log_update(f"[FIO] {name}: {format_job_result(result)}")
+    return result
 
-    directory = os.path.dirname(file_path)
-    if not os.path.exists(directory):
-        os.makedirs(directory)
 
-    with open(file_path, "a") as file:
-        file.write(parsed_res + '\n')
+def parse_fio_output(fio_json):
+    '''
+    Function to parse the JSON output of a fio job
+
+    Parameters:
+    - fio_json (dict): The fio output
 
-    return parsed_res
+    Returns:
+    - result (dict): For "read" and "write" with IO: iops, bandwidth in MiB/s,
+      mean and p99 completion latency in microseconds. Also the runtime and steady state flag.
+    '''
+    job = fio_json["jobs"][0]
+    result = {"runtime_seconds": job.get("job_runtime", 0) / 1000}
+    for direction in ["read", "write"]:
+        stats = job[direction]
+        if stats.get("io_bytes", 0) == 0:
+            continue
+        clat = stats.get("clat_ns", {})
+        percentiles = clat.get("percentile", {})
+        result[direction] = {
+            "iops": stats["iops"],
+            "bandwidth_mib": stats["bw"] / 1024,
+            "latency_mean_us": clat.get("mean", 0) / 1000,
+            "latency_p99_us": percentiles.get("99.000000", 0) / 1000,
+        }
+    steadystate = job.get("steadystate", {})
+    result["steady_state"] = bool(steadystate.get("attained", 0))
+    return result
 
 
-def get_fio_result(file_path):
+def run_profile(directory):
     '''
-    Function to get the fio result
+    Function to run the profiling matrix. Falls back to buffered IO when the filesystem
+    does not support direct IO.
 
     Parameters:
-    - file_path: string containing the path to the fio result file
+    - directory (str): The directory to run in
 
     Returns:
-    - content: string containing the content of the fio result
+    - results (dict): Job name -> result of fio_run
     '''
-    if (os.path.exists(file_path) and os.path.getsize(file_path) != 0):
-        print("[FIO] File exists and is not empty. Reading file.")
-        with open(file_path, 'r') as file:
-            content = file.read()
-        return content
+    results = {}
+    direct = True
+    try:
+        for job in PROFILE_MATRIX:
+            result = fio_run(job, directory, direct)
+            if result is None and direct:
+                direct = False
+                result = fio_run(job, directory, direct)
+            if result is not None:
+                results[job[0]] = result
+    finally:
+        delete_test_file(directory)
+    return results
 
-     # List of test types
-    test_types = ["randwrite", "randread", "read", "write"]
-    combined_result = []
-    for test_type in test_types:
-        fio_result = fio_run(test_type, file_path)
-        combined_result.append(fio_result)
 
-    combined_result = "\n".join(combined_result)
-    print(f"[FIO] result : \n {combined_result}")
-    delete_test_file()
-    return combined_result
+def load_profile(path, fio_version_string):
+    '''
+    Function to load a stored profile if it is still valid
 
+    Returns:
+    - profile (dict): The profile, or None if it is missing, stale or was measured differently
+    '''
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if profile.get("version") != PROFILE_VERSION or profile.get("fio_version") != fio_version_string:
+        return None
+    if time.time() - profile.get("created", 0) > PROFILE_MAX_AGE_DAYS * 24 * 3600:
+        return None
+    if set(profile.get("results", {})) != {job[0] for job in PROFILE_MATRIX}:
+        return None
+    return profile
 
-def parse_fio_output(fio_result, test_type):
+
+def get_device_profile(profile_dir, db_path):
     '''
-    Function to parse the fio output
+    Function to get the IO profile of the device holding the database, measuring it if
+    there is no valid stored profile
 
     Parameters:
-    - fio_result: string containing the fio result
-    - test_type: string containing the type of test to run
+    - profile_dir (str): The directory of the stored profiles
+    - db_path (str): The database path. fio runs in its parent directory, as the database itself is recreated
 
     Returns:
-    - result_string: string containing the parsed result of the fio test
+    - profile (dict): The device, fio version, creation time and the results per job
     '''
-    if test_type in ["randwrite", "write"]:
-        pattern = re.compile(r'WRITE: bw=(.*?)\s\(.*?\),\s(.*?)\s\(.*?\)')
-    elif test_type in ["randread", "read"]:
-        pattern = re.compile(r'READ: bw=(.*?)\s\(.*?\),\s(.*?)\s\(.*?\)')
-    else:
-        print(f"[FIO] Unsupported test type: {test_type}")
+    directory = os.path.dirname(os.path.abspath(db_path))
+    os.makedirs(directory, exist_ok=True)
 
-    match = pattern.search(fio_result)
-    if match:
-        values_list = [match.group(1), match.group(2)]
-        result_string = f"{test_type} bandwidth is {values_list[0]} ({values_list[1]})"
-        print(f"[FIO] result string : {result_string}")
+    device = device_of_path(directory)
+    path = profile_path(profile_dir, device)
+    if path in _profiles:
+        return _profiles[path]
+
+    version = fio_version()
+    profile = load_profile(path, version)
+    if profile is not None:
+        print(f"[FIO] Using stored profile {path}")
     else:
-        print("[FIO] Pattern not found in the fio result.")
+        log_update(f"[FIO] Profiling {device['name']} ({device['model']}, {device['filesystem']}) in {directory}")
+        profile = {
+            "version": PROFILE_VERSION,
+            "fio_version": version,
+            "created": time.time(),
+            "device": device,
+            "results": run_profile(directory),
+        }
+        os.makedirs(profile_dir, exist_ok=True)
+        # Only complete profiles are stored, a failed job is retried the next time
+        if set(profile["results"]) == {job[0] for job in PROFILE_MATRIX}:
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(profile, f, indent=2)
+            os.replace(f"{path}.tmp", path)
+
+    _profiles[path] = profile
+    return profile
+
+
+def device_features(profile):
+    '''
+    Function to flatten a profile into numeric features for heuristics
+
+    Parameters:
+    - profile (dict): The profile
+
+    Returns:
+    - features (dict): E.g. randread_4k_qd32_read_iops -> 95000.0
+    '''
+    features = {}
+    for name, result in profile["results"].items():
+        for direction in ["read", "write"]:
+            for metric, value in result.get(direction, {}).items():
+                features[f"{name}_{direction}_{metric}"] = float(value)
+    return features
+
+
+def format_job_result(result):
+    parts = []
+    for direction in ["read", "write"]:
+        if direction in result:
+            stats = result[direction]
+            parts.append(f"{direction} {stats['iops']:.0f} IOPS, {stats['bandwidth_mib']:.1f} MiB/s, "
+                         f"mean latency {stats['latency_mean_us']:.0f} us, p99 latency {stats['latency_p99_us']:.0f} us")
+    return "; ".join(parts)
 
-    return result_string
+
+def format_profile(profile):
+    '''
+    Function to describe a profile for prompts
+
+    Parameters:
+    - profile (dict): The profile
+
+    Returns:
+    - description (str): One line per job
+    '''
+    direct = all(result.get("direct", True) for result in profile["results"].values())
+    lines = [f"Device IO profile measured with fio ({'direct' if direct else 'buffered'} IO, libaio):"]
+    for name, rw, block_size, iodepth, read_share in PROFILE_MATRIX:
+        if name not in profile["results"]:
+            continue
+        workload = f"{rw} {read_share}% reads" if read_share is not None else rw
+        lines.append(f"{workload} {block_size} at queue depth {iodepth}: {format_job_result(profile['results'][name])}")
+    return "\n".join(lines)
+
+
+def get_fio_result(profile_dir, db_path):
+    '''
+    Function to get the fio result
+
+    Parameters:
+    - profile_dir (str): The directory of the stored profiles
+    - db_path (str): The database path
+
+    Returns:
+    - content (str): The description of the IO profile of the device holding the database
+    '''
+    return format_profile(get_device_profile(profile_dir, db_path))
 
 
-def delete_test_file():
+def delete_test_file(directory):
     '''
     Function to delete the test file
     '''
-    proc = subprocess.run(
-        f'rm test.0.0',
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        shell=True
-    )
+    path = os.path.join(directory, FIO_TEST_FILE)
+    if os.path.exists(path):
+        os.remove(path)
@@ -2,7 +2,6 @@ import os
 import psutil
 import subprocess
 import platform
-from cpuinfo import get_cpu_info
 from cgroup_monitor import CGroupMonitor
 
 def get_system_data(db_path):
@@ -36,6 +35,7 @@ def get_system_data(db_path):
         cpu_model = platform.processor()
 
         # get all the CPU cache sizes
+        from cpuinfo import get_cpu_info
         cpu_info = get_cpu_info()
         brand_raw_value = cpu_count + " cores of " + cpu_info['brand_raw']
 
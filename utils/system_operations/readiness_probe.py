@@ -0,0 +1,109 @@
+import os
+import time
+
+from utils.utils import log_update
+
+
+def read_meminfo_dirty_bytes():
+    '''
+    Function to get the dirty and writeback page cache from /proc/meminfo
+
+    Returns:
+    - dirty_bytes (int): Bytes of Dirty plus Writeback pages, or 0 if unavailable
+    '''
+    total = 0
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                parts = line.split()
+                if parts[0] in ("Dirty:", "Writeback:"):
+                    # Values are reported in kB
+                    total += int(parts[1]) * 1024
+    except (OSError, IndexError, ValueError):
+        return 0
+    return total
+
+
+def read_diskstats_inflight():
+    '''
+    Function to get the number of IOs currently in progress on all block devices from /proc/diskstats
+
+    Returns:
+    - inflight (int): The number of in-flight IOs, or 0 if unavailable
+    '''
+    total = 0
+    try:
+        with open("/proc/diskstats", "r") as f:
+            for line in f:
+                parts = line.split()
+                # Field 12 (index 11) is the number of I/Os currently in progress
+                if len(parts) > 11 and not parts[2].startswith(("loop", "ram")):
+                    total += int(parts[11])
+    except (OSError, ValueError):
+        return 0
+    return total
+
+
+def read_cgroup_memory_current(cgroup_name, cgroup_base_path="/sys/fs/cgroup"):
+    '''
+    Function to get the memory charged to the cgroup
+
+    Parameters:
+    - cgroup_name (str): The name of the cgroup
+    - cgroup_base_path (str): The base path of the cgroup hierarchy
+
+    Returns:
+    - memory_current (int): The memory.current of the cgroup in bytes, or None if unavailable
+    '''
+    try:
+        with open(os.path.join(cgroup_base_path, cgroup_name, "memory.current"), "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def wait_for_quiescence(cgroup_name, timeout=30, poll_interval=0.5, dirty_threshold=32*1024*1024,
+                        memory_delta_threshold=8*1024*1024, stable_samples=3):
+    '''
+    Function to wait until the system is quiescent before a benchmark run. The system is quiescent
+    once there are few dirty/writeback pages, no in-flight IO and the cgroup memory has stopped
+    shrinking, for `stable_samples` consecutive polls.
+
+    Parameters:
+    - cgroup_name (str): The name of the cgroup db_bench runs in
+    - timeout (float): Ceiling on the wait in seconds
+    - poll_interval (float): Time between polls in seconds
+    - dirty_threshold (int): Maximum Dirty plus Writeback bytes
+    - memory_delta_threshold (int): Maximum change of memory.current between polls in bytes
+    - stable_samples (int): Number of consecutive quiescent polls required
+
+    Returns:
+    - waited (float): The time waited in seconds
+    - quiescent (bool): False if the ceiling was reached first
+    '''
+    start_time = time.time()
+    previous_memory = read_cgroup_memory_current(cgroup_name)
+    stable = 0
+
+    while True:
+        dirty = read_meminfo_dirty_bytes()
+        inflight = read_diskstats_inflight()
+        memory = read_cgroup_memory_current(cgroup_name)
+
+        memory_settled = (memory is None or previous_memory is None or
+                          abs(memory - previous_memory) <= memory_delta_threshold)
+        previous_memory = memory
+
+        if dirty <= dirty_threshold and inflight == 0 and memory_settled:
+            stable += 1
+        else:
+            stable = 0
+
+        waited = time.time() - start_time
+        if stable >= stable_samples:
+            return waited, True
+        if waited >= timeout:
+            log_update(f"[RDY] Ceiling reached. Dirty: {dirty} bytes, In-flight IO: {inflight}, Memory: {memory} bytes")
+            return waited, False
+
+        time.sleep(poll_interval)
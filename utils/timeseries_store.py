@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import threading
+
+import numpy as np
+
+from utils.config import SessionThread
+from utils.utils import log_update
+
+THROUGHPUT_COLUMNS = ["time", "ops_per_sec", "average_ops_per_sec"]
+RESOURCE_COLUMNS = ["time", "cpu_cores", "memory_bytes"]
+FLUSH_EVERY_ROWS = 10
+RESOURCE_SAMPLE_INTERVAL_SECONDS = 1.0
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+_run_dir_lock = threading.Lock()
+
+
+class TimeSeriesTable:
+    '''
+    Append-only columnar table of float64 samples. Each column is a raw little-endian
+    file next to a meta.json holding the column names and the number of committed rows.
+    Appended rows are buffered and committed by flush(). Readers memory-map the committed
+    rows, so slices are views of the files and nothing is parsed.
+    '''
+
+    def __init__(self, directory, columns=None):
+        '''
+        Parameters:
+        - directory (str): The directory of the table, created if missing
+        - columns (list, optional): The column names of a new table. Default is reading them from meta.json
+        '''
+        self.directory = directory
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.lock = threading.Lock()
+        self.buffer = []
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            self.columns = meta["columns"]
+            self.rows = meta["rows"]
+        else:
+            if columns is None:
+                raise FileNotFoundError(f"No time series table in {directory}")
+            os.makedirs(directory, exist_ok=True)
+            self.columns = list(columns)
+            self.rows = 0
+            for name in self.columns:
+                open(self.column_path(name), "wb").close()
+            self.write_meta()
+
+    def column_path(self, name):
+        return os.path.join(self.directory, f"{name}.f64")
+
+    def write_meta(self):
+        with open(f"{self.meta_path}.tmp", "w") as f:
+            json.dump({"columns": self.columns, "dtype": "<f8", "rows": self.rows}, f)
+        os.replace(f"{self.meta_path}.tmp", self.meta_path)
+
+    def append(self, *values):
+        '''
+        Function to buffer one row, in the order of the columns
+        '''
+        with self.lock:
+            self.buffer.append(values)
+            if len(self.buffer) >= FLUSH_EVERY_ROWS:
+                self._flush()
+
+    def flush(self):
+        '''
+        Function to commit the buffered rows
+        '''
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        # The column files are written before the row count, so readers never see a partial row
+        if not self.buffer:
+            return
+        block = np.asarray(self.buffer, dtype="<f8")
+        for index, name in enumerate(self.columns):
+            with open(self.column_path(name), "ab") as f:
+                f.write(block[:, index].tobytes())
+        self.rows += len(block)
+        self.buffer = []
+        self.write_meta()
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        '''
+        Function to map the committed rows of a column
+
+        Parameters:
+        - name (str): The column name
+
+        Returns:
+        - values (np.ndarray): Read-only memory map of the column
+        '''
+        if name not in self.columns:
+            raise KeyError(name)
+        if self.rows == 0:
+            return np.empty(0, dtype="<f8")
+        return np.memmap(self.column_path(name), dtype="<f8", mode="r", shape=(self.rows,))
+
+    def window(self, start=None, end=None, time_column="time"):
+        '''
+        Function to get the rows with start <= time < end. The time column must be ascending.
+
+        Parameters:
+        - start (float, optional): The first time included. Default is the first row.
+        - end (float, optional): The first time excluded. Default is after the last row.
+
+        Returns:
+        - columns (dict): Column name -> view of the rows in the window
+        '''
+        times = self.column(time_column)
+        first = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        last = len(times) if end is None else int(np.searchsorted(times, end, side="left"))
+        return {name: self.column(name)[first:last] for name in self.columns}
+
+
+def aligned(table, column, times, time_column="time"):
+    '''
+    Function to get the latest sample of a column at each of the given times, e.g. the
+    memory usage at each throughput sample
+
+    Parameters:
+    - table (TimeSeriesTable): The table sampled
+    - column (str): The column
+    - times (np.ndarray): The times to align to
+
+    Returns:
+    - values (np.ndarray): The values, NaN before the first sample
+    '''
+    sample_times = table.column(time_column)
+    values = table.column(column)
+    indices = np.searchsorted(sample_times, times, side="right") - 1
+    result = np.full(len(indices), np.nan)
+    valid = indices >= 0
+    result[valid] = values[indices[valid]]
+    return result
+
+
+def new_run_dir(base_dir):
+    '''
+    Function to create the time series directory of a new run, run_0, run_1, ...
+
+    Parameters:
+    - base_dir (str): The directory holding the runs
+
+    Returns:
+    - run_dir (str): The new directory
+    '''
+    with _run_dir_lock:
+        os.makedirs(base_dir, exist_ok=True)
+        index = len(os.listdir(base_dir))
+        while True:
+            run_dir = os.path.join(base_dir, f"run_{index}")
+            try:
+                os.makedirs(run_dir)
+                return run_dir
+            except FileExistsError:
+                index += 1
+
+
+def throughput_table(run_dir):
+    return TimeSeriesTable(os.path.join(run_dir, "throughput"), THROUGHPUT_COLUMNS)
+
+
+def resource_table(run_dir):
+    return TimeSeriesTable(os.path.join(run_dir, "resources"), RESOURCE_COLUMNS)
+
+
+def throughput_series(benchmark_results):
+    '''
+    Function to get the per second throughput of a run, from its time series store if it
+    has one, else from the ops_per_second_graph of results parsed without a store. Results
+    whose store was deleted, e.g. cached results of an old session, have no series.
+
+    Parameters:
+    - benchmark_results (dict): The results of the run
+
+    Returns:
+    - times (sequence): The seconds since the start of the run
+    - ops_per_sec (sequence): The throughput of each second
+    '''
+    run_dir = benchmark_results.get("timeseries")
+    if run_dir and os.path.exists(os.path.join(run_dir, "throughput", "meta.json")):
+        table = TimeSeriesTable(os.path.join(run_dir, "throughput"))
+        return table.column("time"), table.column("ops_per_sec")
+    return benchmark_results.get("ops_per_second_graph", ([], []))
+
+
+class ResourceSampler(SessionThread):
+    '''
+    Thread sampling the CPU and memory usage of a cgroup (v2) into a time series table,
+    with the same time base as the throughput samples of the run
+    '''
+
+    def __init__(self, table, cgroup_name, start_time=None, interval=RESOURCE_SAMPLE_INTERVAL_SECONDS):
+        '''
+        Parameters:
+        - table (TimeSeriesTable): The table, with RESOURCE_COLUMNS
+        - cgroup_name (str): The cgroup of the run
+        - start_time (float, optional): time.monotonic() at the start of the run. Default is now.
+        - interval (float): The time between samples in seconds
+        '''
+        super().__init__(name="resource-sampler", daemon=True)
+        self.table = table
+        self.cgroup_dir = os.path.join(CGROUP_ROOT, cgroup_name)
+        self.start_time = time.monotonic() if start_time is None else start_time
+        self.interval = interval
+        self.stop_event = threading.Event()
+
+    def read_cpu_usec(self):
+        with open(os.path.join(self.cgroup_dir, "cpu.stat")) as f:
+            for line in f:
+                if line.startswith("usage_usec"):
+                    return int(line.split()[1])
+        return 0
+
+    def read_memory_bytes(self):
+        with open(os.path.join(self.cgroup_dir, "memory.current")) as f:
+            return int(f.read())
+
+    def run_in_session(self):
+        try:
+            last_time = time.monotonic()
+            last_usec = self.read_cpu_usec()
+            while not self.stop_event.wait(self.interval):
+                now = time.monotonic()
+                usec = self.read_cpu_usec()
+                cpu_cores = (usec - last_usec) / 1e6 / (now - last_time)
+                self.table.append(now - self.start_time, cpu_cores, self.read_memory_bytes())
+                last_time, last_usec = now, usec
+        except (OSError, ValueError) as e:
+            log_update(f"[TSS] Resource sampling of {self.cgroup_dir} stopped: {e}")
+        finally:
+            self.table.flush()
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
@@ -1,12 +1,57 @@
 import os
 import json
 import getpass
-from datetime import datetime
+import threading
 from collections import defaultdict
-from deepdiff import DeepDiff
-from utils.constants import OUTPUT_PATH, DEVICE, DB_PATH
+from utils.config import get_config
+from utils.log_writer import LogWriter, ResponseCounter
 
 # LOG UTILS
+# Output path of a session -> its log writer and GPT response counter, so sessions sharing
+# the process log to their own folders
+_log_writers = {}
+_response_counters = {}
+_log_lock = threading.Lock()
+
+def get_log_writer():
+    '''
+    Get the log writer of the session, opening the log files on first use
+
+    Returns:
+    - log_writer (LogWriter): The log writer
+    '''
+    log_dir = get_config().output_path or "."
+    with _log_lock:
+        if log_dir not in _log_writers:
+            os.makedirs(log_dir, exist_ok=True)
+            _log_writers[log_dir] = LogWriter(f"{log_dir}/log.txt", f"{log_dir}/log.jsonl")
+        return _log_writers[log_dir]
+
+def close_log_writer():
+    '''
+    Close the log writer of the session, a later log_update opens the log files again
+
+    Returns:
+    - None
+    '''
+    log_dir = get_config().output_path or "."
+    with _log_lock:
+        log_writer = _log_writers.pop(log_dir, None)
+    if log_writer is not None:
+        log_writer.close()
+
+def set_log_iteration(iteration):
+    '''
+    Tag the following log records with the given iteration
+
+    Parameters:
+    - iteration (int): The iteration of the tuning loop
+
+    Returns:
+    - None
+    '''
+    get_log_writer().iteration = iteration
+
 def log_update(update_string):
     '''
     Update the log file with the given string
@@ -17,23 +62,17 @@ def log_update(update_string):
     Returns:
     - None
     '''
-    current_datetime = datetime.now()
-    date_time_string = current_datetime.strftime("%Y-%m-%d %H:%M:%S")
-    update_string = f"[{date_time_string}] {update_string}"
-    
-    with open("log.txt" if OUTPUT_PATH is None else 
-              f"{OUTPUT_PATH}/log.txt", "a+") as f:
-        f.write(update_string + "\n")
+    get_log_writer().write(update_string)
 
 # LOG GPT REQUEST AND RESPONSE
 def log_gpt_response(prompt, response):
-    output_path=f"{OUTPUT_PATH}/gpt_response"
+    output_path=f"{get_config().output_path}/gpt_response"
 
-    os.makedirs(output_path, exist_ok=True)
-    
-    file_index = 1
-    while os.path.exists(f"{output_path}/response_{file_index}.txt"):
-        file_index += 1
+    with _log_lock:
+        if output_path not in _response_counters:
+            _response_counters[output_path] = ResponseCounter(output_path)
+        response_counter = _response_counters[output_path]
+    file_index = response_counter.next()
     
     file_path = f"{output_path}/response_{file_index}.txt"
     
@@ -60,6 +99,16 @@ def store_db_bench_output(output_folder_name, output_file_name,
     Returns:
     - None
     '''
+    # The early stop decision trace is stored next to the result instead of inside it
+    if "early_stop" in benchmark_results:
+        benchmark_results = dict(benchmark_results)
+        with open(f"{output_folder_name}/{output_file_name}.early_stop.json", "w") as f:
+            json.dump(benchmark_results.pop("early_stop"), f, indent=2)
+
+    # The per second series is referenced by its time series directory instead of inlined
+    if "timeseries" in benchmark_results:
+        benchmark_results = {k: v for k, v in benchmark_results.items() if k != "ops_per_second_graph"}
+
     with open(f"{output_folder_name}/{output_file_name}", "a+") as f:
         # Write benchmark results
         f.write("# " + json.dumps(benchmark_results) + "\n\n")
@@ -79,13 +128,15 @@ def store_db_bench_output(output_folder_name, output_file_name,
 
 def store_best_option_file(options_files, output_folder_dir):
     '''
-    Save the best option file
+    Save the best option file by the objective of the session
 
     Parameters:
     - options_files (list): List of options files
     - output_folder_dir (str): The output directory
     '''
-    best_result = max(options_files, key=lambda x: x[1]["ops_per_sec"])
+    from utils.scoring import best_entry
+
+    best_result = best_entry(options_files)
     best_options = best_result[0]
     best_reasoning = best_result[2]
     with open(f"{output_folder_dir}/best_options.ini", "w") as f:
@@ -114,18 +165,19 @@ def store_diff_options_list(options_list, output_folder_dir):
         f.write(json.dumps(changed_fields_frequency, indent=4))
 
 # PATH UTILS
-def path_of_db():
+def path_of_db(config=None):
     '''
     Choose the database path
 
     Parameters:
-    - None
+    - config (TuningConfig, optional): The session config. Default is the config of the current session.
 
     Returns:
     - db_path (str): The path of the database
     '''
+    config = config or get_config()
     user_name = getpass.getuser()
-    db_path_name = DB_PATH + user_name[0].lower()
+    db_path_name = config.db_path + user_name[0].lower()
     db_path = os.getenv("DB_PATH", db_path_name)
     # log_update(f"[UTL] Using database path: {db_path}")
     print(f"[UTL] Using database path: {db_path}")
@@ -137,22 +189,18 @@ def path_of_db():
 
     return db_path
 
-def path_of_output_folder():
+def path_of_output_folder(config=None):
     '''
-    Set the output folder directory
+    Create the output folder directory
 
     Parameters:
-    - None
+    - config (TuningConfig, optional): The session config. Default is the config of the current session.
 
     Returns:
     - output_folder_dir (str): The output folder directory
     '''
-    current_datetime = datetime.now()
-    date_time_string = current_datetime.strftime("%Y-%m-%d_%H-%M-%S")
-    if OUTPUT_PATH is None:
-        output_folder_dir = f"output/output_{DEVICE}/output_{date_time_string}"
-    else:
-        output_folder_dir = OUTPUT_PATH
+    config = config or get_config()
+    output_folder_dir = config.output_path
 
     os.makedirs(output_folder_dir, exist_ok=True)
     log_update(f"[UTL] Using output folder: {output_folder_dir}")
@@ -171,6 +219,8 @@ def calculate_differences(iterations):
     Returns:
     - differences (list): A list of the differences between the iterations
     '''
+    from deepdiff import DeepDiff
+
     differences = []
     for i in range(1, len(iterations)):
         diff = DeepDiff(iterations[i-1], iterations[i])